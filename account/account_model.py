@@ -1,55 +1,212 @@
-from utils.db import db_fetchone, db_fetchall, db_commit, join
+from utils.db import (db_fetchone, db_fetchall, db_fetchiter, db_commit,
+                      db_transaction)
+from utils.statements import statement
 
 class AccountModel:
     __select_all = 'SELECT * FROM acct'
     __where_id = 'WHERE accountid = %s'
+    __update = 'UPDATE acct'
+    __log_change = statement(
+        'acct.log_change',
+        """
+            INSERT INTO change_log (table_name, row_id, op)
+            VALUES ('acct', %s, %s)
+        """
+    )
+
+    __get_accounts = statement('acct.get_accounts',
+                               __select_all, 'ORDER BY accountname')
+    __get_account = statement('acct.get_account', __select_all, __where_id)
+    __add_account = statement(
+        'acct.add_account',
+        """
+            INSERT INTO acct (accountname, accounttype)
+            VALUES (%s, %s)
+        """
+    )
+    __set_name = statement('acct.set_accountname',
+                           __update, 'SET accountname = %s', __where_id)
+    __set_type = statement('acct.set_accounttype',
+                           __update, 'SET accounttype = %s', __where_id)
+    __get_balance = statement(
+        'acct.get_account_balance',
+        """
+            SELECT COALESCE(SUM(amount), 0) + COALESCE((
+                SELECT balance FROM opening_balance WHERE accountid = %s
+            ), 0) as balance
+            FROM transact
+            WHERE accountid = %s
+        """
+    )
+    # Latest closing balance on or before a date (see `TransactModel`)
+    # O(log n) per account with the (accountid, balance_date) key
+    __balance_as_of = """
+        COALESCE((
+            SELECT b.balance
+            FROM acct_balance b
+            WHERE b.accountid = a.accountid AND b.balance_date <= %s
+            ORDER BY b.balance_date DESC
+            LIMIT 1
+        ), 0)
+    """
+    __get_accounts_as_of = statement(
+        'acct.get_accounts_as_of',
+        'SELECT a.*,', __balance_as_of, 'as balance',
+        'FROM acct a ORDER BY a.accountname'
+    )
+    __get_month_end_net_cash = statement(
+        'acct.get_month_end_net_cash',
+        """
+            WITH RECURSIVE month_end (as_of) AS (
+                SELECT LAST_DAY(MAKEDATE(%s, 1))
+                UNION ALL
+                SELECT LAST_DAY(as_of + INTERVAL 1 DAY)
+                FROM month_end
+                WHERE as_of < MAKEDATE(%s, 1) + INTERVAL 11 MONTH
+            )
+            SELECT as_of, COALESCE(SUM(balance), 0) as net_cash
+            FROM (
+                SELECT m.as_of,
+        """,
+        __balance_as_of.replace('%s', 'm.as_of'),
+        """
+                as balance
+                FROM month_end m
+                CROSS JOIN acct a
+            ) x
+            GROUP BY as_of
+            ORDER BY as_of
+        """
+    )
+    __get_balance_history = statement(
+        'acct.get_balance_history',
+        """
+            SELECT accountid, balance_date, balance
+            FROM acct_balance
+            WHERE balance_date BETWEEN %s AND %s
+            ORDER BY balance_date, accountid
+        """
+    )
+    # Archived years are read from `transact_archive` (an empty index
+    # range when the dates are all in open years)
+    __statement_lines = """
+            SELECT transactionid, transactiondate, amount, dscr
+            FROM {}
+            WHERE accountid = %s AND transactiondate BETWEEN %s AND %s
+        """
+    __get_statement_lines = statement(
+        'acct.get_statement_lines',
+        __statement_lines.format('transact'), 'UNION ALL',
+        __statement_lines.format('transact_archive'),
+        'ORDER BY transactiondate, amount, transactionid'
+    )
+    __clear_balance_index = statement('acct.clear_balance_index',
+                                      'DELETE FROM acct_balance')
+    __build_balance_index = statement(
+        'acct.build_balance_index',
+        """
+            INSERT INTO acct_balance (accountid, balance_date, balance)
+            SELECT accountid, transactiondate,
+                SUM(SUM(amount)) OVER (
+                    PARTITION BY accountid ORDER BY transactiondate
+                )
+            FROM (
+                SELECT accountid, transactiondate, amount FROM transact
+                UNION ALL
+                SELECT accountid, transactiondate, amount
+                FROM transact_archive
+            ) t
+            GROUP BY accountid, transactiondate
+        """
+    )
+    __delete_balance_index = statement(
+        'acct.delete_balance_index',
+        'DELETE FROM acct_balance', __where_id
+    )
+    __delete = statement('acct.delete', 'DELETE FROM acct', __where_id)
 
     @classmethod
     def get_accounts(cls):
         # Fetch all accounts
         # O(n) (where n = len(accounts))
-        return db_fetchall(join(cls.__select_all, 'ORDER BY accountname'))
-    
+        return db_fetchall(cls.__get_accounts)
+
     @classmethod
     def get_account(cls, account_id):
         # Gets account information for one account
         # O(1)
-        return db_fetchone(join(cls.__select_all, cls.__where_id), 
-                           (account_id,))
-    
-    @staticmethod
-    def add_account(name, account_type):
+        return db_fetchone(cls.__get_account, (account_id,))
+
+    @classmethod
+    def add_account(cls, name, account_type):
         # Adds one account
+        # Returns: int (the new account ID)
         # O(1)
-        db_commit("""
-                  INSERT INTO acct (accountname, accounttype) 
-                  VALUES (%s, %s)
-                  """, (name, account_type))
-    
+        with db_transaction():
+            account_id = db_commit(cls.__add_account, (name, account_type))
+            db_commit(cls.__log_change, (account_id, 'add'), return_id=False)
+        return account_id
+
     @classmethod
     def edit_account(cls, account_id, account_name, account_type):
         # Edits one account
         # O(1)
-        update = 'UPDATE acct'
         db_commit(
-            join(update, 'SET accountname = %s', cls.__where_id),
-            (account_name, account_id),
-            join(update, 'SET accounttype = %s', cls.__where_id),
-            (account_type, account_id)
+            cls.__set_name, (account_name, account_id),
+            cls.__set_type, (account_type, account_id),
+            cls.__log_change, (account_id, 'edit'),
+            return_id=False
         )
-        
-    @staticmethod
-    def get_account_balance(account_id):
+
+    @classmethod
+    def get_account_balance(cls, account_id):
         # Calculate account balance using transaction table
-        result = db_fetchone("""
-                             SELECT COALESCE(SUM(amount), 0) as balance
-                             FROM transact
-                             WHERE accountid = %s
-                             """, (account_id,))['balance'] 
+        result = db_fetchone(cls.__get_balance,
+                             (account_id, account_id))['balance']
         # db_fetchone() returns dict with only key 'balance'
 
         return result
+
+    @classmethod
+    def get_accounts_as_of(cls, as_of):
+        # Fetch all accounts with their balances at the end of `as_of`
+        # O(n log m) (where n = len(accounts), m = days with transactions)
+        return db_fetchall(cls.__get_accounts_as_of, (as_of,))
+
+    @classmethod
+    def get_month_end_net_cash(cls, year):
+        # Net cash at the end of each month of `year`
+        # Returns: list of dict (as_of, net_cash), ordered by month
+        return db_fetchall(cls.__get_month_end_net_cash, (year, year))
+
+    @classmethod
+    def get_balance_history(cls, start, end):
+        # Closing balances that changed between `start` and `end`
+        # Returns: list of dict (accountid, balance_date, balance),
+        #     ordered by date
+        return db_fetchall(cls.__get_balance_history, (start, end))
+
+    @classmethod
+    def get_statement_lines(cls, account_id, start, end):
+        # Stream one account's transactions between `start` and `end`
+        # Yields: dict (transactionid, transactiondate, amount, dscr),
+        #     ordered by date and amount
+        # O(n log n) (where n = transactions in the range): each table
+        #     is read with its (accountid, transactiondate, amount) key,
+        #     then the rows are sorted
+        return db_fetchiter(cls.__get_statement_lines, 
+                            (account_id, start, end, account_id, start, end))
+
+    @classmethod
+    def rebuild_balance_index(cls):
+        # Recompute `acct_balance` from the transaction table
+        db_commit(cls.__clear_balance_index, (),
+                  cls.__build_balance_index, (), return_id=False)
+
     @classmethod
     def delete(cls, id):
-        return db_commit(join('DELETE FROM acct', cls.__where_id), (id,), 
-                         return_was_affected=True, return_id=False)
\ No newline at end of file
+        # An account without transactions can still have index rows
+        return db_commit(cls.__delete_balance_index, (id,),
+                         cls.__log_change, (id, 'delete'),
+                         cls.__delete, (id,),
+                         return_was_affected=True, return_id=False)
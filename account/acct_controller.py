@@ -1,28 +1,44 @@
 __all__ = ['AcctController']
 
+from collections import deque
+from datetime import date, timedelta
 from decimal import Decimal
 
+from app import app
+from utils.downsample import lttb
+
 # TransactController imported in accounts()
 from .account_model import AccountModel
 
 class AcctController:
     @staticmethod
-    def accounts(balance=True, show_net_cash=False):
+    def accounts(balance=True, show_net_cash=False, as_of=None):
         # Controller for returning all current accounts from the database
         # :param balance: bool | True
         #    Determines whether each account balance is returned
+        # :param as_of: date | str (YYYY-MM-DD) | None
+        #    Returns balances at the end of this day instead of today
+        #    using the balance index (see `AccountModel`)
         # O(n) (where n = len(accounts))
+        # O(n log m) with `as_of` (where m = days with transactions)
 
-        if show_net_cash:
+        if show_net_cash or as_of is not None:
             assert balance, 'An internal error occurred'
         from transact import TransactController
 
-        accounts = AccountModel.get_accounts()
+        if as_of is not None:
+            accounts = AccountModel.get_accounts_as_of(as_of)
+        else:
+            accounts = AccountModel.get_accounts()
+
         if balance is True:
             net_cash = Decimal(0)
+            if as_of is None:
+                balances = TransactController.get_account_balances(
+                    [i['accountid'] for i in accounts])
             for account in accounts:
-                account['balance'] = TransactController.get_account_balance(
-                    account['accountid'])
+                if as_of is None:
+                    account['balance'] = balances[account['accountid']]
                 
                 if show_net_cash:
                     net_cash += account['balance']
@@ -33,13 +49,241 @@ class AcctController:
             return accounts, net_cash
         else:
             return accounts
+
+    @staticmethod
+    def month_end_net_cash(year):
+        # Net cash at the end of each month of `year` in one query
+        # :param year: int
+        # Returns: list of dict (as_of: date, net_cash: Decimal)
+        return AccountModel.get_month_end_net_cash(year)
+
+    @staticmethod
+    def balance_history(start, end, points=300):
+        # Balance history for each account and net cash, downsampled
+        #
+        # :param start: date
+        # :param end: date
+        # :param points: int (most points returned for each series)
+        #
+        # Returns: dict
+        #     accounts: list of dict (accountid, accountname, points)
+        #     net_cash: list of [date, float]
+        #
+        # O(n) (where n = balance changes between `start` and `end`)
+        accounts = AccountModel.get_accounts_as_of(start - timedelta(days=1))
+        balances = {i['accountid']: i['balance'] for i in accounts}
+        series = {i['accountid']: [(start, i['balance'])] for i in accounts}
+        net = sum(balances.values(), Decimal(0))
+        net_cash = [(start, net)]
+
+        for row in AccountModel.get_balance_history(start, end):
+            account_id = row['accountid']
+            date_ = row['balance_date']
+            net += row['balance'] - balances[account_id]
+            balances[account_id] = row['balance']
+            for values, value in ((series[account_id], row['balance']), 
+                                  (net_cash, net)):
+                if values[-1][0] == date_: # Changed on `start`, or several
+                    values[-1] = (date_, value) # accounts on one day
+                else:
+                    values.append((date_, value))
+
+        for account_id, balance in balances.items():
+            series[account_id].append((end, balance))
+        net_cash.append((end, net))
+
+        def downsample(values):
+            xy = [(i.toordinal(), float(j)) for i, j in values]
+            return [[date.fromordinal(int(i)), j] for i, j in lttb(xy, points)]
+
+        return {
+            'accounts': [{'accountid': i['accountid'],
+                          'accountname': i['accountname'],
+                          'points': downsample(series[i['accountid']])}
+                         for i in accounts],
+            'net_cash': downsample(net_cash)
+        }
+
+    @staticmethod
+    def rebuild_balance_index(): AccountModel.rebuild_balance_index()
     
     @staticmethod
     def get_account(account_id): return AccountModel.get_account(account_id)
     
+    @classmethod
+    def ledger(cls, account_id, per_page, offset):
+        # Controller for one account's transactions with running balances
+        # :param account_id: int
+        # :param per_page: int
+        # :param offset: int
+        # Returns: account, transactions, total
+        # Raises AssertionError when the account doesn't exist
+        from transact import TransactController
+
+        account = cls.get_account(account_id)
+        assert account is not None, 'Account not found'
+        transactions, total = TransactController.get_ledger(account_id,
+                                                            per_page, offset)
+        return account, transactions, total
+
+    @classmethod
+    def reconcile(cls, account_id, start, end, file):
+        # Reconcile a bank statement against one account's transactions
+        #
+        # Both sides are walked in (date, amount) order like a merge join.
+        # A bank line matches the closest transaction with the same amount
+        # at most DUPLICATE_WINDOW_DAYS away. Only transactions within
+        # that window of the current line are held, so memory doesn't grow
+        # with the number of transactions. Leftover lines and transactions
+        # from the same merchant are paired as amount mismatches.
+        #
+        # :param account_id: int
+        # :param start: date
+        # :param end: date
+        # :param file: text file object (see 
+        #     `TransactController.read_statement()`)
+        #
+        # Returns: dict
+        #     account: dict
+        #     matched: int
+        #     missing: list of dict (bank lines without a transaction)
+        #     extra: list of dict (transactions not on the statement)
+        #     mismatched: list of dict (line, transaction, difference)
+        #     statement_total, book_total, difference: Decimal
+        #
+        # Raises AssertionError when:
+        #     the account doesn't exist
+        #     start is after end
+        #     the file can't be read
+        #
+        # O(n log n + m) (where n = statement lines, m = transactions)
+        from transact import TransactController
+        from transact.fingerprint import merchant
+
+        account = cls.get_account(account_id)
+        assert account is not None, 'Account not found'
+        assert start <= end, 'start must not be after end'
+        window = timedelta(days=app.config['DUPLICATE_WINDOW_DAYS'])
+
+        lines = sorted([i for i in TransactController.read_statement(file)
+                        if start <= i['transactiondate'] <= end],
+                       key=lambda i: (i['transactiondate'], i['amount']))
+        # Transactions just outside the range can match lines at its ends
+        rows = AccountModel.get_statement_lines(account_id, start - window,
+                                                end + window)
+        result = {'account': account, 'matched': 0, 'missing': [], 
+                  'extra': [], 'mismatched': [], 
+                  'statement_total': sum([i['amount'] for i in lines], 
+                                         Decimal(0)),
+                  'book_total': Decimal(0)}
+
+        # Entries are [row, merchant, done] so a matched row can be
+        # skipped when it leaves the window
+        held = deque() # Transactions in the window, by date
+        by_amount = {} # amount: list of unmatched held entries
+        unmatched = deque() # Lines without a match, by date
+        by_merchant = {} # merchant: list of unpaired line entries
+
+        def take(index, key, entry):
+            # Remove an entry from a dict of lists
+            index[key].remove(entry)
+            if not index[key]:
+                del index[key]
+
+        def closest(entries, date_):
+            return min(entries, key=lambda i: 
+                       abs(i[0]['transactiondate'] - date_))
+
+        def hold(row):
+            if start <= row['transactiondate'] <= end:
+                result['book_total'] += row['amount']
+            entry = [row, merchant(row['dscr']), False]
+            held.append(entry)
+            by_amount.setdefault(row['amount'], []).append(entry)
+
+        def release(entry):
+            # A transaction past every line it could still match
+            row, key, done = entry
+            if done:
+                return
+            take(by_amount, row['amount'], entry)
+            near = [i for i in by_merchant.get(key, []) 
+                    if abs(i[0]['transactiondate'] 
+                           - row['transactiondate']) <= window]
+            if near:
+                line = closest(near, row['transactiondate'])
+                take(by_merchant, key, line)
+                line[2] = True
+                result['mismatched'].append({
+                    'line': line[0], 'transaction': row,
+                    'difference': line[0]['amount'] - row['amount']
+                })
+            elif start <= row['transactiondate'] <= end:
+                result['extra'].append(row)
+
+        def drop(entry):
+            # A line past every transaction it could be paired with
+            line, key, done = entry
+            if not done:
+                take(by_merchant, key, entry)
+                result['missing'].append(line)
+
+        row = next(rows, None)
+        for line in lines:
+            date_ = line['transactiondate']
+            while row is not None and row['transactiondate'] <= date_ + window:
+                hold(row)
+                row = next(rows, None)
+            while held and held[0][0]['transactiondate'] < date_ - window:
+                release(held.popleft())
+            while (unmatched and unmatched[0][0]['transactiondate'] 
+                   < date_ - 2 * window):
+                drop(unmatched.popleft())
+
+            if line['amount'] in by_amount:
+                entry = closest(by_amount[line['amount']], date_)
+                take(by_amount, line['amount'], entry)
+                entry[2] = True
+                result['matched'] += 1
+            else:
+                entry = [line, merchant(line['dscr']), False]
+                unmatched.append(entry)
+                by_merchant.setdefault(entry[1], []).append(entry)
+
+        while held:
+            release(held.popleft())
+        while row is not None:
+            hold(row)
+            release(held.popleft())
+            row = next(rows, None)
+        while unmatched:
+            drop(unmatched.popleft())
+
+        result['difference'] = result['statement_total'] - result['book_total']
+        return result
+
+    @staticmethod
+    def adjust(account_id, amount, transaction_date, description):
+        # Add a Balance Adjustment transaction to fix one difference 
+        # found by `reconcile()`
+        # :param amount: Decimal (added to the account's balance)
+        # Returns: int (the new transaction ID)
+        # Raises AssertionError when:
+        #     there is no Balance Adjustment category
+        #     the transaction can't be added (see 
+        #     `TransactController.add_transaction()`)
+        from category import CatController
+        from transact import TransactController
+
+        category = CatController.get_category_by_name('Balance Adjustment')
+        assert category is not None, 'Add a Balance Adjustment category first'
+        return TransactController.add_transaction(
+            account_id, category['categoryid'], amount, transaction_date,
+            description[:50], allow_duplicate=True)
+
     @staticmethod
     def add_account(name, account_type): 
-        AccountModel.add_account(name, account_type)
+        return AccountModel.add_account(name, account_type)
     
     @staticmethod
     def edit_account(account_id, account_name, account_type):
@@ -1,4 +1,7 @@
-from flask import Blueprint, render_template, request
+from datetime import datetime, timedelta
+from io import TextIOWrapper
+
+from flask import Blueprint, jsonify, render_template, request
 
 from utils.message import log_error, log_success, header_action, Model, Action
 from .acct_controller import AcctController
@@ -6,17 +9,186 @@ from .acct_controller import AcctController
 acct_bp = Blueprint('acct', __name__)
 
 @acct_bp.route('/accounts')
-@log_error(pg_template='accounts.html', model=Model.acct, action=Action.read, accounts=[])
+@log_error(pg_template='accounts.html', model=Model.acct, action=Action.read, accounts=[],
+           month_end=[])
 def accounts():
     """
     View all accounts.
 
-    This function takes no arguments and returns the rendered template 
-    showing all accounts in detail.
+    This function returns the rendered template showing all accounts in 
+    detail, with net cash at the end of each month of the selected year.
+
+    GET request parameters:
+    as_of: date (optional, shows balances at the end of this day)
     """
-    accounts, net_cash = AcctController.accounts(show_net_cash=True)
+    as_of = request.args.get('as_of', '', type=str) or None
+    if as_of is not None:
+        as_of = datetime.strptime(as_of, '%Y-%m-%d').date()
+    accounts, net_cash = AcctController.accounts(show_net_cash=True, 
+                                                 as_of=as_of)
+    year = as_of.year if as_of else datetime.today().year
+    month_end = AcctController.month_end_net_cash(year)
     return render_template('accounts.html', accounts=accounts, 
-                           net_cash=net_cash)
+                           net_cash=net_cash, as_of=as_of, 
+                           month_end=month_end)
+
+@acct_bp.route('/accounts/ledger')
+@log_error(model=Model.acct, action=Action.read, pg_template='ledger.html',
+           account=None, transactions=[], p=1, has_next=False,
+           has_prev=False)
+def ledger():
+    """
+    View one account's transactions with a running balance.
+
+    GET request parameters:
+    id: int (account ID)
+    p: int (page number)
+    """
+    account_id = request.args.get('id', type=int)
+    page = request.args.get('p', 1, type=int)
+    per_page = 20
+    offset = (page - 1) * per_page
+    account, transactions, total = AcctController.ledger(account_id,
+                                                         per_page, offset)
+    has_next = offset + per_page < total
+    has_prev = page > 1
+    return render_template('ledger.html', account=account,
+                           transactions=transactions, p=page,
+                           has_next=has_next, has_prev=has_prev)
+
+@acct_bp.route('/accounts/ledger/json')
+def ledger_json():
+    """
+    Get one page of an account's ledger as JSON.
+
+    GET request parameters:
+    id: int (account ID)
+    p: int (page number)
+    per_page: int (1-500, default 100)
+    """
+    try:
+        account_id = request.args.get('id', type=int)
+        page = max(request.args.get('p', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 100, type=int), 1),
+                       500)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        offset = (page - 1) * per_page
+        account, transactions, total = AcctController.ledger(
+            account_id, per_page, offset)
+    except AssertionError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({'account': account, 'transactions': transactions,
+                    'p': page, 'per_page': per_page, 'total': total})
+
+@acct_bp.route('/accounts/history/json')
+def history_json():
+    """
+    Get balance history for each account and net cash as JSON.
+
+    Each series is downsampled on the server so a chart gets at most
+    `points` points no matter how long the range is.
+
+    GET request parameters:
+    start: date (default one year before `end`)
+    end: date (default today)
+    points: int (3-2000, default 300)
+    """
+    try:
+        end = request.args.get('end', '', type=str)
+        end = (datetime.strptime(end, '%Y-%m-%d').date() if end 
+               else datetime.today().date())
+        start = request.args.get('start', '', type=str)
+        start = (datetime.strptime(start, '%Y-%m-%d').date() if start 
+                 else end - timedelta(days=365))
+        assert start <= end, 'start must not be after end'
+        points = min(max(request.args.get('points', 300, type=int), 3), 
+                     2000)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        history = AcctController.balance_history(start, end, points)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({'start': start, 'end': end, **history})
+
+@acct_bp.route('/accounts/reconcile', methods=['GET', 'POST'])
+@log_error(model=Model.acct, action=Action.read, 
+           pg_template='reconcile.html', accounts=[], result=None)
+def reconcile():
+    """
+    Reconcile a bank statement CSV against one account.
+
+    Lists statement lines without a transaction, transactions that are
+    not on the statement, and lines whose amount doesn't match the
+    merchant's transaction.
+
+    GET request parameters:
+    id: int (optional, the account picked in the form)
+
+    POST request parameters:
+    accountid: int
+    start: date
+    end: date
+    file: CSV file (date, amount, description columns)
+
+    Raises:
+    POST request:
+    AssertionError when the account doesn't exist or the file can't be
+        read (see `AcctController.reconcile()`)
+    """
+    accounts = AcctController.accounts(balance=False)
+    if request.method == 'POST':
+        account_id = request.form.get('accountid', type=int)
+        start = datetime.strptime(request.form['start'], '%Y-%m-%d').date()
+        end = datetime.strptime(request.form['end'], '%Y-%m-%d').date()
+        result = AcctController.reconcile(
+            account_id, start, end,
+            TextIOWrapper(request.files['file'].stream, 
+                          encoding='utf-8-sig'))
+        return render_template('reconcile.html', accounts=accounts, 
+                               accountid=account_id, result=result, 
+                               start=start, end=end)
+    else:
+        return render_template('reconcile.html', accounts=accounts,
+                               accountid=request.args.get('id', type=int))
+
+@acct_bp.route('/accounts/reconcile/fix', methods=['POST'])
+def reconcile_fix():
+    """
+    Fix one reconcile difference with a Balance Adjustment transaction.
+
+    POST request parameters:
+    accountid: int
+    amount: Decimal (added to the account's balance)
+    transactiondate: date
+    dscr: str
+    """
+    try:
+        account_id = request.form.get('accountid', type=int)
+        amount = request.form['amount']
+        transaction_date = datetime.strptime(request.form['transactiondate'],
+                                             '%Y-%m-%d').date()
+        description = request.form.get('dscr', '')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        new_id = AcctController.adjust(account_id, amount, transaction_date,
+                                       description)
+    except AssertionError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({'transactionid': new_id})
 
 @acct_bp.route('/accounts/add', methods=['GET', 'POST'])
 @log_error(model=Model.acct, action=Action.add, pg_template='add_edit_account.html')
@@ -0,0 +1,2 @@
+from .api_controller import ApiController
+from .api_routes import api_bp
@@ -0,0 +1,224 @@
+__all__ = ['ApiController']
+
+from account import AcctController
+from budget import BudgetController
+from cashflow import CashflowController
+from category import CatController
+from rule import RuleController
+from transact import TransactController
+from utils.db import db_transaction
+from .api_model import ApiModel
+
+def _fields(data, required, optional=()):
+    # Values of an object's fields, in order
+    # Raises AssertionError when a required field is missing
+    missing = [i for i in required if data.get(i) in (None, '')]
+    assert not missing, f'Missing {", ".join(missing)}'
+    return [data[i] for i in required] + [data.get(i) for i in optional]
+
+def _transaction(data):
+    accountid, amount, transactiondate, dscr, categoryid = _fields(
+        data, ('accountid', 'amount', 'transactiondate', 'dscr'),
+        ('categoryid',))
+    return accountid, categoryid, amount, str(transactiondate), dscr
+
+class ApiController:
+    max_batch = 1000 # Operations in one batch
+    # change_log's table names by resource
+    _tables = {'accounts': 'acct', 'categories': 'category',
+               'transactions': 'transact', 'budgets': 'budget',
+               'cashflows': 'cashflow', 'rules': 'rule'}
+
+    # For each resource: get(id), create(data) -> new ID,
+    # update(id, data) and delete(id), or None when not supported.
+    # Updates get the stored row with the sent fields on top.
+    _resources = {
+        'accounts': {
+            'get': AcctController.get_account,
+            'create': lambda data: AcctController.add_account(
+                *_fields(data, ('accountname',), ('accounttype',))),
+            'update': lambda id, data: AcctController.edit_account(
+                id, *_fields(data, ('accountname',), ('accounttype',))),
+            'delete': AcctController.delete
+        },
+        'categories': {
+            'get': CatController.get_category,
+            'create': lambda data: CatController.add_category(
+                *_fields(data, ('categoryname', 'type_'))),
+            'update': lambda id, data: CatController.edit_category(
+                id, *_fields(data, ('categoryname', 'type_'))),
+            'delete': CatController.delete
+        },
+        'transactions': {
+            'get': TransactController.get_transaction,
+            'create': lambda data: TransactController.add_transaction(
+                *_transaction(data),
+                allow_duplicate=bool(data.get('allow_duplicate'))),
+            'update': lambda id, data: TransactController.edit_transaction(
+                *_transaction(data), id),
+            'delete': TransactController.delete
+        },
+        'budgets': {
+            'get': BudgetController.get_budget,
+            'create': lambda data: BudgetController.add_budget(*_fields(
+                data, ('categoryid', 'budget_year', 'budget_month',
+                       'budget_amount'))),
+            'update': lambda id, data: BudgetController.edit_budget(
+                id, *_fields(data, ('categoryid', 'budget_year',
+                                    'budget_month', 'budget_amount'))),
+            'delete': BudgetController.delete
+        },
+        'cashflows': { # Keyed by (expense, income), so only added here
+            'get': None,
+            'create': lambda data: CashflowController.add_cashflow(
+                *_fields(data, ('expense', 'income', 'type_'))),
+            'update': None,
+            'delete': None
+        },
+        'rules': {
+            'get': RuleController.get_rule,
+            'create': lambda data: RuleController.add_rule(*_fields(
+                data, ('pattern', 'match_type'),
+                ('accountid', 'amount_sign', 'categoryid', 'priority'))),
+            'update': lambda id, data: RuleController.edit_rule(
+                id, *_fields(data, ('pattern', 'match_type'),
+                             ('accountid', 'amount_sign', 'categoryid',
+                              'priority'))),
+            'delete': RuleController.delete
+        }
+    }
+
+    @classmethod
+    def resources(cls): return list(cls._resources)
+
+    @classmethod
+    def _action(cls, resource, action):
+        # Raises AssertionError when the resource or action doesn't exist
+        assert resource in cls._resources, f'Unknown resource {resource}'
+        func = cls._resources[resource][action]
+        assert func is not None, f"{resource} can't be used with {action}"
+        return func
+
+    @classmethod
+    def get(cls, resource, id):
+        # Returns: dict or None
+        return cls._action(resource, 'get')(id)
+
+    @classmethod
+    def create(cls, resource, data):
+        # Returns: int or None (the new ID)
+        # Raises AssertionError when `data` is not valid
+        assert isinstance(data, dict), 'data must be an object'
+        return cls._action(resource, 'create')(data)
+
+    @classmethod
+    def update(cls, resource, id, data):
+        # Change some of a row's fields
+        # Raises AssertionError when the row doesn't exist or `data` is
+        #     not valid
+        assert isinstance(data, dict), 'data must be an object'
+        update = cls._action(resource, 'update')
+        row = cls.get(resource, id)
+        assert row is not None, f'{resource} {id} not found'
+        update(id, {**row, **data})
+
+    @classmethod
+    def delete(cls, resource, id): cls._action(resource, 'delete')(id)
+
+    @classmethod
+    def apply(cls, operation):
+        # One operation of a batch
+        # :param operation: dict
+        #     op: 'create' | 'update' | 'delete'
+        #     resource: str (see `resources()`)
+        #     id: int (update and delete)
+        #     data: dict (create and update)
+        # Returns: dict (id)
+        assert isinstance(operation, dict), 'Operations must be objects'
+        resource = operation.get('resource')
+        id = operation.get('id')
+        data = operation.get('data', {})
+        match operation.get('op'):
+            case 'create':
+                return {'id': cls.create(resource, data)}
+            case 'update':
+                assert id is not None, 'Missing id'
+                cls.update(resource, id, data)
+            case 'delete':
+                assert id is not None, 'Missing id'
+                cls.delete(resource, id)
+            case _:
+                raise AssertionError('op must be create, update or delete')
+        return {'id': id}
+
+    @classmethod
+    def batch(cls, operations):
+        # Apply many operations in one database transaction
+        #
+        # Either every operation is saved or, when one fails, none are.
+        #
+        # :param operations: list of dict (see `apply()`)
+        #
+        # Returns: list of dict (the result of each operation, in order)
+        #
+        # Raises AssertionError when:
+        #     there are more than `max_batch` operations
+        #     an operation is not valid (the message starts with its
+        #     index)
+        assert isinstance(operations, list), 'operations must be a list'
+        assert len(operations) <= cls.max_batch, \
+            f'Send at most {cls.max_batch} operations at a time'
+
+        results = []
+        with db_transaction():
+            for index, operation in enumerate(operations):
+                try:
+                    results.append(cls.apply(operation))
+                except AssertionError as e:
+                    raise AssertionError(f'Operation {index}: {e}')
+                except Exception as e:
+                    raise Exception(f'Operation {index}: {e}') from e
+        return results
+
+    @classmethod
+    def version(cls):
+        # Returns: int (the latest change's version)
+        return ApiModel.get_version()
+
+    @classmethod
+    def changes(cls, since, resource=None):
+        # Stream every add, edit, delete and archive after version `since`
+        #
+        # Rows are named by resource and ID, so a client re-reads each one
+        # with `get()` (deleted and archived rows are gone). Cashflows are
+        # named by [expense, income], their transactions' IDs.
+        #
+        # Versions are given out when a write commits, in commit order,
+        # so asking from the last version a client got never misses a
+        # change. Every change of one commit has the same version.
+        #
+        # :param since: int (version, 0 for every change)
+        # :param resource: str | None (see `resources()`)
+        #
+        # Returns: iterator of dict (version, resource, id, op,
+        #     changed_at), oldest first
+        #
+        # Raises AssertionError when `resource` doesn't exist (checked
+        #     right away, before the changes are read)
+        assert since >= 0, 'since must be 0 or more'
+        table = None
+        if resource is not None:
+            assert resource in cls._tables, f'Unknown resource {resource}'
+            table = cls._tables[resource]
+        resources = {j: i for i, j in cls._tables.items()}
+
+        def rows():
+            for row in ApiModel.get_changes(since, table):
+                id = row['row_id']
+                if row['row_id2'] is not None:
+                    id = [id, row['row_id2']]
+                yield {'version': row['version'],
+                       'resource': resources[row['table_name']],
+                       'id': id, 'op': row['op'],
+                       'changed_at': row['changed_at']}
+        return rows()
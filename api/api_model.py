@@ -0,0 +1,35 @@
+from utils.db import db_fetchiter, db_fetchone
+from utils.statements import statement
+
+class ApiModel:
+    __changes = """
+            SELECT version, table_name, row_id, row_id2, op, changed_at
+            FROM change_log
+        """
+    __order = 'ORDER BY version, changeid'
+    __get_changes = statement('api.get_changes', __changes,
+                              'WHERE version > %s', __order)
+    __get_table_changes = statement(
+        'api.get_table_changes',
+        __changes, 'WHERE table_name = %s AND version > %s', __order
+    )
+    __get_version = statement(
+        'api.get_version',
+        'SELECT COALESCE(MAX(version), 0) as version FROM change_log'
+    )
+
+    @classmethod
+    def get_changes(cls, since, table=None):
+        # Stream the changes after version `since`, oldest first
+        # :param table: str | None (only this table's changes)
+        # Yields: dict (version, table_name, row_id, row_id2, op,
+        #     changed_at)
+        # O(k) (where k = changes after `since`) with the version or
+        #     (table_name, version) key
+        if table is None:
+            return db_fetchiter(cls.__get_changes, (since,))
+        return db_fetchiter(cls.__get_table_changes, (table, since))
+
+    @classmethod
+    def get_version(cls):
+        return db_fetchone(cls.__get_version)['version']
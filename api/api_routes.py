@@ -0,0 +1,231 @@
+from datetime import datetime
+from decimal import Decimal
+from functools import wraps
+from json import dumps, loads
+from logging import error
+
+from flask import Blueprint, Response, jsonify, request
+from werkzeug.exceptions import HTTPException, UnsupportedMediaType
+
+from account import AcctController
+from budget import BudgetController
+from cashflow import CashflowController
+from category import CatController
+from rule import RuleController
+from transact import TransactController
+from .api_controller import ApiController
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+def _json_errors(func):
+    # Send errors as JSON
+    # AssertionError: 400 (the request is not valid), HTTPException: its
+    # own status, others: 500
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except AssertionError as e:
+            return jsonify({'error': str(e)}), 400
+        except HTTPException as e:
+            return jsonify({'error': e.description}), e.code
+        except Exception as e:
+            error(f'API error: {e}', exc_info=True)
+            return jsonify({'error': str(e)}), 500
+    return wrapper
+
+def _body():
+    # The request's JSON, with decimal numbers read as Decimal so amounts
+    # are exact
+    #
+    # Only JSON requests are read: a page on another site can send a
+    # form or plain text body from the browser without asking first,
+    # but not an application/json one (CSRF).
+    #
+    # Raises UnsupportedMediaType (415) for any other Content-Type
+    if request.mimetype != 'application/json':
+        raise UnsupportedMediaType('Send the body as application/json')
+    try:
+        return loads(request.get_data(), parse_float=Decimal)
+    except ValueError:
+        raise AssertionError('Send a JSON body')
+
+def _page():
+    # Returns: page, per_page, offset
+    page = max(request.args.get('p', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 100, type=int), 1), 500)
+    return page, per_page, (page - 1) * per_page
+
+def _stream_changes(changes, version):
+    # The JSON object of `changes()`, a few hundred changes per chunk
+    yield '{"changes": ['
+    chunk = []
+    separator = ''
+    for change in changes:
+        chunk.append(dumps(change, default=str))
+        version = change['version']
+        if len(chunk) == 500:
+            yield separator + ', '.join(chunk)
+            chunk = []
+            separator = ', '
+    if chunk:
+        yield separator + ', '.join(chunk)
+    yield f'], "version": {version}}}'
+
+@api_bp.route('/accounts')
+@_json_errors
+def accounts():
+    """Get every account with its balance."""
+    return jsonify({'accounts': AcctController.accounts()})
+
+@api_bp.route('/categories')
+@_json_errors
+def categories():
+    """Get every category."""
+    return jsonify({'categories': CatController.categories()})
+
+@api_bp.route('/transactions')
+@_json_errors
+def transactions():
+    """
+    Get one page of transactions, newest first.
+
+    GET request parameters:
+    p: int (page number)
+    per_page: int (1-500, default 100)
+    s: str (optional, search the descriptions)
+    """
+    page, per_page, offset = _page()
+    transactions, total = TransactController.transactions(
+        per_page, offset, search_query=request.args.get('s', '', type=str))
+    return jsonify({'transactions': transactions, 'p': page,
+                    'per_page': per_page, 'total': total})
+
+@api_bp.route('/budgets')
+@_json_errors
+def budgets():
+    """
+    Get one month's budgets with their spending.
+
+    GET request parameters:
+    year: int (default this year)
+    month: int (default this month)
+    """
+    today = datetime.today()
+    year = request.args.get('year', today.year, type=int)
+    month = request.args.get('month', today.month, type=int)
+    budgets, summary = BudgetController.budgets(year, month)
+    return jsonify({'budgets': budgets, 'summary': summary, 'year': year,
+                    'month': month})
+
+@api_bp.route('/cashflows')
+@_json_errors
+def cashflows():
+    """
+    Get one page of cashflows, newest first.
+
+    GET request parameters:
+    p: int (page number)
+    per_page: int (1-500, default 100)
+    """
+    page, per_page, offset = _page()
+    cashflows, total = CashflowController.cashflows(per_page, offset)
+    return jsonify({'cashflows': cashflows, 'p': page,
+                    'per_page': per_page, 'total': total})
+
+@api_bp.route('/rules')
+@_json_errors
+def rules():
+    """Get every categorization rule, highest priority first."""
+    return jsonify({'rules': RuleController.rules()})
+
+@api_bp.route('/changes')
+@_json_errors
+def changes():
+    """
+    Stream what was added, edited or deleted since a version, oldest
+    first, to sync without reading whole tables again.
+
+    Without `since`, returns only the latest version: read the tables,
+    then ask for the changes since that version.
+
+    GET request parameters:
+    since: int (optional, the version of the last sync)
+    resource: str (optional, only that resource's changes)
+
+    Returns: JSON object
+    changes: list of object (version, resource, id, op: 'add' | 'edit' |
+        'delete' | 'archive', changed_at), where a cashflow's id is
+        [expense, income]
+    version: int (the `since` of the next sync)
+    """
+    if 'since' not in request.args:
+        return jsonify({'changes': [], 'version': ApiController.version()})
+    since = request.args.get('since', type=int)
+    assert since is not None, 'since must be a version number'
+    changes = ApiController.changes(since, request.args.get('resource'))
+    return Response(_stream_changes(changes, since),
+                    mimetype='application/json')
+
+@api_bp.route('/<resource>/<int:id>')
+@_json_errors
+def get(resource, id):
+    """Get one account, category, transaction, budget or rule."""
+    row = ApiController.get(resource, id)
+    if row is None:
+        return jsonify({'error': f'{resource} {id} not found'}), 404
+    return jsonify(row)
+
+@api_bp.route('/<resource>', methods=['POST'])
+@_json_errors
+def create(resource):
+    """
+    Add one row.
+
+    POST request body: JSON object with the row's fields (ex. accountid,
+    categoryid, amount, transactiondate and dscr for a transaction)
+    """
+    return jsonify({'id': ApiController.create(resource, _body())}), 201
+
+@api_bp.route('/<resource>/<int:id>', methods=['PATCH'])
+@_json_errors
+def update(resource, id):
+    """
+    Change some of a row's fields.
+
+    PATCH request body: JSON object with the fields to change
+    """
+    ApiController.update(resource, id, _body())
+    return jsonify({'id': id})
+
+@api_bp.route('/<resource>/<int:id>', methods=['DELETE'])
+@_json_errors
+def delete(resource, id):
+    """Delete one row."""
+    ApiController.delete(resource, id)
+    return jsonify({'id': id})
+
+@api_bp.route('/batch', methods=['POST'])
+@_json_errors
+def batch():
+    """
+    Apply many changes in one database transaction.
+
+    Either every operation is saved or none are. The error names the
+    index of the operation that failed.
+
+    POST request body: JSON object
+    operations: list of object, at most 1000
+        op: 'create' | 'update' | 'delete'
+        resource: str ('accounts', 'categories', 'transactions',
+            'budgets', 'cashflows' or 'rules')
+        id: int (update and delete)
+        data: object (create and update, the fields like `create()`
+            and `update()`)
+
+    Returns:
+    results: list of object (id), in the same order as the operations
+    """
+    body = _body()
+    assert isinstance(body, dict), 'Send an object with operations'
+    return jsonify({'results': ApiController.batch(body.get('operations'))})
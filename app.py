@@ -1,17 +1,29 @@
 __all__ = ['app', 'DB_CONFIG', 'create_app']
 
-from os import environ
+from datetime import date
+from os import environ, makedirs
 
 from flask import Flask, request, abort
-from logging import basicConfig, INFO
+from flask.json.provider import DefaultJSONProvider
+from jinja2 import FileSystemBytecodeCache
+from logging import basicConfig, error, INFO
 
 from utils.config import config, is_dotenv_loaded
 
 # dotenv should be loaded in config
 assert is_dotenv_loaded, 'Load dotenv before running app'
 
+class _JSONProvider(DefaultJSONProvider):
+    # Send dates as ISO 8601 strings instead of HTTP dates
+    @staticmethod
+    def default(o):
+        if isinstance(o, date):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
 _config_name = environ.get('CONFIG_NAME')
 app = Flask(__name__)
+app.json = _JSONProvider(app)
 app.config.from_object(config.get(_config_name, config['default']))
 DB_CONFIG = app.config['DB_CONFIG']
 
@@ -35,15 +47,75 @@ def set_security_headers(response): # Allow Bootstrap and Font Awesome
     response.headers['Referrer-Policy'] = 'strict-origin-when-cross-origin'
     return response
 
+def _precompile_templates():
+    # Compile every template now instead of on its first request
+    #
+    # Compiled templates are cached on disk, so workers started after
+    # the first one (or after a restart) only load the bytecode.
+    cache_dir = app.config['TEMPLATE_CACHE_DIR']
+    if cache_dir:
+        makedirs(cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    else:
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
 def create_app():
     from account import acct_bp
+    from api import api_bp
     from budget import budget_bp
     from cashflow import cashflow_bp
     from category import category_bp
+    from job import job_bp
+    from report import report_bp
+    from rule import rule_bp
     from transact import transact_bp
+    from utils.assets import assets_bp
+    from utils.metrics import metrics_bp
 
     app.register_blueprint(acct_bp)
+    app.register_blueprint(api_bp)
     app.register_blueprint(budget_bp)
     app.register_blueprint(cashflow_bp)
     app.register_blueprint(category_bp)
-    app.register_blueprint(transact_bp)
\ No newline at end of file
+    app.register_blueprint(job_bp)
+    app.register_blueprint(report_bp)
+    app.register_blueprint(rule_bp)
+    app.register_blueprint(transact_bp)
+    app.register_blueprint(assets_bp)
+    app.register_blueprint(metrics_bp)
+
+    # Work that can run in the background (see `JobController`)
+    from account import AcctController
+    from cashflow import CashflowController
+    from job import JobController
+    from report import ReportController
+    from rule import RuleController
+    from transact import TransactController
+    from transact.categorizer import Categorizer
+    from transact.transact_cache import TransactCache
+
+    JobController.register('cashflow.verify', CashflowController.verify,
+                           version=CashflowController.verify_version)
+    JobController.register('acct.rebuild_balance_index', 
+                           lambda progress: AcctController.rebuild_balance_index())
+    JobController.register('report.recurring', ReportController.recurring)
+    JobController.register('rule.apply', RuleController.apply)
+    JobController.register('transact.backfill_fingerprints', 
+                           TransactController.backfill_fingerprints)
+    JobController.register('transact.rebuild_categorizer', 
+                           Categorizer.rebuild)
+    if app.config['TRANSACT_CACHE']:
+        JobController.register('transact.refresh_cache', 
+                               lambda progress: TransactCache.refresh())
+    try:
+        JobController.recover()
+    except Exception:
+        error('Could not check for jobs of stopped processes', exc_info=True)
+
+    _precompile_templates()
+
+    from utils.profiler import init_profiler
+    init_profiler(app)
+    return app
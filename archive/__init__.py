@@ -0,0 +1 @@
+from .archive_controller import ArchiveController
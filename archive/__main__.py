@@ -0,0 +1,21 @@
+# Archive closed years: python -m archive <year>
+
+from argparse import ArgumentParser
+
+from . import ArchiveController
+
+parser = ArgumentParser(
+    prog='python -m archive',
+    description='Move every transaction of a year and earlier to the '
+                'archive. Archived transactions can no longer be changed.'
+)
+parser.add_argument('year', type=int)
+year = parser.parse_args().year
+
+try:
+    count = ArchiveController.archive(
+        year, lambda percent, message='': print(f'{percent}% {message}')
+    )
+except AssertionError as e:
+    parser.exit(1, f'{e}\n')
+print(f'Archived {count} transactions through {year}')
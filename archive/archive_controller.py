@@ -0,0 +1,52 @@
+__all__ = ['ArchiveController']
+
+from calendar import monthrange
+from datetime import date
+
+from .archive_model import ArchiveModel
+
+class ArchiveController:
+    @staticmethod
+    def archive(year, progress=lambda *args: None):
+        # Move every transaction of `year` and earlier to the archive
+        #
+        # Archived transactions still show in transaction pages, ledgers,
+        # budgets and reports, but can't be added, edited or deleted.
+        # Each account's archived total is carried forward as its opening
+        # balance, so balances don't change.
+        #
+        # The years are closed to new transactions first, then moved one
+        # month at a time, each month in its own database transaction so
+        # other requests only wait briefly. Running it again for the same
+        # year finishes a run that stopped partway.
+        #
+        # :param year: int
+        # :param progress: function (percent, message='')
+        #
+        # Returns: int (number of transactions archived)
+        #
+        # Raises AssertionError when:
+        #     `year` hasn't ended
+        #     a later year is already archived
+        through = date(year, 12, 31)
+        assert through < date.today(), f'{year} has not ended yet'
+        archived_through = ArchiveModel.get_archived_through()
+        assert archived_through is None or through >= archived_through, \
+            f'Years through {archived_through.year} are already archived'
+        if archived_through != through:
+            ArchiveModel.add_archive(through)
+
+        first = ArchiveModel.get_first_date()
+        if first is None or first > through:
+            return 0
+        total = ArchiveModel.count(through)
+        done = 0
+        for index in range(first.year * 12 + first.month - 1, year * 12 + 12):
+            year_, month = index // 12, index % 12 + 1
+            end = date(year_, month, monthrange(year_, month)[1])
+            count = ArchiveModel.count(end)
+            if count:
+                ArchiveModel.move(end)
+                done += count
+            progress(done * 100 // total, f'{done} of {total} through {end}')
+        return done
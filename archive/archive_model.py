@@ -0,0 +1,125 @@
+from utils.db import db_commit, db_fetchone
+from utils.statements import statement
+
+class ArchiveModel:
+    # Every statement moves the rows on or before one date (%s)
+    __through = 'WHERE transactiondate <= %s'
+    __ids_through = """
+            (SELECT transactionid FROM transact WHERE transactiondate <= %s)
+        """
+    __with_archived_leg = ' '.join([
+        'WHERE c.expense IN', __ids_through, 'OR c.income IN', __ids_through
+    ])
+    __columns = """
+            transactionid, accountid, categoryid, amount, transactiondate,
+            dscr, fingerprint
+        """
+
+    __get_archived_through = statement(
+        'archive.get_archived_through',
+        'SELECT MAX(through_date) as through_date FROM archive'
+    )
+    __add_archive = statement('archive.add_archive',
+                              'INSERT INTO archive (through_date) VALUES (%s)')
+    __get_first_date = statement(
+        'archive.get_first_date',
+        'SELECT MIN(transactiondate) as first_date FROM transact'
+    )
+    __count = statement('archive.count',
+                        'SELECT COUNT(*) as total FROM transact', __through)
+    # Cashflows go first: their foreign keys hold the transactions
+    __log_cashflows = statement(
+        'archive.log_cashflows',
+        """
+            INSERT INTO change_log (table_name, row_id, row_id2, op)
+            SELECT 'cashflow', c.expense, c.income, 'archive'
+            FROM cashflow c
+        """,
+        __with_archived_leg
+    )
+    __copy_cashflows = statement(
+        'archive.copy_cashflows',
+        """
+            INSERT INTO cashflow_archive (expense, income, type_)
+            SELECT c.expense, c.income, c.type_
+            FROM cashflow c
+        """,
+        __with_archived_leg
+    )
+    __delete_cashflows = statement(
+        'archive.delete_cashflows',
+        """
+            DELETE c
+            FROM cashflow c
+            JOIN cashflow_archive a ON a.expense = c.expense
+                AND a.income = c.income
+        """
+    )
+    __add_opening_balances = statement(
+        'archive.add_opening_balances',
+        """
+            INSERT INTO opening_balance (accountid, balance, transactions)
+            SELECT * FROM (
+                SELECT accountid, SUM(amount) as balance,
+                    COUNT(*) as transactions
+                FROM transact
+        """,
+        __through,
+        """
+                GROUP BY accountid
+            ) new
+            ON DUPLICATE KEY UPDATE
+                balance = opening_balance.balance + new.balance,
+                transactions = opening_balance.transactions + new.transactions
+        """
+    )
+    __copy_transactions = statement(
+        'archive.copy_transactions',
+        'INSERT INTO transact_archive (', __columns, ')',
+        'SELECT', __columns, 'FROM transact', __through
+    )
+    __log_transactions = statement(
+        'archive.log_transactions',
+        """
+            INSERT INTO change_log (table_name, row_id, op)
+            SELECT 'transact', transactionid, 'archive'
+            FROM transact
+        """,
+        __through
+    )
+    __delete_transactions = statement('archive.delete_transactions',
+                                      'DELETE FROM transact', __through)
+
+    @classmethod
+    def get_archived_through(cls):
+        # Returns: date or None
+        return db_fetchone(cls.__get_archived_through)['through_date']
+
+    @classmethod
+    def add_archive(cls, through):
+        # Close every day up to `through` to new writes
+        db_commit(cls.__add_archive, (through,), return_id=False)
+
+    @classmethod
+    def get_first_date(cls):
+        # Returns: date or None (the oldest transaction not archived)
+        return db_fetchone(cls.__get_first_date)['first_date']
+
+    @classmethod
+    def count(cls, through):
+        return db_fetchone(cls.__count, (through,))['total']
+
+    @classmethod
+    def move(cls, through):
+        # Move the transactions on or before `through`, their cashflows,
+        # and their total to the opening balances, in one transaction
+        db_commit(
+            cls.__log_cashflows, (through, through),
+            cls.__copy_cashflows, (through, through),
+            cls.__delete_cashflows, (),
+            cls.__add_opening_balances, (through,),
+            cls.__copy_transactions, (through,),
+            cls.__log_transactions, (through,),
+            cls.__delete_transactions, (through,),
+            return_id=False
+        )
@@ -1,3 +1,6 @@
+-- Creates the tables of a new database. Databases made with an older
+-- version are upgraded by the scripts in migrations/, so add every
+-- change here to a new script there too.
 CREATE TABLE Acct (
     accountid INT AUTO_INCREMENT PRIMARY KEY,
     accountname VARCHAR(50) NOT NULL,
@@ -16,6 +19,13 @@ CREATE TABLE transact (
     amount DECIMAL(12,2) NOT NULL CHECK (amount != 0),
     transactiondate DATE NOT NULL,
     dscr VARCHAR(50) NOT NULL,
+    -- Hash of account, amount and description (see transact/fingerprint.py)
+    fingerprint CHAR(32),
+    INDEX (fingerprint, transactiondate),
+    -- Reads one account's dates in (date, amount) order for reconciling
+    INDEX (accountid, transactiondate, amount),
+    -- Date ranges of reports and budgets, and the yearly archive
+    INDEX (transactiondate),
     FOREIGN KEY (accountid) REFERENCES acct(accountid),
     FOREIGN KEY (categoryid) REFERENCES category(categoryid)
 );
@@ -37,4 +47,123 @@ CREATE TABLE cashflow (
     PRIMARY KEY (expense, income),
     FOREIGN KEY (expense) REFERENCES transact(transactionid),
     FOREIGN KEY (income) REFERENCES transact(transactionid)
-);
\ No newline at end of file
+);
+
+-- Closing balance of each account on each day it has transactions
+-- Maintained by `TransactModel` on every write
+CREATE TABLE acct_balance (
+    accountid INT NOT NULL,
+    balance_date DATE NOT NULL,
+    balance DECIMAL(14,2) NOT NULL,
+    PRIMARY KEY (accountid, balance_date),
+    INDEX (balance_date),
+    FOREIGN KEY (accountid) REFERENCES acct(accountid)
+);
+
+-- Build acct_balance from existing transactions
+INSERT INTO acct_balance (accountid, balance_date, balance)
+SELECT accountid, transactiondate,
+    SUM(SUM(amount)) OVER (PARTITION BY accountid ORDER BY transactiondate)
+FROM transact
+GROUP BY accountid, transactiondate;
+
+-- Every add, edit and delete, in order, for caches and API clients to
+-- catch up on (see `ApiController.changes()`)
+CREATE TABLE change_log (
+    changeid BIGINT AUTO_INCREMENT PRIMARY KEY,
+    -- Set when the write commits, from change_version, so versions
+    -- follow commit order (see `utils.db`). Every change of one commit
+    -- has the same version.
+    version BIGINT,
+    connection_id BIGINT UNSIGNED NOT NULL DEFAULT (CONNECTION_ID()),
+    table_name VARCHAR(20) NOT NULL,
+    row_id INT NOT NULL,
+    -- The second key of rows keyed by two IDs (a cashflow's income
+    -- transaction, with its expense transaction in row_id)
+    row_id2 INT,
+    -- 'archive': moved to transact_archive (see `ArchiveController`)
+    op ENUM('add', 'edit', 'delete', 'archive') NOT NULL,
+    changed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX (version),
+    INDEX (table_name, version),
+    INDEX (connection_id, version)
+);
+
+-- The last change_log version given out
+CREATE TABLE change_version (
+    version BIGINT NOT NULL
+);
+INSERT INTO change_version (version) VALUES (0);
+
+-- Background jobs and their progress (see `JobController`)
+CREATE TABLE job (
+    jobid INT AUTO_INCREMENT PRIMARY KEY,
+    jobname VARCHAR(50) NOT NULL,
+    status ENUM('Queued', 'Running', 'Done', 'Failed') NOT NULL DEFAULT 'Queued',
+    progress TINYINT NOT NULL DEFAULT 0,
+    message VARCHAR(255) NOT NULL DEFAULT '',
+    queued_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    started_at DATETIME,
+    finished_at DATETIME,
+    -- Updated while the process that queued it is alive, so the jobs of
+    -- a process that died can be marked as failed (see
+    -- `JobController.recover()`)
+    heartbeat_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX (jobname, jobid),
+    INDEX (status, heartbeat_at)
+);
+
+-- Categorization rules, applied by `RuleController`
+CREATE TABLE rule (
+    ruleid INT AUTO_INCREMENT PRIMARY KEY,
+    pattern VARCHAR(50) NOT NULL,
+    match_type ENUM('Contains', 'Starts with') NOT NULL DEFAULT 'Contains',
+    accountid INT,
+    amount_sign ENUM('Any', 'Expense', 'Income') NOT NULL DEFAULT 'Any',
+    categoryid INT NOT NULL,
+    priority INT NOT NULL DEFAULT 0,
+    FOREIGN KEY (accountid) REFERENCES acct(accountid),
+    FOREIGN KEY (categoryid) REFERENCES category(categoryid)
+);
+
+-- Closed years, moved out of the tables above by `ArchiveController`.
+-- Rows are never changed once archived. MySQL can't partition tables
+-- with foreign keys, so old years are moved instead.
+CREATE TABLE archive (
+    through_date DATE PRIMARY KEY, -- Every transaction on or before it
+    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE transact_archive (
+    transactionid INT PRIMARY KEY,
+    accountid INT NOT NULL,
+    categoryid INT NOT NULL,
+    amount DECIMAL(12,2) NOT NULL,
+    transactiondate DATE NOT NULL,
+    dscr VARCHAR(50) NOT NULL,
+    fingerprint CHAR(32),
+    INDEX (fingerprint, transactiondate),
+    INDEX (accountid, transactiondate, amount),
+    INDEX (transactiondate),
+    FOREIGN KEY (accountid) REFERENCES acct(accountid),
+    FOREIGN KEY (categoryid) REFERENCES category(categoryid)
+) ROW_FORMAT=COMPRESSED;
+
+-- Cashflows with an archived leg (the other leg can still be in
+-- transact, so there are no foreign keys)
+CREATE TABLE cashflow_archive (
+    expense INT NOT NULL,
+    income INT NOT NULL,
+    type_ ENUM('Business', 'Transfer') NOT NULL,
+    PRIMARY KEY (expense, income),
+    INDEX (income)
+) ROW_FORMAT=COMPRESSED;
+
+-- Total and count of each account's archived transactions, carried
+-- forward into balances and ledgers of the open years
+CREATE TABLE opening_balance (
+    accountid INT PRIMARY KEY,
+    balance DECIMAL(14,2) NOT NULL,
+    transactions INT NOT NULL,
+    FOREIGN KEY (accountid) REFERENCES acct(accountid)
+);
@@ -1,24 +1,55 @@
 __all__ = ['BudgetController']
 
+from calendar import monthrange
+from datetime import date, timedelta
 from decimal import Decimal
 
+import numpy as np
+
+from report import ReportController
 from .budget_model import BudgetModel
 
 class BudgetController:
     @staticmethod
-    def budgets(year, month):
+    def budgets(year, month, recurring=None):
         # Controller to get all budgets
         # :param year: int (budget year)
         # :param month: int (budget month)
+        # :param recurring: list of dict (recurring items for the 
+        #     projections, see `ReportController.recurring()`)
         totalSpent = 0
         budgetSpending = 0
         budgetIncome = 0
         total_income = 0
+        projectedSpending = 0
         budgets = BudgetModel.get_budgets(year, month)
+        today = date.today()
+        due = ReportController.due_by_category(
+            recurring or [], today + timedelta(1), 
+            date(year, month, monthrange(year, month)[1])
+        )
+        forecast = BudgetController.forecast(year, month, today=today, 
+                                             recurring=due)
         for budget in budgets:
             actual = budget['actual'] # Actual expenses are negative
             absActual = abs(actual) # Budgets are positive numbers
             budget['remaining'] = budget['budget_amount'] - absActual
+            projection = forecast.get(budget['categoryid'])
+            projected = projection['projected'] if projection else actual
+            budget['daily_burn'] = (abs(projection['daily_burn']) 
+                                    if projection else 0)
+            budget['risk'] = None
+            if budget['type_'] == 'Expense':
+                budget['projected'] = 0 - projected # Show spending positive
+                projectedSpending += budget['projected']
+                if budget['projected'] > budget['budget_amount']:
+                    budget['risk'] = 'Over budget'
+                elif budget['projected'] > budget['budget_amount'] * Decimal('0.9'):
+                    budget['risk'] = 'At risk'
+            else:
+                budget['projected'] = projected
+                if projected < budget['budget_amount']:
+                    budget['risk'] = 'Short'
             if budget['type_'] == 'Expense': # Handle expense categories
                 budgetSpending += budget['budget_amount']
                 if actual > 0: # Handle expense categories with income
@@ -37,12 +68,96 @@ class BudgetController:
         summary = {'total_budgeted': budgetSpending,
                    'total_spent': totalSpent,
                    'total_remaining': budgetSpending - totalSpent,
+                   'projected_spent': projectedSpending,
                    'budget_income': budgetIncome,
                    'total_income': total_income,
                    'total_remaining_income': budgetIncome - total_income}
             
         return budgets, summary
         
+    @staticmethod
+    def forecast(year, month, history=3, today=None, recurring=None):
+        # Project each category's total at the end of a month
+        #
+        # projected = spent to date + what is usually spent in the rest
+        # of the month. "Usually" is the average, over the `history`
+        # months before, of what was spent after the same day of the
+        # month. Known recurring items still due this month are a floor
+        # for that remainder. One query fetches daily totals for every
+        # month, and cumulative sums over a (category, month, day)
+        # array give every figure at once.
+        #
+        # :param year: int
+        # :param month: int
+        # :param history: int (past months to average over)
+        # :param today: date (default today)
+        # :param recurring: dict of categoryid: Decimal (amount of
+        #     recurring items still due this month, signed like
+        #     transactions)
+        #
+        # Returns: dict of categoryid: dict of Decimal (to_date,
+        #     projected, daily_burn), signed like transactions, for
+        #     categories with transactions in the months used
+        #
+        # O(c * m) (where c = categories, m = history months)
+        today = today or date.today()
+        current = year * 12 + month - 1
+        first = current - history
+        columns = BudgetModel.get_daily_totals(
+            date(first // 12, first % 12 + 1, 1),
+            date((current + 1) // 12, (current + 1) % 12 + 1, 1)
+        )
+        ids = np.asarray(columns['categoryid'], dtype=np.int64)
+        if ids.size == 0:
+            return {}
+
+        # Scatter the daily totals into (category, month, day) cells
+        category_ids, rows = np.unique(ids, return_inverse=True)
+        cents = np.zeros((len(category_ids), history + 1, 31), 
+                         dtype=np.int64)
+        np.add.at(cents, (rows, 
+                          np.asarray(columns['month_index'], dtype=np.int64) 
+                          - first, 
+                          np.asarray(columns['day'], dtype=np.int64) - 1), 
+                  np.asarray(columns['cents'], dtype=np.int64))
+        through = cents.cumsum(axis=2) # Total through each day
+
+        days = monthrange(year, month)[1]
+        if (year, month) < (today.year, today.month):
+            elapsed = days
+        elif (year, month) == (today.year, today.month):
+            elapsed = today.day
+        else:
+            elapsed = 0
+
+        totals = through[:, :, -1]
+        if elapsed:
+            to_date = through[:, -1, elapsed - 1]
+            rest = totals[:, :-1] - through[:, :-1, elapsed - 1]
+        else:
+            to_date = np.zeros(len(category_ids), dtype=np.int64)
+            rest = totals[:, :-1]
+        rest = rest.mean(axis=1) if history else np.zeros(len(category_ids))
+        if recurring:
+            due = np.array([int(recurring.get(int(i), 0) * 100) 
+                            for i in category_ids])
+            rest = np.where(np.abs(due) > np.abs(rest), due, rest)
+        projected = to_date + (rest if elapsed < days else 0)
+
+        past_days = sum([monthrange(i // 12, i % 12 + 1)[1] 
+                         for i in range(first, current)])
+        daily_burn = totals[:, :-1].sum(axis=1) / max(past_days, 1)
+
+        cents_to_decimal = lambda x: Decimal(int(round(x))) / 100
+        return {
+            int(category_id): {
+                'to_date': cents_to_decimal(to_date[i]),
+                'projected': cents_to_decimal(projected[i]),
+                'daily_burn': cents_to_decimal(daily_burn[i])
+            }
+            for i, category_id in enumerate(category_ids.tolist())
+        }
+
     @staticmethod
     def get_budget(budget_id):
         return BudgetModel.get_budget(budget_id)
@@ -70,9 +185,77 @@ class BudgetController:
         #     amount == 0
         #     budget_month is not one of the 12 months
         #     budget_year is not in the 2020s
+        # Returns: int (the new budget ID)
         budget_amount = cls.assert_budget(budget_year, budget_month, amount)
-        BudgetModel.add_budget(category_id, budget_year, budget_month, 
-                               budget_amount)
+        return BudgetModel.add_budget(category_id, budget_year, budget_month, 
+                                      budget_amount)
+        
+    @classmethod
+    def copy_budgets(cls, from_year, from_month, start_year, start_month, 
+                     end_year, end_month):
+        # Copy one month's budgets into a range of months
+        #
+        # Budgets already in the range are overwritten, and all of them
+        # are saved with one statement.
+        #
+        # :param from_year: int
+        # :param from_month: int
+        # :param start_year: int
+        # :param start_month: int
+        # :param end_year: int
+        # :param end_month: int (the range includes this month)
+        #
+        # Returns: int (number of budgets saved)
+        #
+        # Raises AssertionError when:
+        #     the month copied from has no budgets
+        #     the range is empty or any month is invalid (see 
+        #         `assert_budget()`)
+        first = start_year * 12 + start_month - 1
+        last = end_year * 12 + end_month - 1
+        assert first <= last, 'Start must not be after end'
+        budgets = BudgetModel.get_month_budgets(from_year, from_month)
+        assert budgets, 'There are no budgets to copy'
+
+        rows = []
+        for i in range(first, last + 1):
+            year, month = i // 12, i % 12 + 1
+            for budget in budgets:
+                amount = cls.assert_budget(year, month, 
+                                           budget['budget_amount'])
+                rows.append((budget['categoryid'], year, month, amount))
+        BudgetModel.upsert_budgets(rows)
+        return len(rows)
+
+    @staticmethod
+    def year_budgets(year):
+        # Budget amounts for a year by category and month
+        # Returns: dict of categoryid: dict of month: Decimal
+        grid = {}
+        for budget in BudgetModel.get_year_budgets(year):
+            grid.setdefault(budget['categoryid'], {})[
+                budget['budget_month']] = budget['budget_amount']
+        return grid
+
+    @classmethod
+    def save_year(cls, year, amounts):
+        # Save a year of budgets at once
+        #
+        # :param year: int
+        # :param amounts: dict of (categoryid, month): str (blank cells 
+        #     are left as they are)
+        #
+        # Returns: int (number of budgets saved)
+        #
+        # Raises AssertionError when any amount or month is invalid 
+        #     (see `assert_budget()`)
+        rows = [(category_id, year, month, 
+                 cls.assert_budget(year, month, amount))
+                for (category_id, month), amount in amounts.items()
+                if amount.strip() != '']
+        assert rows, 'Enter at least one amount'
+        BudgetModel.upsert_budgets(rows)
+        return len(rows)
         
     @classmethod
     def edit_budget(cls, budget_id, categoryid, budget_year, budget_month, amount):
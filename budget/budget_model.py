@@ -1,73 +1,200 @@
-from utils.db import db_commit, get_db_connection, db_fetchone, db_fetchall, join
+from datetime import date
+from json import dumps
+
+from utils.db import (db_commit, db_fetchone, db_fetchall, db_fetchcolumns,
+                      db_commit_many, db_transaction)
+from utils.statements import statement
 
 class BudgetModel:
     __select_all = 'SELECT * FROM budget'
     __where_id = 'WHERE budgetid = %s'
+    __update = 'UPDATE budget'
+    __log_change = statement(
+        'budget.log_change',
+        """
+            INSERT INTO change_log (table_name, row_id, op)
+            VALUES ('budget', %s, %s)
+        """
+    )
+
+    # Transactions from %s (inclusive) to %s (exclusive), including
+    # archived years. Ranges in open years find nothing in the archive's
+    # date index, so they only read `transact`.
+    __in_range = """
+            SELECT categoryid, transactiondate, amount
+            FROM transact
+            WHERE transactiondate >= %s AND transactiondate < %s
+            UNION ALL
+            SELECT categoryid, transactiondate, amount
+            FROM transact_archive
+            WHERE transactiondate >= %s AND transactiondate < %s
+        """
+    # Actual spending for each budget is summed in the same statement
+    __get_budgets = statement(
+        'budget.get_budgets',
+        """
+            SELECT b.*, c.categoryname, c.type_,
+                COALESCE(t.actual, 0) as actual
+            FROM budget b
+            JOIN category c ON b.categoryid = c.categoryid
+            LEFT JOIN (
+                SELECT categoryid, SUM(amount) as actual
+                FROM (
+        """,
+        __in_range,
+        """
+                ) m
+                GROUP BY categoryid
+            ) t ON t.categoryid = b.categoryid
+            WHERE b.budget_year = %s AND b.budget_month = %s
+            ORDER BY c.categoryname
+        """
+    )
+    # Months are numbered as year * 12 + month - 1 (see `ReportModel`)
+    __get_daily_totals = statement(
+        'budget.get_daily_totals',
+        """
+            SELECT categoryid,
+                YEAR(transactiondate) * 12 + MONTH(transactiondate) - 1
+                    as month_index,
+                DAY(transactiondate) as day,
+                CAST(SUM(amount) * 100 AS SIGNED) as cents
+            FROM (
+        """,
+        __in_range,
+        """
+            ) t
+            GROUP BY categoryid, month_index, day
+        """
+    )
+    __get_budget = statement('budget.get_budget', __select_all, __where_id)
+    __get_matching = statement(
+        'budget.get_matching_budgets',
+        __select_all,
+        'WHERE categoryid = %s AND budget_year = %s AND budget_month = %s'
+    )
+    __add_budget = statement(
+        'budget.add_budget',
+        """
+            INSERT INTO budget (categoryid, budget_year,
+            budget_month, budget_amount)
+            VALUES (%s, %s, %s, %s)
+        """
+    )
+    # Sent as one multi-row INSERT by `db_commit_many()`. Rows that
+    # already exist for a category and month get the new amount.
+    __upsert_budgets = statement(
+        'budget.upsert_budgets',
+        """
+            INSERT INTO budget (categoryid, budget_year,
+            budget_month, budget_amount)
+            VALUES (%s, %s, %s, %s) AS new
+            ON DUPLICATE KEY UPDATE budget_amount = new.budget_amount
+        """,
+        prepared=False
+    )
+    # Upserted rows are logged by key, as one JSON array of
+    # [categoryid, budget_year, budget_month], since an upsert doesn't
+    # return their IDs. New and changed rows are both logged as edits.
+    __log_upserts = statement(
+        'budget.log_upserts',
+        """
+            INSERT INTO change_log (table_name, row_id, op)
+            SELECT 'budget', b.budgetid, 'edit'
+            FROM JSON_TABLE(%s, '$[*]' COLUMNS (
+                categoryid INT PATH '$[0]',
+                budget_year INT PATH '$[1]',
+                budget_month INT PATH '$[2]'
+            )) k
+            JOIN budget b ON b.categoryid = k.categoryid
+                AND b.budget_year = k.budget_year
+                AND b.budget_month = k.budget_month
+        """
+    )
+    __get_month_budgets = statement(
+        'budget.get_month_budgets',
+        __select_all, 'WHERE budget_year = %s AND budget_month = %s'
+    )
+    __get_year_budgets = statement(
+        'budget.get_year_budgets',
+        __select_all, 'WHERE budget_year = %s'
+    )
+    __set_amount = statement('budget.set_budget_amount',
+                             __update, 'SET budget_amount = %s', __where_id)
+    __set_category = statement('budget.set_categoryid',
+                               __update, 'SET categoryid = %s', __where_id)
+    __set_year = statement('budget.set_budget_year',
+                           __update, 'SET budget_year = %s', __where_id)
+    __set_month = statement('budget.set_budget_month',
+                            __update, 'SET budget_month = %s', __where_id)
+    __delete = statement('budget.delete', 'DELETE FROM budget', __where_id)
 
-    @staticmethod
-    def get_budgets(year, month):
-        with get_db_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("""
-                           SELECT b.*, c.categoryname, c.type_
-                           FROM budget b
-                           JOIN category c ON b.categoryid = c.categoryid
-                           WHERE b.budget_year = %s AND b.budget_month = %s
-                           ORDER BY c.categoryname
-                           """, (year, month))
-            budgets = cursor.fetchall()
+    @classmethod
+    def get_budgets(cls, year, month):
+        start = date(year, month, 1)
+        end = date(year + month // 12, month % 12 + 1, 1)
+        return db_fetchall(cls.__get_budgets,
+                           (start, end, start, end, year, month))
 
-            # Calculate actual spending for each budget
-            for budget in budgets:
-                cursor.execute("""
-                               SELECT COALESCE(SUM(amount), 0) as actual
-                               FROM transact t
-                               WHERE t.categoryid = %s 
-                               AND YEAR(t.transactiondate) = %s 
-                               AND MONTH(t.transactiondate) = %s
-                               """, (budget['categoryid'], year, month))
-                
-                # execute() returns dict with only key 'actual'
-                budget['actual'] = cursor.fetchone()['actual']
+    @classmethod
+    def get_daily_totals(cls, start, end):
+        # Total of each category on each day, in integer cents
+        # :param start: date (inclusive)
+        # :param end: date (exclusive)
+        # Returns: dict of columns (categoryid, month_index, day, cents)
+        return db_fetchcolumns(cls.__get_daily_totals,
+                               (start, end, start, end))
 
-            return budgets
-        
     @classmethod
     def get_budget(cls, budget_id):
-        return db_fetchone(join(cls.__select_all, cls.__where_id), (budget_id,))
+        return db_fetchone(cls.__get_budget, (budget_id,))
+
+    @classmethod
+    def add_budget(cls, category_id, budget_year, budget_month,
+                   budget_amount):
+        with db_transaction():
+            budget_id = db_commit(
+                cls.__add_budget,
+                (category_id, budget_year, budget_month, budget_amount)
+            )
+            db_commit(cls.__log_change, (budget_id, 'add'), return_id=False)
+        return budget_id
+
+    @classmethod
+    def upsert_budgets(cls, budgets):
+        # Add or update many budgets with one multi-row statement
+        # :param budgets: list of tuple (categoryid, budget_year,
+        #     budget_month, budget_amount)
+        keys = dumps([[int(c), int(y), int(m)] for c, y, m, _ in budgets])
+        with db_transaction():
+            db_commit_many(cls.__upsert_budgets, budgets)
+            db_commit(cls.__log_upserts, (keys,), return_id=False)
+
+    @classmethod
+    def get_month_budgets(cls, year, month):
+        return db_fetchall(cls.__get_month_budgets, (year, month))
+
+    @classmethod
+    def get_year_budgets(cls, year):
+        return db_fetchall(cls.__get_year_budgets, (year,))
 
-    @staticmethod
-    def add_budget(category_id, budget_year, budget_month, budget_amount):
-        db_commit(
-            """
-                INSERT INTO budget (categoryid, budget_year, 
-                budget_month, budget_amount) 
-                VALUES (%s, %s, %s, %s)
-            """, (category_id, budget_year, budget_month, budget_amount)
-        )
-    
     @classmethod
     def edit_budget(cls, budget_id, category_id, budget_year, budget_month, budget_amount):
-        update = 'UPDATE budget'
-        query = join(
-            cls.__select_all, 
-            'WHERE categoryid = %s AND budget_year = %s AND budget_month = %s'
-        )
-        others = db_fetchall(query, (category_id, budget_year, budget_month))
+        others = db_fetchall(cls.__get_matching,
+                             (category_id, budget_year, budget_month))
         is_unique = all([i['budgetid'] != budget_id for i in others])
         assert is_unique, 'Budget is not unique'
         db_commit(
-            join(update, 'SET budget_amount = %s', cls.__where_id), 
-            (budget_amount, budget_id),
-            join(update, 'SET categoryid = %s', cls.__where_id),
-            (category_id, budget_id),
-            join(update, 'SET budget_year = %s', cls.__where_id),
-            (budget_year, budget_id),
-            join(update, 'SET budget_month = %s', cls.__where_id),
-            (budget_month, budget_id)
+            cls.__set_amount, (budget_amount, budget_id),
+            cls.__set_category, (category_id, budget_id),
+            cls.__set_year, (budget_year, budget_id),
+            cls.__set_month, (budget_month, budget_id),
+            cls.__log_change, (budget_id, 'edit'),
+            return_id=False
         )
 
     @classmethod
     def delete(cls, id):
-        return db_commit(join('DELETE FROM budget', cls.__where_id), (id,), 
-                         return_was_affected=True, return_id=False)
\ No newline at end of file
+        return db_commit(cls.__log_change, (id, 'delete'),
+                         cls.__delete, (id,),
+                         return_was_affected=True, return_id=False)
@@ -3,6 +3,8 @@ from datetime import datetime
 from flask import Blueprint, render_template, request
 
 from category import CatController
+from job import JobController
+from report import ReportController
 from utils.message import log_error, log_success, header_action, Model, Action
 from .budget_controller import BudgetController
 
@@ -20,7 +22,10 @@ def budgets():
     now = datetime.now()
     year = request.args.get('year', now.year, type=int)
     month = request.args.get('month', now.month, type=int)
-    budgets, summary = BudgetController.budgets(year, month)
+    recurring = JobController.result(
+        'report.recurring', max_age=ReportController.recurring_max_age
+    )['result']
+    budgets, summary = BudgetController.budgets(year, month, recurring)
     return render_template('budgets.html', budgets=budgets, year=year, 
                            month=month, datetime=datetime, summary=summary)
 
@@ -72,6 +77,76 @@ def add_budget():
                                datetime=datetime, mode=header_action(Action.add), year=now.year, month=now.month)
 
 
+@budget_bp.route('/budgets/copy', methods=['GET', 'POST'])
+@log_error(model=Model.budget, action=Action.add, 
+           pg_template='copy_budgets.html', datetime=datetime)
+def copy_budgets():
+    """
+    Copy one month's budgets into a range of months.
+
+    Budgets already in the range are overwritten.
+
+    POST request parameters:
+    from_year, from_month: int (the month to copy)
+    start_year, start_month: int
+    end_year, end_month: int (the range includes this month)
+
+    Raises:
+    POST request:
+    AssertionError when: (see `BudgetController.copy_budgets()`)
+        the month copied from has no budgets
+        the range is empty or has an invalid month
+    """
+    if request.method == 'POST':
+        form = {key: request.form.get(key, None, type=int) 
+                for key in ('from_year', 'from_month', 'start_year', 
+                            'start_month', 'end_year', 'end_month')}
+        BudgetController.copy_budgets(**form)
+        return log_success(Model.budget, Action.add, 
+                           year=form['start_year'], 
+                           month=form['start_month'])
+    else:
+        now = datetime.now()
+        return render_template('copy_budgets.html', datetime=datetime, 
+                               year=now.year, month=now.month)
+
+@budget_bp.route('/budgets/year', methods=['GET', 'POST'])
+@log_error(model=Model.budget, action=Action.edit, categories=[], 
+           grid={}, pg_template='budget_year.html', datetime=datetime)
+def budget_year():
+    """
+    View and edit a whole year of budgets as one grid.
+
+    Every cell is saved at once. Blank cells are left as they are.
+
+    GET request parameters:
+    year: int (default this year)
+
+    POST request parameters:
+    year: int
+    amount_<categoryid>_<month>: Decimal (one per cell)
+
+    Raises:
+    POST request:
+    AssertionError when an amount is 0 or not a number (see 
+        `BudgetController.save_year()`)
+    """
+    if request.method == 'POST':
+        year = request.form.get('year', None, type=int)
+        amounts = {}
+        for key, value in request.form.items():
+            if key.startswith('amount_'):
+                _, category_id, month = key.split('_')
+                amounts[(int(category_id), int(month))] = value
+        BudgetController.save_year(year, amounts)
+        return log_success(Model.budget, Action.edit, year=year)
+    else:
+        year = request.args.get('year', datetime.now().year, type=int)
+        return render_template('budget_year.html', year=year, 
+                               categories=CatController.categories(), 
+                               grid=BudgetController.year_budgets(year), 
+                               datetime=datetime)
+
 @budget_bp.route('/budgets/edit', methods=['GET', 'POST'])
 @log_error(model=Model.budget, action=Action.edit, categories=[],
            pg_template='add_edit_budget.html', datetime=datetime)
@@ -1,9 +1,11 @@
 __all__ = ['CashflowController']
 
+from asyncio import run
 from decimal import Decimal
 
 from transact import TransactController
 from category import CatController
+from utils.db import db_gather, db_transaction
 from .cashflow_model import CashflowModel
 
 class CashflowController:
@@ -47,8 +49,10 @@ class CashflowController:
         return CashflowModel.get_cashflows_by_type('Business')
 
     @classmethod
-    def verify_transfers(cls):
-        transfers = cls.get_transfers()
+    def verify_transfers(cls, transfers=None):
+        # :param transfers: list of dict (fetched when None)
+        if transfers is None:
+            transfers = cls.get_transfers()
         verified = []
         update = []
         for i in transfers:
@@ -64,8 +68,10 @@ class CashflowController:
         return verified, update
     
     @classmethod
-    def verify_business_cashflows(cls):
-        business_cashflows = cls.get_business_cashflows()
+    def verify_business_cashflows(cls, business_cashflows=None):
+        # :param business_cashflows: list of dict (fetched when None)
+        if business_cashflows is None:
+            business_cashflows = cls.get_business_cashflows()
         verified = []
         update = []
         for i in business_cashflows:
@@ -81,19 +87,18 @@ class CashflowController:
         return verified, update
         
     @classmethod
-    def _filter_cashflows(cls, cashflows):
+    def _filter_cashflows(cls, cashflows, used_ids):
         # For get_missing_cashflows()
-        expense_ids = cls.get_expense_ids()
-        income_ids = cls.get_income_ids()
-        result = [i for i in cashflows if i['transactionid'] not in expense_ids and i['transactionid'] not in income_ids]
-        return result
+        # :param used_ids: set of int (transactions already in a cashflow)
+        return [i for i in cashflows if i['transactionid'] not in used_ids]
 
     @classmethod
     def get_missing_cashflows(cls):
         t_transfer = TransactController.get_transfers()
         t_business = TransactController.get_business_transacts()
-        res_transfer = cls._filter_cashflows(t_transfer)
-        res_business = cls._filter_cashflows(t_business)
+        used_ids = set(cls.get_expense_ids()) | set(cls.get_income_ids())
+        res_transfer = cls._filter_cashflows(t_transfer, used_ids)
+        res_business = cls._filter_cashflows(t_business, used_ids)
         return res_transfer, res_business
 
     @staticmethod
@@ -104,8 +109,10 @@ class CashflowController:
     def get_income_ids():
         return [i['income'] for i in CashflowModel.get_income_ids()]
     
-    @staticmethod
-    def add_journal_entry(*args):
+    @classmethod
+    def add_journal_entry(cls, *args, type_='Business'):
+        # Add a multi-leg journal entry as one unit
+        #
         # Each transaction is a dictionary
         # Accepts an arbitrary number of dictionary
         # Salary example
@@ -114,10 +121,93 @@ class CashflowController:
         #       Revenue
         #       +10 Friend 1 paid back
         #       +20 Friend 2 paid back
-        # 
-        # Log each transaction independently, then log the cashflows
-        # 
-        pass
+        #
+        # Every leg is inserted in one batch, then every expense is
+        # linked to every income with one batch of cashflows, all in
+        # one database transaction.
+        # Legs aren't checked for duplicates: an entry often has equal
+        # legs (ex. two friends paying back the same amount).
+        #
+        # :param args: dict (accountid, categoryid, amount, 
+        #     transactiondate, dscr)
+        # :param type_: 'Business' | 'Transfer'
+        #
+        # Returns: list of int (the new transaction IDs, in order)
+        #
+        # Raises AssertionError when:
+        #     there isn't at least one expense and one income
+        #     the legs don't share one category
+        #     a transfer doesn't sum to 0 or spans several dates
+        #     any leg fails `TransactController.add_transactions()`
+        assert type_ in cls.get_types(), 'Cashflow type is not valid'
+        amounts = [Decimal(i['amount']) for i in args]
+        expenses = [i for i, amount in enumerate(amounts) if amount < 0]
+        incomes = [i for i, amount in enumerate(amounts) if amount > 0]
+        assert expenses, 'Journal entry needs at least one expense'
+        assert incomes, 'Journal entry needs at least one income'
+        categories = {str(i['categoryid']) for i in args}
+        assert len(categories) == 1, 'category must be the same'
+        if type_ == 'Transfer':
+            assert sum(amounts) == 0, 'Sum of both sides must be 0'
+            dates = {str(i['transactiondate']) for i in args}
+            assert len(dates) == 1, 'Date must be the same'
+
+        with db_transaction():
+            ids = TransactController.add_transactions(args, 
+                                                      allow_duplicates=True)
+            CashflowModel.add_cashflows([(ids[e], ids[i], type_)
+                                         for e in expenses for i in incomes])
+        return ids
+
+    @staticmethod
+    def verify_version():
+        # Changes whenever `verify()` could give a different result
+        return CashflowModel.get_version()
+
+    @classmethod
+    def verify(cls, progress=lambda *args: None):
+        # Check every cashflow and find transactions without one
+        #
+        # Runs as the 'cashflow.verify' job (see `JobController`). Call
+        # `verify_async()` instead from a running event loop.
+        #
+        # :param progress: function (percent, message)
+        #
+        # Returns: dict of the values for verify_cashflows.html
+        return run(cls.verify_async(progress))
+
+    @classmethod
+    async def verify_async(cls, progress=lambda *args: None):
+        # `verify()` with its independent queries run at the same time
+        progress(0, 'Loading cashflows and transactions')
+        (transfers, business, t_transacts, b_transacts, expense_ids, 
+         income_ids, t_total, b_total, adjustments) = await db_gather(
+            cls.get_transfers, cls.get_business_cashflows,
+            TransactController.get_transfers, 
+            TransactController.get_business_transacts,
+            cls.get_expense_ids, cls.get_income_ids,
+            (cls.sum_cashflows, 'Account Transfer'),
+            (cls.sum_cashflows, 'Business'),
+            cls.get_adjustments
+        )
+        progress(90, 'Verifying cashflows')
+        _, t_update = cls.verify_transfers(transfers)
+        _, b_update = cls.verify_business_cashflows(business)
+        used_ids = set(expense_ids) | set(income_ids)
+        adjustment_total = sum([i['amount'] for i in adjustments])
+        return {'t_update': t_update, 
+                't_missing': cls._filter_cashflows(t_transacts, used_ids), 
+                'b_update': b_update, 
+                'b_missing': cls._filter_cashflows(b_transacts, used_ids), 
+                'adjustments': adjustments, 't_total': t_total, 
+                'b_total': b_total, 'adjustment_total': adjustment_total}
+
+    @staticmethod
+    def get_adjustments():
+        # Transactions in the Balance Adjustment category
+        adjustment_id = CatController.get_category_by_name(
+            'Balance Adjustment')['categoryid']
+        return TransactController.filter_category([adjustment_id])
 
     @staticmethod
     def sum_cashflows(category_name):
@@ -1,63 +1,162 @@
-from utils.db import db_fetchall, db_commit, db_fetchone
+from utils.db import (db_fetchall, db_commit, db_fetchone, db_commit_many,
+                      db_transaction)
+from utils.statements import statement
 
 class CashflowModel:
-    @staticmethod
-    def get_cashflows(per_page=None, offset=None, return_total=True):
-        cashflows = db_fetchall("""
-            SELECT t.transactionid as expensetransactionid, 
-                a.accountname as expenseacct, c.categoryname as expensecat, 
-                t.transactiondate as expensedate, t.amount as expenseamount, 
-                t.dscr as expensedscr, r1.*, 
-                t2.transactionid as incometransactionid, 
-                a2.accountname as incomeacct, c2.categoryname as incomecat, 
-                t2.amount as incomeamount, t2.transactiondate as incomedate, 
+    # Cashflows are keyed by (expense, income), so both IDs are logged
+    __log_change = statement(
+        'cashflow.log_change',
+        """
+            INSERT INTO change_log (table_name, row_id, row_id2, op)
+            VALUES ('cashflow', %s, %s, 'add')
+        """
+    )
+    __log_changes = statement(
+        'cashflow.log_changes',
+        """
+            INSERT INTO change_log (table_name, row_id, row_id2, op)
+            VALUES ('cashflow', %s, %s, 'add')
+        """,
+        prepared=False
+    )
+    # Archived cashflows are listed too. Their legs can be in either
+    # transaction table, so each leg is looked up by ID in both.
+    __leg = """
+            JOIN LATERAL (
+                SELECT transactionid, accountid, categoryid, amount,
+                    transactiondate, dscr
+                FROM transact WHERE transactionid = r1.{0}
+                UNION ALL
+                SELECT transactionid, accountid, categoryid, amount,
+                    transactiondate, dscr
+                FROM transact_archive WHERE transactionid = r1.{0}
+            ) {1} ON TRUE
+        """
+    __get_cashflows = statement(
+        'cashflow.get_cashflows',
+        """
+            SELECT t.transactionid as expensetransactionid,
+                a.accountname as expenseacct, c.categoryname as expensecat,
+                t.transactiondate as expensedate, t.amount as expenseamount,
+                t.dscr as expensedscr, r1.*,
+                t2.transactionid as incometransactionid,
+                a2.accountname as incomeacct, c2.categoryname as incomecat,
+                t2.amount as incomeamount, t2.transactiondate as incomedate,
                 t2.dscr as incomedscr
-            FROM transact t
+            FROM (
+                SELECT expense, income, type_, 0 as archived FROM cashflow
+                UNION ALL
+                SELECT expense, income, type_, 1 FROM cashflow_archive
+            ) r1
+        """,
+        __leg.format('expense', 't'),
+        __leg.format('income', 't2'),
+        """
             JOIN acct a ON t.accountid = a.accountid
             JOIN category c ON t.CategoryID = c.CategoryID
-            JOIN cashflow r1 on t.transactionid = r1.expense
-            JOIN transact t2 on r1.income = t2.transactionid
             JOIN acct a2 on t2.accountid = a2.accountid
             JOIN category c2 on t2.categoryid = c2.categoryid
             ORDER BY t.transactiondate DESC, t.transactionid DESC
             LIMIT %s OFFSET %s
-        """, (per_page, offset))
-        
-        if return_total is True:
-            total = db_fetchone("""
-                SELECT COUNT(*) as total FROM cashflow
-            """)['total']
-            return cashflows, total
-        else:
-            return cashflows
-
-    @staticmethod
-    def add_cashflow(expenseid, incomeid, type_):
-        db_commit("""
-            INSERT INTO cashflow (expense, income, type_) 
+        """
+    )
+    __get_total = statement(
+        'cashflow.get_total',
+        """
+            SELECT (SELECT COUNT(*) FROM cashflow)
+                + (SELECT COUNT(*) FROM cashflow_archive) as total
+        """
+    )
+    __get_version = statement(
+        'cashflow.get_version',
+        """
+            SELECT COALESCE(MAX(version), 0) as version
+            FROM change_log
+            WHERE table_name IN ('cashflow', 'transact', 'category')
+        """
+    )
+    __add_cashflow = statement(
+        'cashflow.add_cashflow',
+        """
+            INSERT INTO cashflow (expense, income, type_)
             VALUES (%s, %s, %s)
-        """, (expenseid, incomeid, type_), return_id=False)
-
-    @staticmethod
-    def get_cashflows_by_type(type_):
-        return db_fetchall("""
+        """
+    )
+    __add_cashflows = statement(
+        'cashflow.add_cashflows',
+        """
+            INSERT INTO cashflow (expense, income, type_)
+            VALUES (%s, %s, %s)
+        """,
+        prepared=False
+    )
+    __get_by_type = statement(
+        'cashflow.get_cashflows_by_type',
+        """
             SELECT t.transactionid as expensetransactionid,
-                t.transactiondate as expensedate, t.amount as expenseamount, 
+                t.transactiondate as expensedate, t.amount as expenseamount,
                 t.dscr as expensedscr, t.categoryid as expensecategory,
                 t2.transactionid as incometransactionid,
-                t2.amount as incomeamount, t2.transactiondate as incomedate, 
+                t2.amount as incomeamount, t2.transactiondate as incomedate,
                 t2.dscr as incomedscr, t2.categoryid as incomecategory, r1.type_
             FROM transact t
             JOIN cashflow r1 on t.transactionid = r1.expense
             JOIN transact t2 on r1.income = t2.transactionid
             WHERE r1.type_ = %s
-            ORDER BY t.transactiondate DESC, t.transactionid DESC;
-        """, (type_,))
-    
-    @staticmethod
-    def get_expense_ids():
-        return db_fetchall('SELECT expense FROM cashflow')
-    
-    @staticmethod
-    def get_income_ids():
-        return db_fetchall('SELECT income FROM cashflow')
\ No newline at end of file
+            ORDER BY t.transactiondate DESC, t.transactionid DESC
+        """
+    )
+    # Transactions in a cashflow, archived ones included, so archived
+    # transfers aren't reported as missing their cashflow
+    __get_expense_ids = statement(
+        'cashflow.get_expense_ids',
+        'SELECT expense FROM cashflow',
+        'UNION ALL SELECT expense FROM cashflow_archive'
+    )
+    __get_income_ids = statement(
+        'cashflow.get_income_ids',
+        'SELECT income FROM cashflow',
+        'UNION ALL SELECT income FROM cashflow_archive'
+    )
+
+    @classmethod
+    def get_cashflows(cls, per_page=None, offset=None, return_total=True):
+        cashflows = db_fetchall(cls.__get_cashflows, (per_page, offset))
+
+        if return_total is True:
+            total = db_fetchone(cls.__get_total)['total']
+            return cashflows, total
+        else:
+            return cashflows
+
+    @classmethod
+    def get_version(cls):
+        # Changes whenever a cashflow, transaction or category is written
+        return db_fetchone(cls.__get_version)['version']
+
+    @classmethod
+    def add_cashflow(cls, expenseid, incomeid, type_):
+        db_commit(cls.__add_cashflow, (expenseid, incomeid, type_),
+                  cls.__log_change, (expenseid, incomeid),
+                  return_id=False)
+
+    @classmethod
+    def add_cashflows(cls, cashflows):
+        # :param cashflows: list of tuple (expenseid, incomeid, type_)
+        with db_transaction():
+            db_commit_many(cls.__add_cashflows, cashflows)
+            db_commit_many(cls.__log_changes,
+                           [(expenseid, incomeid)
+                            for expenseid, incomeid, _ in cashflows])
+
+    @classmethod
+    def get_cashflows_by_type(cls, type_):
+        return db_fetchall(cls.__get_by_type, (type_,))
+
+    @classmethod
+    def get_expense_ids(cls):
+        return db_fetchall(cls.__get_expense_ids)
+
+    @classmethod
+    def get_income_ids(cls):
+        return db_fetchall(cls.__get_income_ids)
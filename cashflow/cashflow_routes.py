@@ -3,8 +3,10 @@ from datetime import datetime
 
 from account import AcctController
 from category import CatController
-from transact import TransactController
+from job import JobController
+from utils.db import db_async
 from utils.message import log_error, log_success, header_action, Model, Action
+from utils.streaming import stream_page
 from .cashflow_controller import CashflowController
 
 cashflow_bp = Blueprint('cashflow', __name__)
@@ -41,6 +43,42 @@ def add_cashflow():
                                types=CashflowController.get_types(), 
                                mode=header_action(Action.add))
 
+@cashflow_bp.route('/cashflows/journal', methods=['GET', 'POST'])
+@log_error(model=Model.cashflow, action=Action.add, 
+           pg_template='add_journal_entry.html', accounts=[], categories=[], 
+           types=CashflowController.get_types())
+def add_journal_entry():
+    """
+    Add a journal entry with any number of legs.
+
+    On a POST request, every leg is added as a transaction and every 
+    expense is linked to every income, all at once.
+
+    POST request parameters:
+    categoryid: int
+    type: 'Business' | 'Transfer'
+    accountid, amount, transactiondate, dscr: one of each per leg
+    """
+    if request.method == 'POST':
+        category_id = request.form['categoryid']
+        type_ = request.form['type']
+        legs = [{'accountid': account_id, 'categoryid': category_id, 
+                 'amount': amount, 'transactiondate': date, 'dscr': dscr} 
+                for account_id, amount, date, dscr in zip(
+                    request.form.getlist('accountid'), 
+                    request.form.getlist('amount'), 
+                    request.form.getlist('transactiondate'), 
+                    request.form.getlist('dscr'))]
+        CashflowController.add_journal_entry(*legs, type_=type_)
+        return log_success(Model.cashflow, Action.add)
+    else:
+        accounts = AcctController.accounts(balance=False)
+        categories = CatController.categories()
+        return render_template('add_journal_entry.html', accounts=accounts, 
+                               categories=categories, 
+                               types=CashflowController.get_types(), 
+                               mode=header_action(Action.add))
+
 @cashflow_bp.route('/cashflows/edit', methods=['GET', 'POST'])
 @log_error(model=Model.cashflow, action=Action.edit, pg_template='add_edit_cashflow.html', 
            transactions=[], types=CashflowController.get_types())
@@ -54,30 +92,25 @@ def edit_cashflow():
 
 @cashflow_bp.route('/cashflows/verify')
 @log_error(model=Model.cashflow, action=Action.read, pg_template='verify_cashflows.html', cashflows=[])
-def verify():
-    """Verify that account transfers are accurate and paired"""
-    # Get transactions where cashflow is type transfer (Controller)
-    t_verified, t_update = CashflowController.verify_transfers()
-    # For each transfer, make sure the amounts on both sides are equal (Controller)
-
-    b_verified, b_update = CashflowController.verify_business_cashflows()
-
-    # Make sure that all transfers are cashflows, and raise exceptions for the ones that aren't (Controller)
-    t_missing, b_missing = CashflowController.get_missing_cashflows()
-    # Suggest transfers the user can confirm to add so that all transfers are paired (Controller)
-
-    # Display transfers that aren't paired (View)
-    # Display transfers that are paired, but aren't accurate (View)
-    # Suggest additions and revisions to the user (View)
-
-    t_total = CashflowController.sum_cashflows('Account Transfer')
-    b_total = CashflowController.sum_cashflows('Business')
+async def verify():
+    """
+    Verify that account transfers are accurate and paired.
 
-    adjustment_id = CatController.get_category_by_name('Balance Adjustment')['categoryid']
-    adjustments = TransactController.filter_category([adjustment_id])
-    adjustment_total = sum([i['amount'] for i in adjustments])
+    Serves the last result of the 'cashflow.verify' job right away, and
+    refreshes it in the background once it is stale or a cashflow,
+    transaction or category has changed since it. Without a result, it
+    is computed with its queries run at the same time.
 
-    return render_template('verify_cashflows.html', t_update=t_update, t_missing=t_missing, b_update=b_update, b_missing=b_missing, adjustments=adjustments, t_total=t_total, b_total=b_total, adjustment_total=adjustment_total)
+    GET request parameters:
+    refresh: int (1: recompute now)
+    """
+    if request.args.get('refresh', 0, type=int) == 1:
+        JobController.expire('cashflow.verify')
+    # In a thread, since the job starts its own event loop
+    verified = await db_async(JobController.result, 'cashflow.verify')
+    return stream_page('verify_cashflows.html', **verified['result'], 
+                       computed_at=verified['computed_at'], 
+                       refreshing=verified['refreshing'])
 
 @cashflow_bp.route('/cashflows/add_transfer', methods=['GET', 'POST'])
 @log_error(model=Model.cashflow, action=Action.read, pg_template='add_transfer.html', cashflows=[])
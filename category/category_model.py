@@ -1,45 +1,71 @@
-from utils.db import db_fetchall, db_commit, db_fetchone, join
+from utils.db import db_fetchall, db_commit, db_fetchone, db_transaction
+from utils.statements import statement
 
 class CategoryModel:
     __where_id = ' WHERE categoryid = %s'
     __select_all = 'SELECT * FROM category'
+    __update = 'UPDATE category'
+    __log_change = statement(
+        'category.log_change',
+        """
+            INSERT INTO change_log (table_name, row_id, op)
+            VALUES ('category', %s, %s)
+        """
+    )
 
-    @staticmethod
-    def get_categories():
+    __get_categories = statement('category.get_categories',
+                                 __select_all, 'ORDER BY categoryname')
+    __get_category = statement('category.get_category',
+                               __select_all, __where_id)
+    __get_by_name = statement('category.get_category_by_name',
+                              __select_all, 'WHERE categoryname = %s')
+    __add_category = statement(
+        'category.add_category',
+        """
+            INSERT INTO category (categoryname, type_)
+            VALUES (%s, %s)
+        """
+    )
+    __set_name = statement('category.set_categoryname',
+                           __update, 'SET categoryname = %s', __where_id)
+    __set_type = statement('category.set_type_',
+                           __update, 'SET type_ = %s', __where_id)
+    __delete = statement('category.delete',
+                         'DELETE FROM category', __where_id)
+
+    @classmethod
+    def get_categories(cls):
         # Fetch all categories
-        return db_fetchall('SELECT * FROM category ORDER BY categoryname')
-    
+        return db_fetchall(cls.__get_categories)
+
     @classmethod
     def get_category(cls, categoryid):
-        return db_fetchone(join(cls.__select_all, cls.__where_id), (categoryid,))
+        return db_fetchone(cls.__get_category, (categoryid,))
 
     @classmethod
     def get_category_by_name(cls, name):
-        return db_fetchone(
-            join(cls.__select_all, 'WHERE categoryname = %s'), 
-            (name,)
-        )
-    
-    @staticmethod
-    def add_category(name, cat_type):
-        return db_commit("""
-                         INSERT INTO category (categoryname, type_)
-                         VALUES (%s, %s)
-                         """, (name, cat_type))
-    
+        return db_fetchone(cls.__get_by_name, (name,))
+
+    @classmethod
+    def add_category(cls, name, cat_type):
+        with db_transaction():
+            category_id = db_commit(cls.__add_category, (name, cat_type))
+            db_commit(cls.__log_change, (category_id, 'add'),
+                      return_id=False)
+        return category_id
+
     @classmethod
     def edit_category(cls, id, name, cat_type):
-        update = 'UPDATE category'
         return db_commit(
-            join(update, 'SET categoryname = %s', cls.__where_id), 
-            (name, id),
-            join(update, 'SET type_ = %s', cls.__where_id), 
-            (cat_type, id)
+            cls.__set_name, (name, id),
+            cls.__set_type, (cat_type, id),
+            cls.__log_change, (id, 'edit'),
+            return_id=False
         )
-    
+
     @classmethod
     def delete(cls, id):
-        return db_commit(join('DELETE FROM category', cls.__where_id), 
-                         (id,), 
+        return db_commit(cls.__log_change, (id, 'delete'),
+                         cls.__delete, (id,),
                          return_was_affected=True,
-                         return_id=False)
\ No newline at end of file
+                         return_id=False)
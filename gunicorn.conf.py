@@ -0,0 +1,25 @@
+# Gunicorn settings, read from the folder Gunicorn is started in
+#
+#     gunicorn --workers 4 'app:create_app()'
+#
+# With more than one worker, set PROMETHEUS_MULTIPROC_DIR so /metrics
+# reports totals for every worker (see `utils.metrics`).
+
+from os import environ, listdir, makedirs, path, remove
+
+def on_starting(server):
+    # Empty PROMETHEUS_MULTIPROC_DIR before the first worker starts, so
+    # the totals don't include the workers of an earlier run
+    folder = environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if folder:
+        makedirs(folder, exist_ok=True)
+        for name in listdir(folder):
+            if name.endswith('.db'):
+                remove(path.join(folder, name))
+
+def child_exit(server, worker):
+    # Drop the live gauges of a worker that stopped (the pool's idle
+    # connections), which would otherwise be summed into /metrics for good
+    if 'PROMETHEUS_MULTIPROC_DIR' in environ:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,2 @@
+from .job_controller import JobController
+from .job_routes import job_bp
\ No newline at end of file
@@ -0,0 +1,168 @@
+__all__ = ['JobController']
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from logging import error, info, warning
+from threading import Lock, Thread
+from time import sleep
+
+from app import app
+from utils.metrics import count_cache
+from .job_model import JobModel
+
+class JobController:
+    # In-process scheduler for slow work
+    #
+    # Jobs are registered by name with a function that takes a
+    # `progress(percent, message='')` callback and returns a result.
+    # Runs are recorded in the `job` table, where a heartbeat shows that
+    # the process that queued them is still alive. Results are kept in this
+    # process so routes can serve the last one right away while a
+    # newer one is computed in the background. Jobs registered with a
+    # `version` function are refreshed as soon as it changes, in every
+    # process.
+    _executor = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'],
+                                   thread_name_prefix='job')
+    _lock = Lock()
+    _jobs = {} # name: function
+    _versions = {} # name: function
+    _running = {} # name: job ID
+    _results = {} # name: (result, datetime computed, version)
+    _heartbeat = 30 # Seconds between heartbeats of the jobs in `_running`
+    _beater = None # Thread sending them, started with the first job
+
+    @classmethod
+    def register(cls, name, func, version=None):
+        # :param name: str (ex. 'cashflow.verify')
+        # :param func: function (progress) -> result
+        # :param version: function () -> value that changes whenever the
+        #     data the result is computed from does (ex. a `change_log`
+        #     version) | None
+        cls._jobs[name] = func
+        cls._versions[name] = version
+
+    @classmethod
+    def _version(cls, name):
+        version = cls._versions.get(name)
+        return None if version is None else version()
+
+    @classmethod
+    def names(cls): return sorted(cls._jobs)
+
+    @classmethod
+    def submit(cls, name):
+        # Run a job in the background
+        # Returns: int (job ID, of the run already going if there is one)
+        # Raises AssertionError when the job isn't registered
+        assert name in cls._jobs, 'Job not found'
+        with cls._lock:
+            if name in cls._running:
+                return cls._running[name]
+            job_id = JobModel.add_job(name)
+            cls._running[name] = job_id
+            if cls._beater is None:
+                cls._beater = Thread(target=cls._beat, daemon=True,
+                                     name='job-heartbeat')
+                cls._beater.start()
+
+        cls._executor.submit(cls._run, name, job_id)
+        return job_id
+
+    @classmethod
+    def _run(cls, name, job_id):
+        def progress(percent, message=''):
+            JobModel.set_progress(job_id, int(percent), message)
+
+        try:
+            JobModel.start_job(job_id)
+            # Read first, so changes made while it runs are seen later
+            version = cls._version(name)
+            result = cls._jobs[name](progress)
+            cls._results[name] = (result, datetime.now(), version)
+            JobModel.finish_job(job_id, 'Done', '')
+            info(f'Job {name} ({job_id}) finished')
+        except Exception as e:
+            error(f'Job {name} ({job_id}) failed', exc_info=True)
+            try:
+                JobModel.finish_job(job_id, 'Failed', str(e))
+            except Exception:
+                error(f'Job {name} ({job_id}) could not be saved',
+                      exc_info=True)
+        finally:
+            with cls._lock:
+                cls._running.pop(name, None)
+
+    @classmethod
+    def _beat(cls):
+        # Refresh the heartbeat of this process's queued and running jobs
+        # for as long as the process lives
+        while True:
+            sleep(cls._heartbeat)
+            with cls._lock:
+                job_ids = list(cls._running.values())
+            if not job_ids:
+                continue
+            try:
+                JobModel.beat(job_ids)
+            except Exception:
+                error('Could not save the heartbeat of jobs', exc_info=True)
+
+    @classmethod
+    def recover(cls):
+        # Mark the queued and running jobs whose process stopped (ex. a
+        # worker that was killed), on any host, as failed so they don't
+        # show as running forever. A job is taken as stopped after
+        # several missed heartbeats. Called when the app starts and when
+        # jobs are listed.
+        #
+        # Returns: bool (whether any job was marked)
+        marked = JobModel.fail_stale(cls._heartbeat * 4, 
+                                     'The process running it stopped')
+        if marked:
+            warning('Marked jobs of stopped processes as failed')
+        return marked
+
+    @classmethod
+    def result(cls, name, max_age=None):
+        # The last result of a job
+        #
+        # Computes it in this thread only when there isn't one yet.
+        # Otherwise the last result is returned right away, and a
+        # background refresh starts when its version changed or it is
+        # older than `max_age`.
+        #
+        # :param max_age: int (seconds, default `JOB_MAX_AGE`)
+        #
+        # Returns: dict
+        #     result: the job's return value
+        #     computed_at: datetime
+        #     refreshing: bool (a newer result is being computed)
+        assert name in cls._jobs, 'Job not found'
+        max_age = app.config['JOB_MAX_AGE'] if max_age is None else max_age
+        version = cls._version(name)
+        cached = cls._results.get(name)
+        count_cache(f'job.{name}', cached is not None 
+                    and cached[2] == version)
+        if cached is None:
+            cached = (cls._jobs[name](lambda *args: None), datetime.now(),
+                      version)
+            cls._results[name] = cached
+        elif (cached[2] != version
+                or datetime.now() - cached[1] > timedelta(seconds=max_age)):
+            cls.submit(name)
+
+        return {'result': cached[0], 'computed_at': cached[1],
+                'refreshing': name in cls._running}
+
+    @classmethod
+    def expire(cls, name):
+        # Drop this process's result so the next read recomputes it
+        cls._results.pop(name, None)
+
+    @classmethod
+    def jobs(cls, limit=50):
+        cls.recover()
+        return JobModel.get_jobs(limit)
+
+    @staticmethod
+    def get_job(job_id): return JobModel.get_job(job_id)
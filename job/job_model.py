@@ -0,0 +1,93 @@
+from json import dumps
+
+from utils.db import db_fetchall, db_fetchone, db_commit
+from utils.statements import statement
+
+class JobModel:
+    __where_id = 'WHERE jobid = %s'
+    __update = 'UPDATE job'
+
+    __get_jobs = statement(
+        'job.get_jobs',
+        'SELECT * FROM job ORDER BY jobid DESC LIMIT %s'
+    )
+    __get_job = statement('job.get_job', 'SELECT * FROM job', __where_id)
+    __add_job = statement('job.add_job',
+                          'INSERT INTO job (jobname) VALUES (%s)')
+    __beat = statement(
+        'job.beat',
+        """
+            UPDATE job j
+            JOIN JSON_TABLE(%s, '$[*]' COLUMNS (jobid INT PATH '$')) k
+                ON k.jobid = j.jobid
+            SET j.heartbeat_at = NOW()
+        """
+    )
+    __fail_stale = statement(
+        'job.fail_stale',
+        __update,
+        """
+            SET status = 'Failed', progress = 100, message = %s,
+                finished_at = NOW()
+            WHERE status IN ('Queued', 'Running')
+                AND heartbeat_at < NOW() - INTERVAL %s SECOND
+        """
+    )
+    __start_job = statement(
+        'job.start_job',
+        __update, 
+        "SET status = 'Running', started_at = NOW(), heartbeat_at = NOW()",
+        __where_id
+    )
+    __set_progress = statement(
+        'job.set_progress',
+        __update, 'SET progress = %s, message = %s', __where_id
+    )
+    __finish_job = statement(
+        'job.finish_job',
+        __update,
+        'SET status = %s, progress = 100, message = %s, finished_at = NOW()',
+        __where_id
+    )
+
+    @classmethod
+    def get_jobs(cls, limit):
+        # Most recent jobs first
+        return db_fetchall(cls.__get_jobs, (limit,))
+
+    @classmethod
+    def get_job(cls, job_id):
+        return db_fetchone(cls.__get_job, (job_id,))
+
+    @classmethod
+    def add_job(cls, name):
+        return db_commit(cls.__add_job, (name,))
+
+    @classmethod
+    def beat(cls, job_ids):
+        # Mark jobs as still queued or running in a live process
+        # :param job_ids: list of int
+        db_commit(cls.__beat, (dumps([int(i) for i in job_ids]),),
+                  return_id=False)
+
+    @classmethod
+    def fail_stale(cls, seconds, message):
+        # Mark the queued and running jobs without a heartbeat in the
+        # last `seconds` as failed
+        # Returns: bool (whether any job was marked)
+        return db_commit(cls.__fail_stale, (message, seconds),
+                         return_id=False, return_was_affected=True)
+
+    @classmethod
+    def start_job(cls, job_id):
+        db_commit(cls.__start_job, (job_id,), return_id=False)
+
+    @classmethod
+    def set_progress(cls, job_id, progress, message):
+        db_commit(cls.__set_progress, (progress, message[:255], job_id),
+                  return_id=False)
+
+    @classmethod
+    def finish_job(cls, job_id, status, message):
+        db_commit(cls.__finish_job, (status, message[:255], job_id),
+                  return_id=False)
@@ -0,0 +1,46 @@
+from flask import Blueprint, jsonify, render_template, request
+
+from utils.message import log_error, log_success, Model, Action
+from .job_controller import JobController
+
+job_bp = Blueprint('job', __name__)
+
+@job_bp.route('/jobs')
+@log_error(model=Model.job, action=Action.read, pg_template='jobs.html',
+           jobs=[], names=[])
+def jobs():
+    """
+    View recent background jobs and start registered ones.
+    """
+    return render_template('jobs.html', jobs=JobController.jobs(),
+                           names=JobController.names())
+
+@job_bp.route('/jobs/add', methods=['POST'])
+@log_error(model=Model.job, action=Action.add, pg_template='jobs.html',
+           jobs=[], names=[])
+def add_job():
+    """
+    Start a registered job in the background.
+
+    POST request parameters:
+    jobname: str
+    """
+    JobController.submit(request.form['jobname'])
+    return log_success(Model.job, Action.add)
+
+@job_bp.route('/jobs/status')
+def status():
+    """
+    Get a job's status and progress as JSON.
+
+    GET request parameters:
+    id: int (job ID)
+    """
+    try:
+        job = JobController.get_job(request.args.get('id', type=int))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
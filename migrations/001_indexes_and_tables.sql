@@ -0,0 +1,172 @@
+-- Upgrade a database created from an older budget.sql
+--
+--     mysql -u <user> -p <database> < migrations/001_indexes_and_tables.sql
+--
+-- Every step checks what is already there, so running it again (or on a
+-- database created from the current budget.sql) changes nothing.
+
+DROP PROCEDURE IF EXISTS migration_add_column;
+DROP PROCEDURE IF EXISTS migration_add_index;
+
+DELIMITER //
+CREATE PROCEDURE migration_add_column(p_table VARCHAR(64),
+                                      p_column VARCHAR(64),
+                                      p_definition TEXT)
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = p_table
+            AND column_name = p_column
+    ) THEN
+        SET @ddl = CONCAT('ALTER TABLE ', p_table, ' ADD COLUMN ', p_column,
+                          ' ', p_definition);
+        PREPARE ddl FROM @ddl;
+        EXECUTE ddl;
+        DEALLOCATE PREPARE ddl;
+    END IF;
+END //
+
+-- Adds an unnamed index unless one with the same columns, in the same
+-- order, exists (p_columns is comma-separated without spaces)
+CREATE PROCEDURE migration_add_index(p_table VARCHAR(64),
+                                     p_columns VARCHAR(255))
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM (
+            SELECT GROUP_CONCAT(column_name ORDER BY seq_in_index) as names
+            FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = p_table
+            GROUP BY index_name
+        ) i
+        WHERE i.names = p_columns
+    ) THEN
+        SET @ddl = CONCAT('ALTER TABLE ', p_table, ' ADD INDEX (', p_columns,
+                          ')');
+        PREPARE ddl FROM @ddl;
+        EXECUTE ddl;
+        DEALLOCATE PREPARE ddl;
+    END IF;
+END //
+DELIMITER ;
+
+-- Duplicate detection, reconciling, and date ranges (new transactions
+-- get a fingerprint; run the transact.backfill_fingerprints job at
+-- /jobs for the ones already there)
+CALL migration_add_column('transact', 'fingerprint', 'CHAR(32)');
+CALL migration_add_index('transact', 'fingerprint,transactiondate');
+CALL migration_add_index('transact', 'accountid,transactiondate,amount');
+CALL migration_add_index('transact', 'transactiondate');
+
+CREATE TABLE IF NOT EXISTS acct_balance (
+    accountid INT NOT NULL,
+    balance_date DATE NOT NULL,
+    balance DECIMAL(14,2) NOT NULL,
+    PRIMARY KEY (accountid, balance_date),
+    INDEX (balance_date),
+    FOREIGN KEY (accountid) REFERENCES acct(accountid)
+);
+CALL migration_add_index('acct_balance', 'balance_date');
+
+CREATE TABLE IF NOT EXISTS change_log (
+    changeid BIGINT AUTO_INCREMENT PRIMARY KEY,
+    version BIGINT,
+    connection_id BIGINT UNSIGNED NOT NULL DEFAULT (CONNECTION_ID()),
+    table_name VARCHAR(20) NOT NULL,
+    row_id INT NOT NULL,
+    row_id2 INT,
+    op ENUM('add', 'edit', 'delete', 'archive') NOT NULL,
+    changed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX (version),
+    INDEX (table_name, version),
+    INDEX (connection_id, version)
+);
+
+CALL migration_add_column('change_log', 'row_id2', 'INT AFTER row_id');
+
+CREATE TABLE IF NOT EXISTS change_version (
+    version BIGINT NOT NULL
+);
+INSERT INTO change_version (version)
+SELECT COALESCE(MAX(version), 0) FROM change_log
+WHERE NOT EXISTS (SELECT 1 FROM change_version);
+
+CREATE TABLE IF NOT EXISTS job (
+    jobid INT AUTO_INCREMENT PRIMARY KEY,
+    jobname VARCHAR(50) NOT NULL,
+    status ENUM('Queued', 'Running', 'Done', 'Failed') NOT NULL DEFAULT 'Queued',
+    progress TINYINT NOT NULL DEFAULT 0,
+    message VARCHAR(255) NOT NULL DEFAULT '',
+    queued_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    started_at DATETIME,
+    finished_at DATETIME,
+    heartbeat_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX (jobname, jobid),
+    INDEX (status, heartbeat_at)
+);
+CALL migration_add_column('job', 'heartbeat_at',
+                          'DATETIME DEFAULT CURRENT_TIMESTAMP');
+CALL migration_add_index('job', 'status,heartbeat_at');
+
+CREATE TABLE IF NOT EXISTS rule (
+    ruleid INT AUTO_INCREMENT PRIMARY KEY,
+    pattern VARCHAR(50) NOT NULL,
+    match_type ENUM('Contains', 'Starts with') NOT NULL DEFAULT 'Contains',
+    accountid INT,
+    amount_sign ENUM('Any', 'Expense', 'Income') NOT NULL DEFAULT 'Any',
+    categoryid INT NOT NULL,
+    priority INT NOT NULL DEFAULT 0,
+    FOREIGN KEY (accountid) REFERENCES acct(accountid),
+    FOREIGN KEY (categoryid) REFERENCES category(categoryid)
+);
+
+CREATE TABLE IF NOT EXISTS archive (
+    through_date DATE PRIMARY KEY,
+    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS transact_archive (
+    transactionid INT PRIMARY KEY,
+    accountid INT NOT NULL,
+    categoryid INT NOT NULL,
+    amount DECIMAL(12,2) NOT NULL,
+    transactiondate DATE NOT NULL,
+    dscr VARCHAR(50) NOT NULL,
+    fingerprint CHAR(32),
+    INDEX (fingerprint, transactiondate),
+    INDEX (accountid, transactiondate, amount),
+    INDEX (transactiondate),
+    FOREIGN KEY (accountid) REFERENCES acct(accountid),
+    FOREIGN KEY (categoryid) REFERENCES category(categoryid)
+) ROW_FORMAT=COMPRESSED;
+CALL migration_add_index('transact_archive', 'fingerprint,transactiondate');
+
+CREATE TABLE IF NOT EXISTS cashflow_archive (
+    expense INT NOT NULL,
+    income INT NOT NULL,
+    type_ ENUM('Business', 'Transfer') NOT NULL,
+    PRIMARY KEY (expense, income),
+    INDEX (income)
+) ROW_FORMAT=COMPRESSED;
+
+CREATE TABLE IF NOT EXISTS opening_balance (
+    accountid INT PRIMARY KEY,
+    balance DECIMAL(14,2) NOT NULL,
+    transactions INT NOT NULL,
+    FOREIGN KEY (accountid) REFERENCES acct(accountid)
+);
+
+-- Build the balance index the first time (the app keeps it up to date
+-- afterwards; the acct.rebuild_balance_index job rebuilds it)
+INSERT INTO acct_balance (accountid, balance_date, balance)
+SELECT accountid, transactiondate,
+    SUM(SUM(amount)) OVER (PARTITION BY accountid ORDER BY transactiondate)
+FROM (
+    SELECT accountid, transactiondate, amount FROM transact
+    UNION ALL
+    SELECT accountid, transactiondate, amount FROM transact_archive
+) t
+WHERE NOT EXISTS (SELECT 1 FROM acct_balance)
+GROUP BY accountid, transactiondate;
+
+DROP PROCEDURE migration_add_column;
+DROP PROCEDURE migration_add_index;
@@ -0,0 +1,2 @@
+from .report_controller import ReportController
+from .report_routes import report_bp
\ No newline at end of file
@@ -0,0 +1,226 @@
+__all__ = ['ReportController']
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+
+from account import AcctController
+from category import CatController
+from transact.fingerprint import merchant, normalize
+from .report_model import ReportModel
+
+class ReportController:
+    # name, days between, days off still counted as on time
+    _cadences = [('Weekly', 7, 1), ('Biweekly', 14, 2), ('Monthly', 30.44, 3),
+                 ('Quarterly', 91.3, 7), ('Yearly', 365.25, 10)]
+    recurring_max_age = 24 * 60 * 60 # Detect recurring items nightly
+
+    @staticmethod
+    def month_index(year, month): return year * 12 + month - 1
+
+    @staticmethod
+    def month_date(index): return date(index // 12, index % 12 + 1, 1)
+
+    @classmethod
+    def pivot(cls, start_year, start_month, end_year, end_month):
+        # Category x month pivot of transaction totals
+        #
+        # Totals come from the database already grouped by category and
+        # month, and everything else is computed on whole arrays.
+        #
+        # :param start_year: int
+        # :param start_month: int
+        # :param end_year: int
+        # :param end_month: int (the range includes this month)
+        #
+        # Returns: dict
+        #     months: list of date (first day of each month)
+        #     categories: list of dict (categoryid, categoryname, type_,
+        #         amounts, deltas, total, average) for categories with
+        #         transactions in the range
+        #     income, expense, net: list of float (totals by month)
+        #     total_income, total_expense, total_net: float
+        #
+        # Raises AssertionError when the range is empty or too long
+        first = cls.month_index(start_year, start_month)
+        last = cls.month_index(end_year, end_month)
+        n_months = last - first + 1
+        assert n_months >= 1, 'Start must not be after end'
+        assert n_months <= 240, 'Range must be 20 years or less'
+
+        columns = ReportModel.get_monthly_totals(cls.month_date(first),
+                                                 cls.month_date(last + 1))
+        categories = CatController.categories()
+        category_ids = np.array([i['categoryid'] for i in categories],
+                                dtype=np.int64)
+        is_income = np.array([i['type_'] == 'Income' for i in categories],
+                             dtype=bool)
+
+        # Place each (category, month) total in its cell
+        cents = np.zeros((len(categories), n_months), dtype=np.int64)
+        ids = np.asarray(columns['categoryid'], dtype=np.int64)
+        if ids.size:
+            order = np.argsort(category_ids)
+            rows = order[np.searchsorted(category_ids[order], ids)]
+            month_columns = np.asarray(columns['month_index'],
+                                       dtype=np.int64) - first
+            cents[rows, month_columns] = np.asarray(columns['cents'],
+                                                    dtype=np.int64)
+
+        deltas = np.zeros_like(cents)
+        deltas[:, 1:] = np.diff(cents, axis=1) # Month over month
+        totals = cents.sum(axis=1)
+        amounts = cents / 100
+        income = cents[is_income].sum(axis=0)
+        expense = cents[~is_income].sum(axis=0)
+
+        used = np.flatnonzero(cents.any(axis=1))
+        return {
+            'months': [cls.month_date(i) for i in range(first, last + 1)],
+            'categories': [
+                {'categoryid': categories[i]['categoryid'],
+                 'categoryname': categories[i]['categoryname'],
+                 'type_': categories[i]['type_'],
+                 'amounts': amounts[i].tolist(),
+                 'deltas': (deltas[i] / 100).tolist(),
+                 'total': totals[i] / 100,
+                 'average': totals[i] / 100 / n_months}
+                for i in used.tolist()
+            ],
+            'income': (income / 100).tolist(),
+            'expense': (expense / 100).tolist(),
+            'net': ((income + expense) / 100).tolist(),
+            'total_income': income.sum() / 100,
+            'total_expense': expense.sum() / 100,
+            'total_net': (income.sum() + expense.sum()) / 100
+        }
+
+    @staticmethod
+    def _medians(groups, values, n_groups):
+        # Median of `values` in each group (0 for empty groups)
+        order = np.lexsort((values, groups))
+        values = values[order]
+        counts = np.bincount(groups, minlength=n_groups)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        medians = np.zeros(n_groups)
+        has = counts > 0
+        medians[has] = (values[(starts + (counts - 1) // 2)[has]]
+                        + values[(starts + counts // 2)[has]]) / 2
+        return medians
+
+    @classmethod
+    def recurring(cls, progress=lambda *args: None, history=540, 
+                  today=None):
+        # Find recurring charges and incomes
+        #
+        # Transactions are grouped by account, merchant (see
+        # `merchant()`) and whether they are income. Within each
+        # group, the days between consecutive transactions are computed
+        # all at once. A group recurs when it has 3 or more
+        # transactions, the median days between them is close to a
+        # known cadence, and at least 75% of the gaps are close to that
+        # median. Groups that have missed two cycles are dropped.
+        #
+        # Runs as the 'report.recurring' job.
+        #
+        # :param history: int (days of transactions to look at)
+        # :param today: date (default today)
+        #
+        # Returns: list of dict (accountid, accountname, categoryid,
+        #     categoryname, dscr, cadence, interval, amount, monthly,
+        #     occurrences, last_date, next_date), by next date
+        #
+        # O(n log n) (where n = transactions in the history)
+        today = today or date.today()
+        progress(0, 'Loading transactions')
+        columns = ReportModel.get_transactions(today - timedelta(history))
+        progress(40, 'Grouping transactions')
+        keys = {}
+        groups = np.array([
+            keys.setdefault((account_id, merchant(dscr) or normalize(dscr), 
+                             cents > 0), len(keys))
+            for account_id, dscr, cents in zip(columns['accountid'], 
+                                               columns['dscr'], 
+                                               columns['cents'])
+        ], dtype=np.int64)
+        n_groups = len(keys)
+        if n_groups == 0:
+            return []
+        days = np.asarray(columns['day'], dtype=np.int64)
+        cents = np.asarray(columns['cents'], dtype=np.int64)
+
+        progress(60, 'Measuring intervals')
+        # Order by group, then day, and count each day once per group
+        rows = np.lexsort((days, groups))
+        first = np.ones(rows.size, dtype=bool)
+        first[1:] = ((groups[rows][1:] != groups[rows][:-1]) 
+                     | (days[rows][1:] != days[rows][:-1]))
+        rows = rows[first]
+        g, d = groups[rows], days[rows]
+        counts = np.bincount(g, minlength=n_groups)
+        last_rows = rows[np.cumsum(counts) - 1] # Latest of each group
+
+        same = g[1:] == g[:-1]
+        gaps = (d[1:] - d[:-1])[same]
+        gap_groups = g[1:][same]
+        median_gap = cls._medians(gap_groups, gaps, n_groups)
+
+        # Closest cadence to each group's median gap
+        nominal = np.array([i[1] for i in cls._cadences])
+        slack = np.array([i[2] for i in cls._cadences])
+        off = np.abs(median_gap[:, None] - nominal[None, :])
+        cadence = np.argmin(off / slack, axis=1)
+        fits = off[np.arange(n_groups), cadence] <= slack[cadence]
+        on_time = np.abs(gaps - median_gap[gap_groups]) <= slack[
+            cadence[gap_groups]]
+        regular = (np.bincount(gap_groups, weights=on_time, 
+                               minlength=n_groups) 
+                   >= 0.75 * np.maximum(counts - 1, 1))
+        last_day = days[last_rows]
+        active = today.toordinal() - last_day <= 2 * median_gap
+        found = np.flatnonzero((counts >= 3) & fits & regular & active)
+
+        progress(80, 'Summarizing')
+        amounts = cls._medians(groups, cents, n_groups)
+        accounts = {i['accountid']: i['accountname'] 
+                    for i in AcctController.accounts(balance=False)}
+        categories = {i['categoryid']: i['categoryname'] 
+                      for i in CatController.categories()}
+        recurring = []
+        for i in found.tolist():
+            row = int(last_rows[i])
+            amount = Decimal(int(round(amounts[i]))) / 100
+            interval = int(round(median_gap[i]))
+            recurring.append({
+                'accountid': columns['accountid'][row], 
+                'accountname': accounts.get(columns['accountid'][row]),
+                'categoryid': columns['categoryid'][row],
+                'categoryname': categories.get(columns['categoryid'][row]),
+                'dscr': columns['dscr'][row],
+                'cadence': cls._cadences[cadence[i]][0],
+                'interval': interval,
+                'amount': amount,
+                'monthly': (amount * Decimal(cls._cadences[2][1]) 
+                            / interval).quantize(Decimal('0.01')),
+                'occurrences': int(counts[i]),
+                'last_date': date.fromordinal(int(last_day[i])),
+                'next_date': date.fromordinal(int(last_day[i]) + interval)
+            })
+        recurring.sort(key=lambda i: i['next_date'])
+        return recurring
+
+    @staticmethod
+    def due_by_category(recurring, start, end):
+        # Total of recurring items expected from `start` through `end`
+        # :param recurring: list of dict (see `recurring()`)
+        # Returns: dict of categoryid: Decimal (signed like transactions)
+        due = {}
+        for i in recurring:
+            expected = i['next_date']
+            while expected <= end:
+                if expected >= start:
+                    due[i['categoryid']] = (due.get(i['categoryid'], 0) 
+                                            + i['amount'])
+                expected += timedelta(i['interval'])
+        return due
@@ -0,0 +1,60 @@
+from utils.db import db_fetchcolumns
+from utils.statements import statement
+
+class ReportModel:
+    # Months are numbered as year * 12 + month - 1 so a range of months
+    # maps straight onto array columns
+    # Each total is grouped in both tables, so a range in the open years
+    # finds nothing in the archive's date index
+    __monthly_totals = """
+            SELECT t.categoryid,
+                YEAR(t.transactiondate) * 12 + MONTH(t.transactiondate) - 1
+                    as month_index,
+                SUM(t.amount) as amount
+            FROM {} t
+            WHERE t.transactiondate >= %s AND t.transactiondate < %s
+            GROUP BY t.categoryid, month_index
+        """
+    __get_monthly_totals = statement(
+        'report.get_monthly_totals',
+        """
+            SELECT categoryid, month_index,
+                CAST(SUM(amount) * 100 AS SIGNED) as cents
+            FROM (
+        """,
+        __monthly_totals.format('transact'), 'UNION ALL',
+        __monthly_totals.format('transact_archive'),
+        """
+            ) t
+            GROUP BY categoryid, month_index
+        """
+    )
+
+    # Days are `date.toordinal()` and amounts integer cents
+    __transactions = """
+            SELECT accountid, categoryid,
+                TO_DAYS(transactiondate) - 365 as day,
+                CAST(amount * 100 AS SIGNED) as cents, dscr
+            FROM {}
+            WHERE transactiondate >= %s
+        """
+    __get_transactions = statement(
+        'report.get_transactions',
+        __transactions.format('transact'), 'UNION ALL',
+        __transactions.format('transact_archive')
+    )
+
+    @classmethod
+    def get_monthly_totals(cls, start, end):
+        # Total of each category in each month, in integer cents
+        # :param start: date (inclusive)
+        # :param end: date (exclusive)
+        # Returns: dict of columns (categoryid, month_index, cents)
+        return db_fetchcolumns(cls.__get_monthly_totals,
+                               (start, end, start, end))
+
+    @classmethod
+    def get_transactions(cls, start):
+        # Every transaction since `start` as columns
+        # Returns: dict of columns (accountid, categoryid, day, cents, dscr)
+        return db_fetchcolumns(cls.__get_transactions, (start, start))
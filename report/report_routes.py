@@ -0,0 +1,63 @@
+from datetime import datetime
+
+from flask import Blueprint, render_template, request
+
+from job import JobController
+from utils.message import log_error, Model, Action
+from .report_controller import ReportController
+
+report_bp = Blueprint('report', __name__)
+
+@report_bp.route('/reports')
+@log_error(model=Model.report, action=Action.read, pg_template='reports.html',
+           report=None, start='', end='')
+def reports():
+    """
+    View spending by category and month.
+
+    The report shows each category's total for every month in the
+    range, with totals, averages, month-over-month changes, and income
+    and expenses by month.
+
+    GET request parameters:
+    start: str (YYYY-MM, default 11 months before `end`)
+    end: str (YYYY-MM, default this month)
+    """
+    now = datetime.now()
+    end = request.args.get('end', '', type=str) or now.strftime('%Y-%m')
+    end_date = datetime.strptime(end, '%Y-%m')
+    default_start = ReportController.month_index(end_date.year, 
+                                                  end_date.month) - 11
+    start = (request.args.get('start', '', type=str) 
+             or ReportController.month_date(default_start).strftime('%Y-%m'))
+    start_date = datetime.strptime(start, '%Y-%m')
+    report = ReportController.pivot(start_date.year, start_date.month, 
+                                    end_date.year, end_date.month)
+    return render_template('reports.html', report=report, start=start, 
+                           end=end)
+
+@report_bp.route('/reports/recurring')
+@log_error(model=Model.report, action=Action.read, 
+           pg_template='recurring.html', recurring=[])
+def recurring():
+    """
+    View recurring charges and incomes found in the ledger.
+
+    Detection runs as the 'report.recurring' job and is refreshed in the
+    background once a day.
+
+    GET request parameters:
+    refresh: int (1: detect again now)
+    """
+    if request.args.get('refresh', 0, type=int) == 1:
+        JobController.expire('report.recurring')
+    found = JobController.result('report.recurring', 
+                                 max_age=ReportController.recurring_max_age)
+    items = found['result']
+    return render_template(
+        'recurring.html', recurring=items, 
+        computed_at=found['computed_at'], refreshing=found['refreshing'],
+        monthly_expense=sum([i['monthly'] for i in items 
+                             if i['amount'] < 0]),
+        monthly_income=sum([i['monthly'] for i in items if i['amount'] > 0])
+    )
@@ -0,0 +1,2 @@
+from .rule_controller import RuleController
+from .rule_routes import rule_bp
\ No newline at end of file
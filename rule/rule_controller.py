@@ -0,0 +1,118 @@
+__all__ = ['RuleController']
+
+from decimal import Decimal
+from threading import Lock
+
+from transact import TransactController
+from transact.fingerprint import normalize
+from utils.metrics import count_cache
+from .rule_matcher import RuleMatcher
+from .rule_model import RuleModel
+
+class RuleController:
+    _lock = Lock()
+    _matcher = None
+    _version = None # `RuleModel.get_version()` the matcher was built at
+
+    @staticmethod
+    def match_types(): return ['Contains', 'Starts with']
+
+    @staticmethod
+    def amount_signs(): return ['Any', 'Expense', 'Income']
+
+    @staticmethod
+    def rules(): return RuleModel.get_rules()
+
+    @staticmethod
+    def get_rule(rule_id): return RuleModel.get_rule(rule_id)
+
+    @classmethod
+    def assert_rule(cls, pattern, match_type, account_id, amount_sign, 
+                    priority):
+        # Raises AssertionError when:
+        #     the pattern has no letters or digits
+        #     the match type or amount sign is not valid
+        #     the priority is not a whole number
+        assert normalize(pattern), 'Pattern needs letters or digits'
+        assert match_type in cls.match_types(), 'Match type is not valid'
+        assert amount_sign in cls.amount_signs(), 'Amount sign is not valid'
+        try:
+            priority = int(priority or 0)
+        except ValueError:
+            raise AssertionError('Priority must be a whole number')
+        return pattern.strip(), account_id or None, priority
+
+    @classmethod
+    def add_rule(cls, pattern, match_type, account_id, amount_sign, 
+                 category_id, priority):
+        # Controller for adding rules
+        # :param account_id: int or None (any account)
+        # Returns: int (the new rule ID)
+        # Raises AssertionError (see `assert_rule()`)
+        pattern, account_id, priority = cls.assert_rule(
+            pattern, match_type, account_id, amount_sign, priority)
+        return RuleModel.add_rule(pattern, match_type, account_id, 
+                                  amount_sign, category_id, priority)
+
+    @classmethod
+    def edit_rule(cls, rule_id, pattern, match_type, account_id, 
+                  amount_sign, category_id, priority):
+        pattern, account_id, priority = cls.assert_rule(
+            pattern, match_type, account_id, amount_sign, priority)
+        RuleModel.edit_rule(rule_id, pattern, match_type, account_id, 
+                            amount_sign, category_id, priority)
+
+    @staticmethod
+    def delete(id): return RuleModel.delete(id)
+
+    @classmethod
+    def matcher(cls):
+        # Every rule compiled into one `RuleMatcher`
+        #
+        # Compiled again only when a rule changed since the last call,
+        # from any process. Get it once for a batch of transactions.
+        #
+        # O(1) queries when no rule changed
+        version = RuleModel.get_version()
+        with cls._lock:
+            hit = cls._matcher is not None and version == cls._version
+            count_cache('rule.matcher', hit)
+            if not hit:
+                cls._matcher = RuleMatcher(RuleModel.get_rules())
+                cls._version = version
+            return cls._matcher
+
+    @classmethod
+    def match(cls, account_id, amount, description):
+        # Category the rules give a transaction
+        # Returns: int (categoryid) or None
+        rule = cls.matcher().match(account_id, Decimal(amount), description)
+        return None if rule is None else rule['categoryid']
+
+    @classmethod
+    def apply(cls, progress=lambda *args: None):
+        # Re-run every rule over every transaction
+        #
+        # Runs as the 'rule.apply' job. Transactions no rule matches
+        # keep their category.
+        #
+        # Returns: int (number of transactions changed)
+        #
+        # O(n) (where n = total length of all descriptions)
+        matcher = cls.matcher()
+        progress(0, 'Loading transactions')
+        columns = TransactController.get_descriptions()
+        total = len(columns['transactionid'])
+        changes = []
+        for i, (transaction_id, account_id, category_id, amount, dscr) \
+                in enumerate(zip(*columns.values())):
+            rule = matcher.match(account_id, amount, dscr)
+            if rule is not None and rule['categoryid'] != category_id:
+                changes.append((transaction_id, rule['categoryid']))
+            if i % 10000 == 0:
+                progress(i * 80 // max(total, 1), f'Matched {i} of {total}')
+
+        for start in range(0, len(changes), 10000):
+            progress(80 + start * 20 // len(changes), 'Saving categories')
+            TransactController.set_categories(changes[start:start + 10000])
+        return len(changes)
@@ -0,0 +1,50 @@
+__all__ = ['RuleMatcher']
+
+from transact.fingerprint import normalize
+from utils.ahocorasick import Automaton
+
+class RuleMatcher:
+    # Every rule compiled into one automaton
+    #
+    # Patterns and descriptions are normalized the same way as
+    # fingerprints, so 'AMAZON' matches 'Amazon.com*1A2B'. One pass over
+    # a description finds every rule whose pattern it contains, then
+    # the account and amount conditions pick among those.
+    def __init__(self, rules):
+        # :param rules: list of dict (see `RuleModel.get_rules()`)
+        self._rules = rules
+        patterns = {}
+        for i, rule in enumerate(rules):
+            patterns.setdefault(normalize(rule['pattern']), []).append(i)
+        self._automaton = Automaton(patterns) if patterns else None
+        # Highest priority first, then the longest pattern, then oldest
+        self._rank = [(-rule['priority'], -len(rule['pattern']),
+                       rule['ruleid']) for rule in rules]
+
+    def match(self, account_id, amount, description):
+        # The rule that applies to a transaction
+        #
+        # :param account_id: int
+        # :param amount: Decimal
+        # :param description: str
+        #
+        # Returns: dict (the rule) or None
+        #
+        # O(n + k) (where n = len(description), k = patterns found)
+        if self._automaton is None:
+            return None
+        best = None
+        for start, indexes in self._automaton.find(normalize(description)):
+            for i in indexes:
+                rule = self._rules[i]
+                if rule['match_type'] == 'Starts with' and start != 0:
+                    continue
+                if (rule['accountid'] is not None
+                        and rule['accountid'] != int(account_id)):
+                    continue
+                if ((rule['amount_sign'] == 'Expense' and amount >= 0)
+                        or (rule['amount_sign'] == 'Income' and amount <= 0)):
+                    continue
+                if best is None or self._rank[i] < self._rank[best]:
+                    best = i
+        return None if best is None else self._rules[best]
@@ -0,0 +1,96 @@
+from utils.db import db_fetchall, db_fetchone, db_commit, db_transaction
+from utils.statements import statement
+
+class RuleModel:
+    __where_id = 'WHERE ruleid = %s'
+    __update = 'UPDATE rule'
+    # Rule changes are logged so every process knows to recompile
+    __log_change = statement(
+        'rule.log_change',
+        """
+            INSERT INTO change_log (table_name, row_id, op)
+            VALUES ('rule', %s, %s)
+        """
+    )
+
+    __get_rules = statement(
+        'rule.get_rules',
+        """
+            SELECT r.*, c.categoryname, a.accountname
+            FROM rule r
+            JOIN category c ON r.categoryid = c.categoryid
+            LEFT JOIN acct a ON r.accountid = a.accountid
+            ORDER BY r.priority DESC, r.ruleid
+        """
+    )
+    __get_rule = statement('rule.get_rule', 'SELECT * FROM rule', __where_id)
+    __get_version = statement(
+        'rule.get_version',
+        """
+            SELECT COALESCE(MAX(version), 0) as version
+            FROM change_log
+            WHERE table_name = 'rule'
+        """
+    )
+    __add_rule = statement(
+        'rule.add_rule',
+        """
+            INSERT INTO rule (pattern, match_type, accountid, amount_sign,
+                categoryid, priority)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """
+    )
+    __set_rule = statement(
+        'rule.set_rule',
+        __update,
+        """
+            SET pattern = %s, match_type = %s, accountid = %s,
+                amount_sign = %s, categoryid = %s, priority = %s
+        """,
+        __where_id
+    )
+    __delete = statement('rule.delete', 'DELETE FROM rule', __where_id)
+
+    @classmethod
+    def get_rules(cls):
+        # Every rule, highest priority first
+        return db_fetchall(cls.__get_rules)
+
+    @classmethod
+    def get_rule(cls, rule_id):
+        return db_fetchone(cls.__get_rule, (rule_id,))
+
+    @classmethod
+    def get_version(cls):
+        # Changes whenever a rule is added, edited or deleted
+        return db_fetchone(cls.__get_version)['version']
+
+    @classmethod
+    def add_rule(cls, pattern, match_type, account_id, amount_sign,
+                 category_id, priority):
+        # Returns: int (the new rule ID)
+        with db_transaction():
+            rule_id = db_commit(
+                cls.__add_rule,
+                (pattern, match_type, account_id, amount_sign, category_id,
+                 priority)
+            )
+            db_commit(cls.__log_change, (rule_id, 'add'), return_id=False)
+        return rule_id
+
+    @classmethod
+    def edit_rule(cls, rule_id, pattern, match_type, account_id,
+                  amount_sign, category_id, priority):
+        db_commit(
+            cls.__set_rule,
+            (pattern, match_type, account_id, amount_sign, category_id,
+             priority, rule_id),
+            cls.__log_change, (rule_id, 'edit'),
+            return_id=False
+        )
+
+    @classmethod
+    def delete(cls, id):
+        return db_commit(cls.__log_change, (id, 'delete'),
+                         cls.__delete, (id,),
+                         return_was_affected=True, return_id=False)
@@ -0,0 +1,103 @@
+from flask import Blueprint, render_template, request
+
+from account import AcctController
+from category import CatController
+from job import JobController
+from utils.message import log_error, log_success, header_action, Model, Action
+from .rule_controller import RuleController
+
+rule_bp = Blueprint('rule', __name__)
+
+def _form():
+    # Rule fields from a POST request, in `RuleController` order
+    return (request.form['pattern'], request.form['match_type'], 
+            request.form.get('accountid', None, type=int), 
+            request.form['amount_sign'], request.form['categoryid'], 
+            request.form.get('priority', '0'))
+
+def _render_form(mode, rule=None):
+    return render_template('add_edit_rule.html', mode=mode, rule=rule, 
+                           accounts=AcctController.accounts(balance=False), 
+                           categories=CatController.categories(), 
+                           match_types=RuleController.match_types(), 
+                           amount_signs=RuleController.amount_signs())
+
+@rule_bp.route('/rules')
+@log_error(model=Model.rule, action=Action.read, pg_template='rules.html', 
+           rules=[])
+def rules():
+    """
+    View all categorization rules, highest priority first.
+    """
+    return render_template('rules.html', rules=RuleController.rules())
+
+@rule_bp.route('/rules/add', methods=['GET', 'POST'])
+@log_error(model=Model.rule, action=Action.add, 
+           pg_template='add_edit_rule.html', accounts=[], categories=[], 
+           match_types=[], amount_signs=[])
+def add_rule():
+    """
+    Add a new categorization rule.
+
+    POST request parameters:
+    pattern: str (matched against normalized descriptions)
+    match_type: 'Contains' | 'Starts with'
+    accountid: int (optional, default any account)
+    amount_sign: 'Any' | 'Expense' | 'Income'
+    categoryid: int
+    priority: int (higher wins when several rules match)
+
+    Raises:
+    POST request:
+    AssertionError when a field is not valid (see 
+        `RuleController.assert_rule()`)
+    """
+    if request.method == 'POST':
+        RuleController.add_rule(*_form())
+        return log_success(Model.rule, Action.add)
+    else:
+        return _render_form(header_action(Action.add))
+
+@rule_bp.route('/rules/edit', methods=['GET', 'POST'])
+@log_error(model=Model.rule, action=Action.edit, 
+           pg_template='add_edit_rule.html', accounts=[], categories=[], 
+           match_types=[], amount_signs=[])
+def edit_rule():
+    """
+    Edit a selected rule.
+
+    GET request parameters:
+    id: int
+
+    POST request parameters:
+    id: int
+    (the rest as in `add_rule()`)
+    """
+    if request.method == 'POST':
+        RuleController.edit_rule(request.form['id'], *_form())
+        return log_success(Model.rule, Action.edit)
+    else:
+        rule = RuleController.get_rule(request.args['id'])
+        return _render_form(header_action(Action.edit), rule)
+
+@rule_bp.route('/rules/delete', methods=['POST'])
+@log_error(model=Model.rule, action=Action.delete, pg_template='rules.html', 
+           rules=[])
+def delete():
+    """
+    Delete a rule. Transactions it already categorized keep their category.
+    """
+    RuleController.delete(request.form['id'])
+    return log_success(Model.rule, Action.delete)
+
+@rule_bp.route('/rules/apply', methods=['POST'])
+@log_error(model=Model.rule, action=Action.edit, pg_template='rules.html', 
+           rules=[])
+def apply():
+    """
+    Re-run every rule over every transaction in the background.
+
+    Progress is shown on the jobs page.
+    """
+    JobController.submit('rule.apply')
+    return log_success(Model.job, Action.add)
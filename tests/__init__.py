@@ -0,0 +1,8 @@
+# Tests of the logic that runs without a database: models are patched
+# where a test needs rows. Run with `python -m unittest` (or pytest).
+#
+# The app's config reads these when it's imported.
+from os import environ
+
+environ.setdefault('SECRET_KEY', 'test')
+environ.setdefault('ALLOWED_HOSTS', 'localhost')
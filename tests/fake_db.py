@@ -0,0 +1,64 @@
+# Stand-ins for MySQL connections, for tests that run `utils.db` itself
+# instead of patching out its functions
+
+from contextlib import contextmanager
+from queue import LifoQueue
+from unittest.mock import patch
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.lastrowid = None
+        self.rowcount = 0
+        self.column_names = ()
+
+    def execute(self, sql, args=None):
+        self.connection.executed.append((sql, args))
+        self.connection.last_id += 1
+        self.lastrowid = self.connection.last_id
+        self.rowcount = 1
+
+    def executemany(self, sql, seq_args):
+        # One multi-row INSERT: lastrowid is the first new ID
+        self.execute(sql, seq_args)
+        self.lastrowid = self.connection.last_id
+        self.connection.last_id += len(seq_args) - 1
+
+    def fetchall(self): return []
+
+    def fetchmany(self, size): return []
+
+class FakeConnection:
+    def __init__(self):
+        self.executed = [] # (sql, args) of every statement, in order
+        self.last_id = 0
+        self.commits = 0
+        self.rollbacks = 0
+        self.closed = False
+        self.in_transaction = False
+        self.unread_result = False
+
+    def cursor(self, prepared=False, dictionary=False):
+        return FakeCursor(self)
+
+    def commit(self): self.commits += 1
+
+    def rollback(self): self.rollbacks += 1
+
+    def close(self): self.closed = True
+
+    def is_connected(self): return not self.closed
+
+@contextmanager
+def fake_db():
+    # Run `utils.db` on fake connections and an empty pool
+    # Yields: list of FakeConnection (every connection opened)
+    connections = []
+
+    def connect(**kwargs):
+        connections.append(FakeConnection())
+        return connections[-1]
+
+    with patch('utils.db.connect', connect), \
+            patch('utils.db._idle', LifoQueue(maxsize=4)):
+        yield connections
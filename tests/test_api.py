@@ -0,0 +1,89 @@
+from datetime import datetime
+from unittest import TestCase
+from unittest.mock import patch
+
+from api import api_routes
+from api.api_controller import ApiController
+from api.api_model import ApiModel
+from app import app
+from tests.fake_db import fake_db
+from utils import db
+
+def _change(version, table_name, row_id, row_id2=None, op='add'):
+    return {'version': version, 'table_name': table_name, 'row_id': row_id,
+            'row_id2': row_id2, 'op': op,
+            'changed_at': datetime(2024, 5, 1)}
+
+class BatchTest(TestCase):
+    def test_a_failed_operation_saves_nothing(self):
+        operations = [
+            {'op': 'create', 'resource': 'accounts',
+             'data': {'accountname': 'Savings', 'accounttype': 'Savings'}},
+            {'op': 'create', 'resource': 'accounts', 'data': {}}
+        ]
+        with fake_db() as connections:
+            with self.assertRaisesRegex(AssertionError, '^Operation 1: '):
+                ApiController.batch(operations)
+            self.assertEqual(db._idle.qsize(), 0)
+        # The first account was inserted on the batch's connection,
+        # which is closed without a commit
+        connection, = connections
+        self.assertTrue(connection.executed)
+        self.assertEqual(connection.commits, 0)
+        self.assertTrue(connection.closed)
+
+    def test_every_operation_commits_once(self):
+        operations = [
+            {'op': 'create', 'resource': 'accounts',
+             'data': {'accountname': name, 'accounttype': 'Savings'}}
+            for name in ('Savings', 'Checking')
+        ]
+        with fake_db() as connections:
+            results = ApiController.batch(operations)
+        connection, = connections
+        self.assertEqual(len(results), 2)
+        self.assertEqual(connection.commits, 1)
+        self.assertFalse(connection.closed)
+
+class ChangesTest(TestCase):
+    def test_cashflows_are_named_by_both_ids(self):
+        rows = [_change(1, 'transact', 7), _change(1, 'transact', 8),
+                _change(1, 'cashflow', 7, 8),
+                _change(2, 'cashflow', 7, 9, 'archive')]
+        with patch.object(ApiModel, 'get_changes', return_value=rows):
+            changes = list(ApiController.changes(0))
+        self.assertEqual([(i['resource'], i['id']) for i in changes],
+                         [('transactions', 7), ('transactions', 8),
+                          ('cashflows', [7, 8]), ('cashflows', [7, 9])])
+
+    def test_unknown_resource(self):
+        with patch.object(ApiModel, 'get_changes') as get_changes:
+            with self.assertRaises(AssertionError):
+                ApiController.changes(0, 'nothing')
+        get_changes.assert_not_called()
+
+class BodyTest(TestCase):
+    def post(self, content_type):
+        with app.test_request_context('/api/v1/batch', method='POST',
+                                      data='{"operations": []}',
+                                      content_type=content_type), \
+                patch.object(ApiController, 'batch',
+                             return_value=[]) as batch:
+            response, status = api_routes.batch(), 200
+            if isinstance(response, tuple):
+                response, status = response
+            return response.get_json(), status, batch
+
+    def test_json(self):
+        body, status, batch = self.post('application/json; charset=utf-8')
+        self.assertEqual((body, status), ({'results': []}, 200))
+        batch.assert_called_once_with([])
+
+    def test_other_types_are_refused(self):
+        # Types a browser sends from another site without asking first
+        for content_type in ('text/plain', 'application/x-www-form-urlencoded',
+                             'multipart/form-data; boundary=x'):
+            body, status, batch = self.post(content_type)
+            self.assertEqual(status, 415)
+            self.assertIn('application/json', body['error'])
+            batch.assert_not_called()
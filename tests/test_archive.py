@@ -0,0 +1,60 @@
+from datetime import date
+from unittest import TestCase
+from unittest.mock import patch
+
+from archive.archive_controller import ArchiveController
+from archive.archive_model import ArchiveModel
+
+class MoveTest(TestCase):
+    def move(self):
+        with patch('archive.archive_model.db_commit') as commit:
+            ArchiveModel.move(date(2023, 1, 31))
+        commit.assert_called_once()
+        args = commit.call_args[0]
+        return list(zip(args[::2], args[1::2]))
+
+    def test_statement_order(self):
+        names = [stmt.name.split('.')[1] for stmt, _ in self.move()]
+        # Cashflows first (their foreign keys hold the transactions),
+        # and the transactions are only deleted once copied, logged and
+        # totalled
+        self.assertEqual(names, [
+            'log_cashflows', 'copy_cashflows', 'delete_cashflows',
+            'add_opening_balances', 'copy_transactions', 'log_transactions',
+            'delete_transactions'
+        ])
+
+    def test_every_statement_gets_its_arguments(self):
+        for stmt, args in self.move():
+            self.assertEqual(stmt.sql.count('%s'), len(args), stmt.name)
+
+class ArchiveTest(TestCase):
+    def setUp(self):
+        self.addCleanup(patch.stopall)
+        # Transaction dates not archived yet
+        self.dates = [date(2022, 11, 15), date(2022, 11, 20),
+                      date(2023, 2, 1), date(2024, 1, 5)]
+        model = patch('archive.archive_controller.ArchiveModel').start()
+        model.get_archived_through.return_value = None
+        model.get_first_date.side_effect = lambda: min(self.dates)
+        model.count.side_effect = lambda end: len(
+            [i for i in self.dates if i <= end])
+        model.move.side_effect = lambda end: setattr(
+            self, 'dates', [i for i in self.dates if i > end])
+        self.model = model
+
+    def test_closes_the_years_then_moves_each_month(self):
+        self.assertEqual(ArchiveController.archive(2023), 3)
+        calls = [i[0] for i in self.model.method_calls]
+        self.assertLess(calls.index('add_archive'), calls.index('move'))
+        self.model.add_archive.assert_called_once_with(date(2023, 12, 31))
+        # Only the months with transactions, oldest first
+        self.assertEqual([i[0][0] for i in self.model.move.call_args_list],
+                         [date(2022, 11, 30), date(2023, 2, 28)])
+        self.assertEqual(self.dates, [date(2024, 1, 5)])
+
+    def test_later_year_already_archived(self):
+        self.model.get_archived_through.return_value = date(2023, 12, 31)
+        with self.assertRaises(AssertionError):
+            ArchiveController.archive(2022)
+        self.model.move.assert_not_called()
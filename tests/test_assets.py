@@ -0,0 +1,75 @@
+from gzip import decompress
+from json import load
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from utils.assets import _built_name, _rewrite_css, build
+
+class BuildTest(TestCase):
+    def setUp(self):
+        temp = TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.static = Path(temp.name)
+        self.dist = self.static / 'dist'
+        self.files = {
+            'css/site.css': ("body { background: url('../img/bg.png'); }\n"
+                             'a { background: url(icon.svg#x); }\n'
+                             '.b { background: url(data:image/png;base64,AA); }\n'
+                             '.c { background: url(/static/img/bg.png); }\n'
+                             '.d { background: url("missing.png"); }\n'),
+            'css/icon.svg': '<svg/>',
+            'img/bg.png': 'png',
+        }
+        for name, text in self.files.items():
+            (self.static / name).parent.mkdir(parents=True, exist_ok=True)
+            (self.static / name).write_text(text)
+
+    def test_build(self):
+        manifest = build(self.static, self.dist)
+        self.assertEqual(sorted(manifest), sorted(self.files))
+        for name, built in manifest.items():
+            self.assertTrue(_built_name.search(built), built)
+            self.assertTrue((self.dist / built).exists())
+        with open(self.dist / 'manifest.json') as file:
+            self.assertEqual(load(file), manifest)
+
+        css = (self.dist / manifest['css/site.css']).read_text()
+        png = Path(manifest['img/bg.png']).name
+        svg = Path(manifest['css/icon.svg']).name
+        self.assertIn(f"url('../img/{png}')", css)
+        self.assertIn(f'url({svg}#x)', css)
+        self.assertIn('url(data:image/png;base64,AA)', css)
+        self.assertIn('url(/static/img/bg.png)', css)
+        self.assertIn('url("missing.png")', css)
+
+        # Text files get a gzip variant, images don't
+        gz = self.dist / f'{manifest["css/site.css"]}.gz'
+        self.assertEqual(decompress(gz.read_bytes()).decode(), css)
+        self.assertFalse((self.dist / f'{manifest["img/bg.png"]}.gz').exists())
+
+    def test_rebuild_keeps_earlier_files(self):
+        first = build(self.static, self.dist)
+        (self.static / 'img/bg.png').write_text('new png')
+        second = build(self.static, self.dist)
+
+        self.assertNotEqual(first['img/bg.png'], second['img/bg.png'])
+        # The stylesheet changes with the image it points at
+        self.assertNotEqual(first['css/site.css'], second['css/site.css'])
+        self.assertEqual(first['css/icon.svg'], second['css/icon.svg'])
+        for built in list(first.values()) + list(second.values()):
+            self.assertTrue((self.dist / built).exists())
+
+    def test_rewrite_css(self):
+        manifest = {'fonts/a.woff2': 'fonts/a.0123456789ab.woff2'}
+        self.assertEqual(
+            _rewrite_css('css/all.css',
+                         'src: url(../fonts/a.woff2?v=1)', manifest),
+            'src: url(../fonts/a.0123456789ab.woff2?v=1)')
+
+class BuiltNameTest(TestCase):
+    def test_names(self):
+        self.assertTrue(_built_name.search('css/site.0123456789ab.css'))
+        self.assertFalse(_built_name.search('css/site.0123456789ab.css.gz'))
+        self.assertFalse(_built_name.search('manifest.json'))
+        self.assertFalse(_built_name.search('css/site.css'))
@@ -0,0 +1,93 @@
+from contextlib import nullcontext
+from datetime import date, datetime
+from decimal import Decimal
+from os import path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from utils import backup
+
+_tables = {
+    'acct': [{'accountid': 1, 'accountname': 'Checking',
+              'accounttype': 'Checking',
+              'date_created': datetime(2024, 1, 2, 3, 4, 5)}],
+    'transact': [
+        {'transactionid': i, 'accountid': 1, 'categoryid': 2,
+         'amount': Decimal(i * 37 - 500).scaleb(-2),
+         'transactiondate': date(2024, 1, 1 + i % 28), 'dscr': f'Shop {i}',
+         'fingerprint': None if i % 3 else f'{i:032x}'}
+        for i in range(1, 26)
+    ],
+    'change_log': [
+        {'changeid': 1, 'version': 3, 'table_name': 'transact',
+         'row_id': 1, 'row_id2': None, 'op': 'add',
+         'changed_at': datetime(2024, 1, 2)},
+        {'changeid': 2, 'version': 3, 'table_name': 'cashflow',
+         'row_id': 1, 'row_id2': 2, 'op': 'add',
+         'changed_at': datetime(2024, 1, 2)},
+        {'changeid': 5, 'version': 9, 'table_name': 'transact',
+         'row_id': 1, 'row_id2': None, 'op': 'archive',
+         'changed_at': datetime(2024, 2, 1)}
+    ]
+}
+
+class BackupTest(TestCase):
+    def setUp(self):
+        self.addCleanup(patch.stopall)
+        self.saved = {i: [] for i in backup._tables} # The restored tables
+        self.committed = []
+        read = {j: i for i, j in backup._read.items()}
+        write = {j: i for i, j in backup._write.items()}
+        count = {j: i for i, j in backup._count.items()}
+
+        def fetchiter(stmt, size):
+            return iter(_tables.get(read[stmt], []))
+
+        def fetchone(stmt):
+            if stmt in count:
+                return {'total': len(self.saved[count[stmt]])}
+            return {'total': 0} # No orphans
+
+        def commit_many(stmt, rows):
+            table = write[stmt]
+            names = [i for i, _ in backup._tables[table]]
+            self.saved[table] += [dict(zip(names, i)) for i in rows]
+
+        for name, fake in (('db_fetchiter', fetchiter),
+                           ('db_fetchone', fetchone),
+                           ('db_commit_many', commit_many),
+                           ('db_snapshot', nullcontext),
+                           ('db_transaction', nullcontext)):
+            patch(f'utils.backup.{name}', fake).start()
+        patch('utils.backup.db_commit',
+              lambda *args, **kwargs: self.committed.append(args[0])).start()
+        self.rebuild = patch(
+            'account.AcctController.rebuild_balance_index').start()
+        patch('utils.backup._chunk_rows', 10).start()
+
+        folder = TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.path = path.join(folder.name, 'budget.backup')
+
+    def test_round_trip(self):
+        rows = backup.backup(self.path)
+        self.assertEqual(rows['transact'], 25)
+        self.assertEqual(rows['budget'], 0)
+        self.assertEqual(backup.restore(self.path, workers=2), rows)
+
+        for table in backup._tables:
+            restored = sorted(self.saved[table],
+                              key=lambda i: list(i.values())[0])
+            self.assertEqual(restored, _tables.get(table, []), table)
+        # New changes continue after the saved versions, and the balance
+        # index is rebuilt once every row is back
+        self.assertEqual(self.committed[-1], backup._set_change_version)
+        self.rebuild.assert_called_once()
+
+    def test_only_into_empty_tables(self):
+        backup.backup(self.path)
+        self.saved['change_log'].append({})
+        with self.assertRaisesRegex(AssertionError, 'change_log'):
+            backup.restore(self.path)
+        self.assertEqual(self.saved['transact'], [])
@@ -0,0 +1,47 @@
+from contextlib import nullcontext
+from datetime import date
+from unittest import TestCase
+from unittest.mock import patch
+
+from transact.transact_model import TransactModel
+
+class BalanceIndexTest(TestCase):
+    # Every write keeps `acct_balance` in step in the same commit
+    def commit(self, write, *args):
+        with patch('transact.transact_model.db_transaction', nullcontext), \
+                patch('transact.transact_model.db_commit',
+                      return_value=7) as commit:
+            write(*args)
+        pairs = []
+        for call in commit.call_args_list:
+            pairs += zip(call[0][::2], call[0][1::2])
+        for stmt, stmt_args in pairs:
+            self.assertEqual(stmt.sql.count('%s'), len(stmt_args), stmt.name)
+        return [(stmt.name.split('.')[1], stmt_args)
+                for stmt, stmt_args in pairs]
+
+    def test_add(self):
+        pairs = self.commit(TransactModel.add_transaction, 2, 4, 15,
+                            date(2024, 5, 1), 'Shop', None)
+        # The day's row exists before the amount is added from it onward
+        self.assertEqual(pairs[:2], [
+            ('add_balance_day', (2, date(2024, 5, 1), 2, date(2024, 5, 1))),
+            ('shift_balance', (15, 2, date(2024, 5, 1)))
+        ])
+        self.assertEqual([i for i, _ in pairs[2:]],
+                         ['add_transaction', 'log_change'])
+
+    def test_edit(self):
+        pairs = self.commit(TransactModel.edit_transaction, 3, 4, -20,
+                            date(2024, 6, 1), 'Shop', None, 9)
+        names = [i for i, _ in pairs]
+        # The old amount is taken out while the row still has it, and
+        # the new one added once it's saved
+        self.assertEqual(names[0], 'unshift_balance')
+        self.assertEqual(names[-3:], ['add_balance_day', 'shift_balance',
+                                      'log_change'])
+        self.assertEqual(pairs[-2][1], (-20, 3, date(2024, 6, 1)))
+
+    def test_delete(self):
+        names = [i for i, _ in self.commit(TransactModel.delete, 9)]
+        self.assertEqual(names, ['unshift_balance', 'log_change', 'delete'])
@@ -0,0 +1,82 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from transact.categorizer import Categorizer
+
+def _columns(rows):
+    # :param rows: list of (transactionid, categoryid, dscr)
+    return {'transactionid': [i[0] for i in rows],
+            'categoryid': [i[1] for i in rows], 'dscr': [i[2] for i in rows]}
+
+class CategorizerTest(TestCase):
+    # The tables as `change_log` versions see them
+    def setUp(self):
+        self.addCleanup(patch.stopall)
+        for name in ('_prefixes', '_words', '_rows'):
+            patch.object(Categorizer, name, None).start()
+        patch.object(Categorizer, '_version', 0).start()
+        self.version = 1
+        self.rows = {1: (5, 'STARBUCKS #12 SEATTLE'),
+                     2: (5, 'Starbucks 99 Seattle'),
+                     3: (8, 'SHELL OIL 123')}
+        self.changes = [] # (version, transactionid)
+        patch('transact.categorizer.db_fetchone',
+              side_effect=lambda stmt: {'version': self.version}).start()
+        self.fetch = patch('transact.categorizer.db_fetchcolumns',
+                           side_effect=self.fetchcolumns).start()
+
+    def fetchcolumns(self, stmt, args=None):
+        if args is None: # Every row
+            return _columns([(i, *j) for i, j in self.rows.items()])
+        ids = [i for version, i in self.changes
+               if args[0] < version <= args[1]]
+        if stmt.name.endswith('changed_ids'):
+            return {'row_id': ids}
+        return _columns([(i, *self.rows[i]) for i in sorted(set(ids))
+                         if i in self.rows])
+
+    def change(self, transaction_id, row=None):
+        # Add, edit (row) or delete (None) a transaction and commit it
+        if row is None:
+            del self.rows[transaction_id]
+        else:
+            self.rows[transaction_id] = row
+        self.version += 1
+        self.changes.append((self.version, transaction_id))
+
+    def test_loads_on_first_use(self):
+        self.assertEqual(Categorizer.suggest('Starbucks Seattle WA'), (5, 1.0))
+        self.assertEqual(Categorizer.suggest('OIL CHANGE'), (8, 1.0))
+        self.assertIsNone(Categorizer.suggest('unknown'))
+
+    def test_follows_changes_of_every_process(self):
+        Categorizer.suggest('x')
+        self.change(2, (6, 'Starbucks 99 Seattle'))
+        self.change(4, (6, 'STARBUCKS RESERVE SEATTLE'))
+        self.change(1, None)
+        category_id, confidence = Categorizer.suggest('STARBUCKS SEATTLE')
+        self.assertEqual((category_id, confidence), (6, 1.0))
+        self.assertEqual(Categorizer._version, self.version)
+        # Every row is counted once
+        self.assertEqual(sorted(Categorizer._rows), [2, 3, 4])
+
+    def test_a_row_changed_twice_is_counted_once(self):
+        Categorizer.suggest('x')
+        self.change(3, (9, 'SHELL OIL 123'))
+        self.change(3, (9, 'SHELL OIL 124'))
+        Categorizer.refresh()
+        self.assertEqual(Categorizer._prefixes['shell oil'], {9: 1})
+
+    def test_no_change_is_one_query(self):
+        Categorizer.suggest('x')
+        calls = self.fetch.call_count
+        Categorizer.suggest('y')
+        Categorizer.suggest('z')
+        self.assertEqual(self.fetch.call_count, calls)
+
+    def test_rebuild(self):
+        Categorizer.suggest('x')
+        self.rows[7] = (2, 'NEW PLACE')
+        self.assertEqual(Categorizer.rebuild(), 3)
+        self.assertEqual(Categorizer.suggest('new place', refresh=False),
+                         (2, 1.0))
@@ -0,0 +1,48 @@
+from decimal import Decimal
+from unittest import TestCase
+from unittest.mock import patch
+
+from budget.budget_controller import BudgetController
+from budget.budget_model import BudgetModel
+
+class CopyBudgetsTest(TestCase):
+    budgets = [{'categoryid': 3, 'budget_amount': Decimal('-250.00')},
+               {'categoryid': 7, 'budget_amount': Decimal('100.50')}]
+
+    def copy(self, budgets, *args):
+        with patch.object(BudgetModel, 'get_month_budgets',
+                          return_value=budgets) as get, \
+             patch.object(BudgetModel, 'upsert_budgets') as upsert:
+            count = BudgetController.copy_budgets(*args)
+        return get, upsert, count
+
+    def test_expands_over_the_year_end(self):
+        get, upsert, count = self.copy(self.budgets, 2024, 10,
+                                       2024, 11, 2025, 2)
+        get.assert_called_once_with(2024, 10)
+        rows = upsert.call_args[0][0]
+        self.assertEqual(count, 8)
+        self.assertEqual(len(rows), 8)
+        self.assertEqual([(i[1], i[2]) for i in rows[::2]],
+                         [(2024, 11), (2024, 12), (2025, 1), (2025, 2)])
+        self.assertEqual(rows[:2], [(3, 2024, 11, Decimal('-250.00')),
+                                    (7, 2024, 11, Decimal('100.50'))])
+
+    def test_single_month(self):
+        _, upsert, count = self.copy(self.budgets, 2024, 1, 2024, 2, 2024, 2)
+        self.assertEqual(count, 2)
+        upsert.assert_called_once()
+
+    def test_rejects_bad_ranges(self):
+        with self.assertRaises(AssertionError):
+            self.copy(self.budgets, 2024, 1, 2024, 5, 2024, 4)
+        with self.assertRaises(AssertionError):
+            self.copy([], 2024, 1, 2024, 2, 2024, 3)
+
+    def test_saves_nothing_when_a_month_is_invalid(self):
+        with patch.object(BudgetModel, 'get_month_budgets',
+                          return_value=self.budgets), \
+             patch.object(BudgetModel, 'upsert_budgets') as upsert:
+            with self.assertRaises(AssertionError):
+                BudgetController.copy_budgets(2030, 1, 2030, 12, 2031, 1)
+        upsert.assert_not_called()
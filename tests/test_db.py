@@ -0,0 +1,47 @@
+from unittest import TestCase
+
+from utils import db
+from utils.statements import statement
+from tests.fake_db import fake_db
+
+_add = statement('test.add', 'INSERT INTO t (a) VALUES (%s)')
+_log = statement('test.log', """
+    INSERT INTO change_log (table_name, row_id, op) VALUES ('t', %s, 'add')
+""")
+
+class TransactionTest(TestCase):
+    def test_versions_are_given_out_at_commit(self):
+        with fake_db() as connections:
+            with db.db_transaction():
+                id = db.db_commit(_add, (1,))
+                with db.db_transaction(): # Joins the outer one
+                    db.db_commit(_log, (id,), return_id=False)
+                self.assertEqual(connections[0].commits, 0)
+        connection, = connections
+        self.assertEqual(connection.commits, 1)
+        # The log rows get the next version right before the commit, so
+        # versions follow commit order
+        self.assertEqual([i for i, _ in connection.executed],
+                         [_add.sql, _log.sql, db._next_version.sql,
+                          db._set_version.sql])
+
+    def test_no_version_without_logged_changes(self):
+        with fake_db() as connections:
+            db.db_commit(_add, (1,))
+        self.assertEqual([i for i, _ in connections[0].executed], [_add.sql])
+        self.assertEqual(connections[0].commits, 1)
+
+    def test_rolled_back_on_error(self):
+        with fake_db() as connections:
+            with self.assertRaises(AssertionError):
+                with db.db_transaction():
+                    db.db_commit(_log, (1,), return_id=False)
+                    raise AssertionError('stop')
+            self.assertEqual(db._idle.qsize(), 0)
+        connection, = connections
+        # Closed without a commit (or a version) instead of pooled
+        self.assertEqual(connection.commits, 0)
+        self.assertTrue(connection.closed)
+        self.assertNotIn(db._next_version.sql,
+                         [i for i, _ in connection.executed])
+        self.assertFalse(db._in_transaction())
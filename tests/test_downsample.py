@@ -0,0 +1,27 @@
+from unittest import TestCase
+
+from utils.downsample import lttb
+
+class LttbTest(TestCase):
+    def test_small_series_is_unchanged(self):
+        points = [(i, i * 2) for i in range(10)]
+        self.assertEqual(lttb(points, 10), points)
+        self.assertEqual(lttb(points, 50), points)
+        self.assertEqual(lttb(points, 2), points) # Too few to bucket
+
+    def test_keeps_threshold_points_in_order(self):
+        points = [(i, (i * 7919) % 101) for i in range(1000)]
+        sampled = lttb(points, 100)
+        self.assertEqual(len(sampled), 100)
+        self.assertEqual(sampled[0], points[0])
+        self.assertEqual(sampled[-1], points[-1])
+        self.assertEqual(sampled, sorted(sampled))
+        self.assertTrue(set(sampled) <= set(points))
+
+    def test_keeps_peaks(self):
+        points = [(i, 0) for i in range(500)]
+        points[123] = (123, 1000)
+        points[321] = (321, -1000)
+        sampled = lttb(points, 20)
+        self.assertIn((123, 1000), sampled)
+        self.assertIn((321, -1000), sampled)
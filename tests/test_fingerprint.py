@@ -0,0 +1,64 @@
+from datetime import date
+from decimal import Decimal
+from unittest import TestCase
+from unittest.mock import patch
+
+from transact.fingerprint import fingerprint, merchant, normalize, words
+from transact.transact_controller import TransactController
+from transact.transact_model import TransactModel
+
+class FingerprintTest(TestCase):
+    def test_normalize(self):
+        self.assertEqual(normalize('AMZN Mktp  US*1A2B'), 'amzn mktp us 1a2b')
+        self.assertEqual(normalize('  --Café #12--  '), 'caf 12')
+        self.assertEqual(normalize('***'), '')
+
+    def test_words_and_merchant(self):
+        self.assertEqual(words('STARBUCKS #1234 SEATTLE WA'),
+                         ['starbucks', 'seattle', 'wa'])
+        self.assertEqual(merchant('STARBUCKS #1234 SEATTLE WA'),
+                         'starbucks seattle')
+        self.assertEqual(merchant('#1234 X'), '')
+
+    def test_fingerprint(self):
+        key = fingerprint(1, Decimal('-4.5'), 'Starbucks #12, Seattle')
+        self.assertEqual(len(key), 32)
+        self.assertEqual(key, fingerprint('1', '-4.50', 'STARBUCKS 12 SEATTLE'))
+        self.assertNotEqual(key, fingerprint(2, '-4.50', 'starbucks 12 seattle'))
+        self.assertNotEqual(key, fingerprint(1, '-4.51', 'starbucks 12 seattle'))
+        self.assertNotEqual(key, fingerprint(1, '-4.50', 'starbucks 13 seattle'))
+
+class FindDuplicatesTest(TestCase):
+    def transaction(self, day, dscr='Coffee', amount='-3.00'):
+        return {'accountid': 1, 'amount': Decimal(amount),
+                'transactiondate': f'2024-05-{day:02}', 'dscr': dscr}
+
+    def find(self, transactions, existing):
+        with patch.object(TransactModel, 'find_duplicates',
+                          return_value=existing) as find:
+            return find, TransactController.find_duplicates(transactions)
+
+    def test_matches_the_closest_existing_transaction(self):
+        key = fingerprint(1, '-3.00', 'COFFEE')
+        existing = [{'transactionid': 8, 'fingerprint': key,
+                     'transactiondate': date(2024, 5, 1), 'dscr': 'COFFEE'},
+                    {'transactionid': 9, 'fingerprint': key,
+                     'transactiondate': date(2024, 5, 9), 'dscr': 'COFFEE'}]
+        _, duplicates = self.find([self.transaction(8), self.transaction(20),
+                                   self.transaction(8, 'Tea')], existing)
+        self.assertEqual(duplicates[0]['transactionid'], 9)
+        self.assertEqual(duplicates[1:], [None, None])
+
+    def test_matches_earlier_rows_of_the_batch(self):
+        find, duplicates = self.find([self.transaction(3), self.transaction(4),
+                                      self.transaction(4)], [])
+        self.assertEqual(duplicates[0], None)
+        self.assertEqual(duplicates[1]['transactiondate'], date(2024, 5, 3))
+        self.assertEqual(duplicates[2]['transactiondate'], date(2024, 5, 3))
+        # The repeated key is looked up once
+        self.assertEqual(len(find.call_args[0][0]), 2)
+
+    def test_empty(self):
+        find, duplicates = self.find([], [])
+        self.assertEqual(duplicates, [])
+        find.assert_not_called()
@@ -0,0 +1,59 @@
+from datetime import date
+from decimal import Decimal
+from unittest import TestCase
+from unittest.mock import patch
+
+from budget.budget_controller import BudgetController
+from budget.budget_model import BudgetModel
+
+def _month(year, month): return year * 12 + month - 1
+
+def _totals(rows):
+    # :param rows: list of (categoryid, year, month, day, cents)
+    return {'categoryid': [i[0] for i in rows],
+            'month_index': [_month(i[1], i[2]) for i in rows],
+            'day': [i[3] for i in rows], 'cents': [i[4] for i in rows]}
+
+class ForecastTest(TestCase):
+    rows = [(5, 2024, 1, 5, -1000), (5, 2024, 1, 20, -3000),
+            (5, 2024, 2, 3, -2000), (5, 2024, 2, 25, -1000),
+            (5, 2024, 3, 2, -500)]
+
+    def forecast(self, rows, *args, **kwargs):
+        with patch.object(BudgetModel, 'get_daily_totals',
+                          return_value=_totals(rows)):
+            return BudgetController.forecast(*args, **kwargs)
+
+    def test_adds_the_usual_rest_of_the_month(self):
+        # Spent after the 10th: 30.00 in January, 10.00 in February
+        result = self.forecast(self.rows, 2024, 3, history=2,
+                               today=date(2024, 3, 10))
+        self.assertEqual(result[5]['to_date'], Decimal('-5.00'))
+        self.assertEqual(result[5]['projected'], Decimal('-25.00'))
+        # 70.00 over the 60 days of January and February
+        self.assertEqual(result[5]['daily_burn'], Decimal('-1.17'))
+
+    def test_recurring_items_are_a_floor(self):
+        result = self.forecast(self.rows, 2024, 3, history=2,
+                               today=date(2024, 3, 10),
+                               recurring={5: Decimal('-40')})
+        self.assertEqual(result[5]['projected'], Decimal('-45.00'))
+
+        result = self.forecast(self.rows, 2024, 3, history=2,
+                               today=date(2024, 3, 10),
+                               recurring={5: Decimal('-1')})
+        self.assertEqual(result[5]['projected'], Decimal('-25.00'))
+
+    def test_past_and_future_months(self):
+        past = self.forecast(self.rows, 2024, 3, history=2,
+                             today=date(2024, 4, 2))
+        self.assertEqual(past[5]['projected'], Decimal('-5.00'))
+
+        future = self.forecast(self.rows, 2024, 3, history=2,
+                               today=date(2024, 2, 1))
+        self.assertEqual(future[5]['to_date'], Decimal('0.00'))
+        self.assertEqual(future[5]['projected'], Decimal('-35.00'))
+
+    def test_no_transactions(self):
+        self.assertEqual(self.forecast([], 2024, 3, today=date(2024, 3, 1)),
+                         {})
@@ -0,0 +1,39 @@
+from importlib.util import module_from_spec, spec_from_file_location
+from os import listdir, path
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch
+
+_spec = spec_from_file_location(
+    'gunicorn_conf',
+    path.join(path.dirname(path.dirname(__file__)), 'gunicorn.conf.py'))
+conf = module_from_spec(_spec)
+_spec.loader.exec_module(conf)
+
+class MultiprocessDirTest(TestCase):
+    def test_emptied_on_start(self):
+        with TemporaryDirectory() as folder:
+            for name in ('counter_11.db', 'gauge_livesum_11.db', 'notes.txt'):
+                open(path.join(folder, name), 'w').close()
+            with patch.dict(conf.environ,
+                            {'PROMETHEUS_MULTIPROC_DIR': folder}):
+                conf.on_starting(None)
+            self.assertEqual(listdir(folder), ['notes.txt'])
+
+    def test_stopped_worker_is_marked_dead(self):
+        with TemporaryDirectory() as folder, \
+                patch.dict(conf.environ,
+                           {'PROMETHEUS_MULTIPROC_DIR': folder}), \
+                patch('prometheus_client.multiprocess.mark_process_dead') \
+                as mark:
+            conf.child_exit(None, SimpleNamespace(pid=11))
+        mark.assert_called_once_with(11)
+
+    def test_single_process(self):
+        with patch.dict(conf.environ, clear=True), \
+                patch('prometheus_client.multiprocess.mark_process_dead') \
+                as mark:
+            conf.on_starting(None)
+            conf.child_exit(None, SimpleNamespace(pid=11))
+        mark.assert_not_called()
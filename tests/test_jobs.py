@@ -0,0 +1,109 @@
+from datetime import timedelta
+from unittest import TestCase
+from unittest.mock import patch
+
+from job.job_controller import JobController
+from job.job_model import JobModel
+
+class _Executor:
+    # Holds submitted calls until the test runs them
+    def __init__(self): self.calls = []
+
+    def submit(self, func, *args): self.calls.append((func, args))
+
+    def run(self):
+        calls, self.calls = self.calls, []
+        for func, args in calls:
+            func(*args)
+
+class ResultTest(TestCase):
+    name = 'test.job'
+
+    def setUp(self):
+        self.addCleanup(patch.stopall)
+        self.executor = _Executor()
+        patch.object(JobController, '_executor', self.executor).start()
+        patch.object(JobController, '_beater', object()).start()
+        for method in ('start_job', 'finish_job', 'set_progress'):
+            patch.object(JobModel, method).start()
+        patch.object(JobModel, 'add_job', return_value=7).start()
+        self.runs = 0
+        self.version = 1
+        def job(progress):
+            self.runs += 1
+            return self.runs
+        JobController.register(self.name, job, version=lambda: self.version)
+        self.addCleanup(self.unregister)
+
+    def unregister(self):
+        for i in (JobController._jobs, JobController._versions,
+                  JobController._results, JobController._running):
+            i.pop(self.name, None)
+
+    def test_computes_the_first_result_right_away(self):
+        result = JobController.result(self.name)
+        self.assertEqual(result['result'], 1)
+        self.assertFalse(result['refreshing'])
+        self.assertEqual(self.executor.calls, [])
+
+    def test_serves_the_last_result_while_refreshing(self):
+        JobController.result(self.name)
+        self.version = 2
+        result = JobController.result(self.name)
+        self.assertEqual(result['result'], 1)
+        self.assertTrue(result['refreshing'])
+        self.assertEqual(self.runs, 1)
+
+        self.executor.run()
+        result = JobController.result(self.name)
+        self.assertEqual(result['result'], 2)
+        self.assertFalse(result['refreshing'])
+        JobModel.finish_job.assert_called_with(7, 'Done', '')
+
+    def test_refreshes_old_results(self):
+        JobController.result(self.name)
+        self.assertEqual(JobController.result(self.name, max_age=60)['result'],
+                         1)
+        self.assertEqual(self.executor.calls, [])
+
+        result, computed_at, version = JobController._results[self.name]
+        JobController._results[self.name] = (
+            result, computed_at - timedelta(seconds=61), version)
+        self.assertTrue(JobController.result(self.name, max_age=60)
+                        ['refreshing'])
+        self.executor.run()
+        self.assertEqual(JobController.result(self.name)['result'], 2)
+
+    def test_one_refresh_at_a_time(self):
+        JobController.result(self.name)
+        self.version = 2
+        JobController.result(self.name)
+        JobController.result(self.name)
+        self.assertEqual(len(self.executor.calls), 1)
+
+class HeartbeatTest(TestCase):
+    def test_beats_for_queued_and_running_jobs(self):
+        class Stop(Exception):
+            pass
+        with patch.object(JobController, '_running', {'a': 3, 'b': 5}), \
+             patch.object(JobModel, 'beat') as beat, \
+             patch('job.job_controller.sleep',
+                   side_effect=[None, None, Stop]) as sleep:
+            with self.assertRaises(Stop):
+                JobController._beat()
+        sleep.assert_called_with(JobController._heartbeat)
+        self.assertEqual(beat.call_count, 2)
+        self.assertEqual(sorted(beat.call_args[0][0]), [3, 5])
+
+    def test_recover_fails_jobs_after_missed_heartbeats(self):
+        with patch.object(JobModel, 'fail_stale',
+                          return_value=True) as fail_stale:
+            self.assertTrue(JobController.recover())
+        seconds, message = fail_stale.call_args[0]
+        self.assertGreater(seconds, JobController._heartbeat * 2)
+        self.assertIn('stopped', message)
+
+    def test_beat_sends_the_ids_as_json(self):
+        with patch('job.job_model.db_commit') as commit:
+            JobModel.beat([4, '9'])
+        self.assertEqual(commit.call_args[0][1], ('[4, 9]',))
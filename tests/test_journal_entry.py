@@ -0,0 +1,57 @@
+from contextlib import nullcontext
+from decimal import Decimal
+from unittest import TestCase
+from unittest.mock import patch
+
+from cashflow.cashflow_controller import CashflowController
+from cashflow.cashflow_model import CashflowModel
+from transact.transact_model import TransactModel
+
+def _leg(amount, dscr, accountid=1, transactiondate='2024-05-01'):
+    return {'accountid': accountid, 'categoryid': 4, 'amount': amount,
+            'transactiondate': transactiondate, 'dscr': dscr}
+
+class JournalEntryTest(TestCase):
+    def setUp(self):
+        self.addCleanup(patch.stopall)
+        patch('cashflow.cashflow_controller.db_transaction',
+              nullcontext).start()
+        patch.object(TransactModel, 'get_archived_through',
+                     return_value=None).start()
+        self.find = patch.object(TransactModel, 'find_duplicates',
+                                 return_value=[]).start()
+
+    def add(self, *legs, **kwargs):
+        with patch.object(TransactModel, 'add_transactions',
+                          side_effect=lambda rows: list(
+                              range(10, 10 + len(rows)))) as add, \
+             patch.object(CashflowModel, 'add_cashflows') as cashflows:
+            ids = CashflowController.add_journal_entry(*legs, **kwargs)
+        return ids, add.call_args[0][0], cashflows.call_args[0][0]
+
+    def test_equal_split(self):
+        ids, rows, cashflows = self.add(_leg('-20', 'Dinner'),
+                                        _leg('10', 'Paid back'),
+                                        _leg('10', 'Paid back'))
+        self.assertEqual(ids, [10, 11, 12])
+        self.assertEqual([i[2] for i in rows],
+                         [Decimal(-20), Decimal(10), Decimal(10)])
+        self.assertEqual(cashflows, [(10, 11, 'Business'),
+                                     (10, 12, 'Business')])
+        # Equal legs aren't duplicates of each other
+        self.find.assert_not_called()
+
+    def test_every_expense_to_every_income(self):
+        _, _, cashflows = self.add(_leg('-5', 'A'), _leg('8', 'B'),
+                                   _leg('-3', 'C'), _leg('2', 'D'))
+        self.assertEqual(sorted(cashflows),
+                         [(10, 11, 'Business'), (10, 13, 'Business'),
+                          (12, 11, 'Business'), (12, 13, 'Business')])
+
+    def test_invalid(self):
+        with self.assertRaises(AssertionError):
+            self.add(_leg('-5', 'A'), _leg('-5', 'B'))
+        with self.assertRaises(AssertionError):
+            self.add(_leg('-5', 'A'), _leg('4', 'B'), type_='Transfer')
+        with self.assertRaises(AssertionError):
+            self.add(_leg('-5', 'A'), {**_leg('5', 'B'), 'categoryid': 9})
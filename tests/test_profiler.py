@@ -0,0 +1,30 @@
+from asyncio import run, to_thread
+from threading import get_ident
+from unittest import TestCase
+
+from utils import profiler
+
+class SampledTest(TestCase):
+    def setUp(self):
+        profiler._active.clear()
+
+    def test_worker_thread_is_sampled_with_the_request(self):
+        def query():
+            return get_ident(), dict(profiler._active)
+
+        async def view():
+            return await to_thread(profiler.sampled(query))
+
+        token = profiler._endpoint.set('transact.dashboard')
+        try:
+            thread_id, active = run(view())
+        finally:
+            profiler._endpoint.reset(token)
+        self.assertNotEqual(thread_id, get_ident())
+        self.assertEqual(active, {thread_id: 'transact.dashboard'})
+        # The pooled thread stops being sampled once the call returns
+        self.assertEqual(profiler._active, {})
+
+    def test_unsampled_request(self):
+        def query(): pass
+        self.assertIs(profiler.sampled(query), query)
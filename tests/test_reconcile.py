@@ -0,0 +1,80 @@
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from unittest import TestCase
+from unittest.mock import patch
+
+from account.acct_controller import AcctController
+from account.account_model import AccountModel
+from app import app
+
+def _row(transactionid, day, amount, dscr, month=5):
+    return {'transactionid': transactionid,
+            'transactiondate': date(2024, month, day),
+            'amount': Decimal(amount), 'dscr': dscr}
+
+class ReconcileTest(TestCase):
+    def reconcile(self, csv, rows, start=date(2024, 5, 1),
+                  end=date(2024, 5, 31)):
+        # `rows` must be ordered by date and amount, like the query
+        with patch.dict(app.config, {'DUPLICATE_WINDOW_DAYS': 3}), \
+             patch.object(AccountModel, 'get_account',
+                          return_value={'accountid': 1}), \
+             patch.object(AccountModel, 'get_statement_lines',
+                          return_value=iter(rows)) as lines:
+            result = AcctController.reconcile(1, start, end, StringIO(csv))
+        # Transactions a window past the range are read too
+        lines.assert_called_once_with(1, date(2024, 4, 28), date(2024, 6, 3))
+        return result
+
+    def test_statement(self):
+        csv = ('Date,Amount,Description\n'
+               '2024-05-31,-5.00,PARKING\n' # Lines don't need to be sorted
+               '05/02/2024,-10.00,COFFEE SHOP\n'
+               '2024-05-10,"-$25.00",GROCER MART #12\n'
+               '2024-05-15,-7.00,NEWSSTAND\n'
+               '2024-06-01,-1.00,NEXT MONTH\n')
+        rows = [_row(9, 29, '-99.00', 'OLD', month=4),
+                _row(1, 3, '-10.00', 'Coffee Shop'),
+                _row(2, 10, '-24.50', 'Grocer Mart'),
+                _row(3, 20, '-40.00', 'GYM'),
+                _row(4, 2, '-5.00', 'PARKING', month=6)]
+        result = self.reconcile(csv, rows)
+
+        self.assertEqual(result['matched'], 2)
+        self.assertEqual([i['dscr'] for i in result['missing']],
+                         ['NEWSSTAND'])
+        self.assertEqual([i['transactionid'] for i in result['extra']], [3])
+        self.assertEqual(len(result['mismatched']), 1)
+        mismatch = result['mismatched'][0]
+        self.assertEqual(mismatch['transaction']['transactionid'], 2)
+        self.assertEqual(mismatch['line']['dscr'], 'GROCER MART #12')
+        self.assertEqual(mismatch['difference'], Decimal('-0.50'))
+        self.assertEqual(result['statement_total'], Decimal('-47.00'))
+        self.assertEqual(result['book_total'], Decimal('-74.50'))
+        self.assertEqual(result['difference'], Decimal('27.50'))
+
+    def test_matches_the_closest_date(self):
+        csv = 'date,amount,description\n2024-05-05,-3.00,BUS\n'
+        rows = [_row(1, 3, '-3.00', 'BUS'), _row(2, 6, '-3.00', 'BUS')]
+        result = self.reconcile(csv, rows)
+        self.assertEqual(result['matched'], 1)
+        self.assertEqual(result['extra'], [rows[0]])
+        self.assertEqual(result['missing'], [])
+
+    def test_too_far_apart(self):
+        csv = 'date,amount,description\n2024-05-05,-3.00,BUS\n'
+        rows = [_row(1, 9, '-3.00', 'BUS')]
+        result = self.reconcile(csv, rows)
+        self.assertEqual(result['matched'], 0)
+        self.assertEqual(result['mismatched'], [])
+        self.assertEqual([i['dscr'] for i in result['missing']], ['BUS'])
+        self.assertEqual(result['extra'], rows)
+
+    def test_errors(self):
+        with self.assertRaises(AssertionError):
+            self.reconcile('date,amount\n2024-05-05,-3.00\n', [])
+        with patch.object(AccountModel, 'get_account', return_value=None):
+            with self.assertRaises(AssertionError):
+                AcctController.reconcile(1, date(2024, 5, 1),
+                                         date(2024, 5, 31), StringIO(''))
@@ -0,0 +1,62 @@
+from decimal import Decimal
+from unittest import TestCase
+
+from rule.rule_matcher import RuleMatcher
+from utils.ahocorasick import Automaton
+
+def _rule(ruleid, pattern, categoryid, match_type='Contains', accountid=None,
+          amount_sign='Any', priority=0):
+    return {'ruleid': ruleid, 'pattern': pattern, 'match_type': match_type,
+            'accountid': accountid, 'amount_sign': amount_sign,
+            'categoryid': categoryid, 'priority': priority}
+
+class AutomatonTest(TestCase):
+    def test_finds_overlapping_patterns(self):
+        automaton = Automaton({'he': 1, 'she': 2, 'hers': 3})
+        self.assertEqual(sorted(automaton.find('ushers')),
+                         [(1, 2), (2, 1), (2, 3)])
+
+    def test_no_match(self):
+        self.assertEqual(list(Automaton({'abc': 1}).find('ababd')), [])
+        self.assertEqual(list(Automaton({'abc': 1}).find('')), [])
+
+    def test_repeated_matches(self):
+        self.assertEqual(sorted(Automaton({'aa': 'x'}).find('aaaa')),
+                         [(0, 'x'), (1, 'x'), (2, 'x')])
+
+class RuleMatcherTest(TestCase):
+    def match(self, rules, description, account_id=1, amount='-1.00'):
+        rule = RuleMatcher(rules).match(account_id, Decimal(amount),
+                                        description)
+        return rule and rule['ruleid']
+
+    def test_contains_after_normalizing(self):
+        rules = [_rule(1, 'AMAZON', 10)]
+        self.assertEqual(self.match(rules, 'Amazon.com*1A2B'), 1)
+        self.assertEqual(self.match(rules, 'POS AMAZON MKTP'), 1)
+        self.assertIsNone(self.match(rules, 'AMZN MKTP'))
+
+    def test_starts_with(self):
+        rules = [_rule(1, 'pos', 10, match_type='Starts with')]
+        self.assertEqual(self.match(rules, 'POS Grocer'), 1)
+        self.assertIsNone(self.match(rules, 'Grocer POS'))
+
+    def test_account_and_sign(self):
+        rules = [_rule(1, 'transfer', 10, accountid=2),
+                 _rule(2, 'transfer', 11, amount_sign='Income')]
+        self.assertEqual(self.match(rules, 'Transfer', account_id=2), 1)
+        self.assertIsNone(self.match(rules, 'Transfer', account_id=3))
+        self.assertEqual(self.match(rules, 'Transfer', account_id=3,
+                                    amount='5.00'), 2)
+
+    def test_ranking(self):
+        rules = [_rule(1, 'shell', 10), _rule(2, 'shell oil', 11),
+                 _rule(3, 'oil', 12, priority=5), _rule(4, 'oil', 13,
+                                                       priority=5)]
+        # Priority first, then the oldest of equal rules
+        self.assertEqual(self.match(rules, 'SHELL OIL 123'), 3)
+        # Then the longest pattern
+        self.assertEqual(self.match(rules[:2], 'SHELL OIL 123'), 2)
+
+    def test_no_rules(self):
+        self.assertIsNone(self.match([], 'anything'))
@@ -0,0 +1,90 @@
+from unittest import TestCase
+from unittest.mock import patch
+from zlib import decompress, decompressobj
+
+from app import app
+from utils.streaming import (_buffer_size, _buffered, _gzipped, peek,
+                             stream_page)
+
+class BufferedTest(TestCase):
+    def test_joins_small_pieces(self):
+        pieces = ['x' * 100] * 400
+        chunks = list(_buffered(iter(pieces)))
+        self.assertEqual(''.join(chunks), ''.join(pieces))
+        # Every chunk but the last is just past the buffer size
+        for chunk in chunks[:-1]:
+            self.assertTrue(_buffer_size <= len(chunk) < _buffer_size + 100)
+        self.assertTrue(0 < len(chunks[-1]) < _buffer_size + 100)
+
+    def test_large_and_empty(self):
+        self.assertEqual(list(_buffered(['y' * 50000, 'z'])), ['y' * 50000, 'z'])
+        self.assertEqual(list(_buffered([])), [])
+
+class GzippedTest(TestCase):
+    def test_round_trip(self):
+        chunks = ['<p>héllo</p>', 'a' * 20000, '']
+        data = b''.join(_gzipped(iter(chunks)))
+        self.assertEqual(decompress(data, 16 + 15).decode(), ''.join(chunks))
+
+    def test_each_chunk_can_be_read_on_arrival(self):
+        decompressor = decompressobj(16 + 15)
+        for chunk, data in zip(['first ', 'second'], _gzipped(['first ', 'second'])):
+            self.assertEqual(decompressor.decompress(data).decode(), chunk)
+
+class PeekTest(TestCase):
+    def test_reads_only_the_first_row(self):
+        read = []
+        def rows():
+            for i in range(3):
+                read.append(i)
+                yield i
+        rows = peek(rows())
+        self.assertEqual(read, [0])
+        self.assertEqual(list(rows), [0, 1, 2])
+
+    def test_empty(self):
+        self.assertEqual(peek(iter([])), [])
+        self.assertFalse(peek(iter([])))
+
+    def test_errors_are_raised_right_away(self):
+        def rows():
+            raise RuntimeError('query failed')
+            yield
+        with self.assertRaises(RuntimeError):
+            peek(rows())
+
+class StreamPageTest(TestCase):
+    def stream(self, headers):
+        pieces = ['<html>', 'body', '</html>']
+        with patch('utils.streaming.stream_template',
+                   return_value=iter(pieces)) as template, \
+             app.test_request_context(headers=headers):
+            response = stream_page('page.html', title='x')
+            data = response.get_data()
+        template.assert_called_once_with('page.html', title='x')
+        return response, data
+
+    def test_rows_are_rendered_as_they_are_read(self):
+        read = []
+        def rows():
+            for i in range(3):
+                read.append(i)
+                yield str(i)
+        with patch('utils.streaming.stream_template',
+                   side_effect=lambda name, rows: iter(rows)), \
+             app.test_request_context():
+            response = stream_page('page.html', rows=peek(rows()))
+            self.assertEqual(read, [0])
+            self.assertEqual(response.get_data(), b'012')
+        self.assertEqual(read, [0, 1, 2])
+
+    def test_plain(self):
+        response, data = self.stream({})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(data, b'<html>body</html>')
+
+    def test_gzip(self):
+        response, data = self.stream({'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.vary)
+        self.assertEqual(decompress(data, 16 + 15), b'<html>body</html>')
@@ -0,0 +1,67 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from transact.transact_cache import TransactCache
+
+def _columns(rows):
+    # :param rows: dict of transactionid: (accountid, categoryid, cents)
+    ids = sorted(rows)
+    return {'transactionid': ids,
+            'accountid': [rows[i][0] for i in ids],
+            'categoryid': [rows[i][1] for i in ids],
+            'day': [738000] * len(ids),
+            'cents': [rows[i][2] for i in ids]}
+
+class RefreshTest(TestCase):
+    # The transaction table as `change_log` versions see it
+    def setUp(self):
+        self.addCleanup(patch.stopall)
+        patch.object(TransactCache, '_data', None).start()
+        patch.object(TransactCache, '_version', 0).start()
+        self.version = 1
+        self.rows = {1: (1, 5, 1000), 2: (1, 6, -250), 3: (2, 5, 400)}
+        self.changes = [] # (version, transactionid)
+        patch('transact.transact_cache.db_fetchone',
+              side_effect=lambda stmt: {'version': self.version}).start()
+        self.fetch = patch('transact.transact_cache.db_fetchcolumns',
+                           side_effect=self.fetchcolumns).start()
+
+    def fetchcolumns(self, stmt, args=None):
+        if args is None: # Every row
+            return _columns(self.rows)
+        ids = [i for version, i in self.changes
+               if args[0] < version <= args[1]]
+        if stmt.name.endswith('changed_ids'):
+            return {'row_id': ids}
+        return _columns({i: self.rows[i] for i in set(ids)
+                         if i in self.rows})
+
+    def change(self, transaction_id, row=None):
+        # Add, edit (row) or delete (None) a transaction and commit it
+        if row is None:
+            del self.rows[transaction_id]
+        else:
+            self.rows[transaction_id] = row
+        self.version += 1
+        self.changes.append((self.version, transaction_id))
+
+    def test_reads_only_the_changes(self):
+        self.assertEqual(TransactCache.balances(), {1: 750, 2: 400})
+        self.change(2, (2, 6, -300))
+        self.change(4, (1, 5, 50))
+        self.change(1, None)
+        self.change(5, (1, 5, 5))
+        self.change(5, (1, 5, 7)) # Edited again: read once
+        self.assertEqual(TransactCache.balances(), {1: 57, 2: 100})
+        self.assertEqual(TransactCache.sum_by_category([5]), 457)
+        data = TransactCache.refresh()
+        self.assertEqual(data['transactionid'].tolist(), [2, 3, 4, 5])
+        # One full load, then one refresh of the changed rows
+        full = [i for i in self.fetch.call_args_list if len(i[0]) == 1]
+        self.assertEqual(len(full), 1)
+
+    def test_unchanged_version_skips_the_queries(self):
+        first = TransactCache.refresh()
+        self.fetch.reset_mock()
+        self.assertIs(TransactCache.refresh(), first)
+        self.fetch.assert_not_called()
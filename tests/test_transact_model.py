@@ -0,0 +1,109 @@
+from contextlib import nullcontext
+from unittest import TestCase
+from unittest.mock import patch
+
+from transact.transact_model import TransactModel
+
+class LedgerTest(TestCase):
+    def ledger(self, opening, per_page, offset):
+        # 30 open transactions in account 5
+        rows = {'transact.get_ledger_total': {'total': 30},
+                'transact.get_opening_balance': opening}
+        with patch('transact.transact_model.db_fetchone',
+                   side_effect=lambda stmt, args: rows[stmt.name]), \
+                patch('transact.transact_model.db_fetchall',
+                      return_value=[]) as fetch:
+            _, total = TransactModel.get_ledger(5, per_page, offset)
+        stmt, args = fetch.call_args[0]
+        self.assertEqual(stmt.sql.count('%s'), len(args))
+        return stmt.name, args, total
+
+    def test_running_balance_starts_from_zero(self):
+        name, args, total = self.ledger(None, 10, 20)
+        self.assertEqual((name, args, total),
+                         ('transact.get_ledger', (0, 5, 10, 20), 30))
+
+    def test_open_years_start_from_the_opening_balance(self):
+        opening = {'accountid': 5, 'balance': 120, 'transactions': 40}
+        name, args, total = self.ledger(opening, 10, 20)
+        self.assertEqual((name, args, total),
+                         ('transact.get_ledger', (120, 5, 10, 20), 70))
+
+    def test_pages_past_the_open_years_read_the_archive(self):
+        opening = {'accountid': 5, 'balance': 120, 'transactions': 40}
+        name, args, total = self.ledger(opening, 10, 25)
+        self.assertEqual((name, args, total),
+                         ('transact.get_union_ledger', (0, 5, 5, 10, 25), 70))
+
+class FilterCategoryTest(TestCase):
+    def test_categories_are_joined_as_json(self):
+        with patch('transact.transact_model.db_fetchall',
+                   return_value=[]) as fetch:
+            TransactModel.filter_category(['3', 1, '3'])
+        stmt, args = fetch.call_args[0]
+        self.assertEqual(args, ('[1, 3]', '[1, 3]'))
+        # The indexed column is compared as is
+        self.assertNotIn('FIND_IN_SET', stmt.sql)
+        self.assertIn('ON k.categoryid = t.categoryid', stmt.sql)
+
+    def test_iter_reads_lazily(self):
+        with patch('transact.transact_model.db_fetchiter',
+                   return_value=iter([{'transactionid': 1}])) as fetch:
+            rows = TransactModel.iter_filter_category([2])
+        fetch.assert_called_once()
+        self.assertEqual(list(rows), [{'transactionid': 1}])
+
+    def test_too_many_categories(self):
+        with self.assertRaises(AssertionError):
+            TransactModel.filter_category(list(range(50)))
+
+class AccountBalancesTest(TestCase):
+    def test_one_grouped_query(self):
+        rows = [{'accountid': 1, 'balance': 5}, {'accountid': 2, 'balance': 0}]
+        with patch('transact.transact_model.db_fetchall',
+                   return_value=rows) as fetch:
+            balances = TransactModel.get_account_balances([2, '1', 2])
+        fetch.assert_called_once()
+        stmt, args = fetch.call_args[0]
+        self.assertEqual(args, ('[1, 2]',))
+        self.assertIn('GROUP BY accountid', stmt.sql)
+        self.assertEqual(balances, {1: 5, 2: 0})
+
+    def test_no_accounts(self):
+        with patch('transact.transact_model.db_fetchall') as fetch:
+            self.assertEqual(TransactModel.get_account_balances([]), {})
+        fetch.assert_not_called()
+
+class AddTransactionsTest(TestCase):
+    rows = [(1, 4, 5, '2024-05-01', 'A', 'f1'),
+            (1, 4, 5, '2024-05-01', 'A', 'f1')]
+
+    def add(self, lock_mode):
+        self.addCleanup(setattr, TransactModel, '_consecutive_ids', None)
+        TransactModel._consecutive_ids = None
+        with patch('transact.transact_model.db_transaction',
+                   nullcontext), \
+                patch('transact.transact_model.db_fetchone',
+                      return_value={'lock_mode': lock_mode}), \
+                patch('transact.transact_model.db_commit_many',
+                      return_value=10) as commit_many, \
+                patch('transact.transact_model.db_commit',
+                      side_effect=[10, 12, None]) as commit:
+            ids = TransactModel.add_transactions(self.rows)
+        return ids, commit_many, commit
+
+    def test_multi_row_insert_with_consecutive_ids(self):
+        ids, commit_many, commit = self.add(1)
+        self.assertEqual(ids, [10, 11])
+        commit_many.assert_called_once()
+        # The balance index and log statements get the IDs themselves
+        args = commit.call_args_list[0][0]
+        self.assertEqual(args[1::2], (('[10, 11]',), ('[10, 11]',) * 2,
+                                      ('[10, 11]',)))
+
+    def test_interleaved_ids_insert_each_row(self):
+        # Another insert took ID 11 while these were inserted
+        ids, commit_many, commit = self.add(2)
+        self.assertEqual(ids, [10, 12])
+        commit_many.assert_not_called()
+        self.assertEqual(commit.call_args_list[2][0][1], ('[10, 12]',))
@@ -0,0 +1,184 @@
+__all__ = ['Categorizer']
+
+from collections import Counter
+from threading import Lock
+
+from utils.db import db_fetchcolumns, db_fetchone
+from utils.statements import statement
+from .fingerprint import words
+
+class Categorizer:
+    # Suggests categories from the descriptions of past transactions
+    #
+    # Descriptions are split into words without digits (see `words()`).
+    # The first two words are the merchant prefix, and every word is
+    # also indexed on its own.
+    # Each key maps to how many times each category was used with it.
+    # The index is built from the transaction tables on first use, so a
+    # lookup is a few dict reads. Archived transactions are counted too,
+    # so archiving a year doesn't forget its history.
+    #
+    # Like `TransactCache`, the index follows `change_log`: before a
+    # lookup, the transactions changed since the last one are counted
+    # again. Only committed writes get a version, so every process sees
+    # every process's writes, and rolled back ones are never counted.
+    __rows = """
+            SELECT transactionid, categoryid, dscr FROM transact {0}
+            UNION ALL
+            SELECT transactionid, categoryid, dscr FROM transact_archive {0}
+        """
+    __changed = """
+            SELECT row_id
+            FROM change_log
+            WHERE table_name = 'transact'
+                AND version > %s AND version <= %s
+        """
+    __get_version = statement(
+        'transact.categorizer_version',
+        """
+            SELECT COALESCE(MAX(version), 0) as version
+            FROM change_log
+            WHERE table_name = 'transact'
+        """
+    )
+    __get_descriptions = statement('transact.categorizer_descriptions',
+                                   __rows.format(''))
+    __get_changed_ids = statement('transact.categorizer_changed_ids',
+                                  __changed)
+    __get_changed = statement(
+        'transact.categorizer_changed',
+        __rows.format(' '.join(['WHERE transactionid IN (', __changed, ')']))
+    )
+
+    _lock = Lock() # Held to read or change the index
+    _refresh_lock = Lock() # Held while the index is loaded or refreshed
+    _prefixes = None # prefix: Counter of categoryid
+    _words = None # word: Counter of categoryid
+    _rows = None # transactionid: (description, categoryid) counted
+    _version = 0 # Last change_log version counted
+
+    @staticmethod
+    def _keys(description):
+        # Returns: prefix, list of words
+        keys = words(description)
+        return ' '.join(keys[:2]), keys
+
+    @staticmethod
+    def _add(index, key, category_id, n):
+        counts = index.setdefault(key, Counter())
+        counts[category_id] += n
+        if counts[category_id] <= 0: # Keep only categories still used
+            del counts[category_id]
+            if not counts:
+                del index[key]
+
+    @classmethod
+    def _count(cls, prefixes, words, description, category_id, n):
+        prefix, keys = cls._keys(description)
+        if prefix:
+            cls._add(prefixes, prefix, category_id, n)
+        for key in set(keys):
+            cls._add(words, key, category_id, n)
+
+    @classmethod
+    def _load(cls):
+        # Build a new index and swap it in
+        #
+        # The index in use keeps answering while the new one loads. The
+        # version is read first, so a change that commits during the load
+        # is counted again by the next refresh (a row is always counted
+        # once, see `refresh()`).
+        version = db_fetchone(cls.__get_version)['version']
+        columns = db_fetchcolumns(cls.__get_descriptions)
+        prefixes, words, rows = {}, {}, {}
+        for transaction_id, category_id, description in zip(
+                columns['transactionid'], columns['categoryid'],
+                columns['dscr']):
+            cls._count(prefixes, words, description, category_id, 1)
+            rows[transaction_id] = (description, category_id)
+        with cls._lock:
+            cls._prefixes, cls._words, cls._rows = prefixes, words, rows
+            cls._version = version
+
+    @classmethod
+    def refresh(cls):
+        # Count the transactions added, edited, deleted or archived since
+        # the last refresh, loading the index on first use
+        #
+        # While another thread refreshes, the index is used as it is.
+        #
+        # O(k) (where k = transactions changed since the last refresh),
+        #     plus one indexed query when nothing changed
+        if not cls._refresh_lock.acquire(blocking=cls._rows is None):
+            return
+        try:
+            if cls._rows is None:
+                cls._load()
+                return
+            version = db_fetchone(cls.__get_version)['version']
+            if version == cls._version:
+                return
+            args = (cls._version, version)
+            changed_ids = db_fetchcolumns(cls.__get_changed_ids,
+                                          args)['row_id']
+            columns = db_fetchcolumns(cls.__get_changed, args * 2)
+            with cls._lock:
+                # Take back what each changed row counted, then count the
+                # rows that still exist as they are now
+                for transaction_id in set(changed_ids):
+                    old = cls._rows.pop(transaction_id, None)
+                    if old is not None:
+                        cls._count(cls._prefixes, cls._words, *old, -1)
+                for transaction_id, category_id, description in zip(
+                        columns['transactionid'], columns['categoryid'],
+                        columns['dscr']):
+                    cls._count(cls._prefixes, cls._words, description,
+                               category_id, 1)
+                    cls._rows[transaction_id] = (description, category_id)
+                cls._version = version
+        finally:
+            cls._refresh_lock.release()
+
+    @classmethod
+    def rebuild(cls, progress=lambda *args: None):
+        # Rebuild the index from the transaction tables
+        # Runs as the 'transact.rebuild_categorizer' job
+        # Returns: int (number of merchant prefixes)
+        with cls._refresh_lock:
+            cls._load()
+        return len(cls._prefixes)
+
+    @classmethod
+    def suggest(cls, description, refresh=True):
+        # Most likely category for a description
+        #
+        # A known merchant prefix decides on its own. Otherwise each
+        # word votes with its share of every category, so common words
+        # don't outvote rare, telling ones.
+        #
+        # :param refresh: bool (False: skip `refresh()`, after calling
+        #     it once for a batch of descriptions)
+        #
+        # Returns: (categoryid, confidence 0-1), or None when no word
+        #     has been seen
+        #
+        # O(w) (where w = words in the description)
+        if refresh or cls._rows is None:
+            cls.refresh()
+        prefix, words = cls._keys(description)
+        with cls._lock:
+            counts = cls._prefixes.get(prefix)
+            if counts:
+                category_id, n = counts.most_common(1)[0]
+                return category_id, n / counts.total()
+
+            votes = Counter()
+            for word in words:
+                counts = cls._words.get(word, Counter())
+                total = counts.total()
+                for category_id, n in counts.items():
+                    votes[category_id] += n / total
+        if not votes:
+            return None
+        category_id, score = votes.most_common(1)[0]
+        return category_id, score / votes.total()
@@ -0,0 +1,37 @@
+__all__ = ['normalize', 'words', 'merchant', 'fingerprint']
+
+from decimal import Decimal
+from hashlib import md5
+from re import compile
+
+_not_word = compile(r'[^a-z0-9]+')
+
+def normalize(description):
+    # Description as it is compared between transactions
+    # Lowercase, with punctuation and repeated spaces folded to one space
+    # (ex. 'AMZN Mktp  US*1A2B' -> 'amzn mktp us 1a2b')
+    return _not_word.sub(' ', description.lower()).strip()
+
+def words(description):
+    # Words of a normalized description without digits (store numbers
+    # and references change between visits)
+    return [i for i in normalize(description).split()
+            if len(i) > 1 and not any([c.isdigit() for c in i])]
+
+def merchant(description):
+    # First two words (ex. 'STARBUCKS #1234 SEATTLE' -> 'starbucks seattle')
+    return ' '.join(words(description)[:2])
+
+def fingerprint(account_id, amount, description):
+    # Hash of what makes two transactions the same bank line
+    #
+    # The date is left out so near duplicates can be found by looking
+    # the fingerprint up in a window of dates (see `TransactModel`).
+    #
+    # :param account_id: int
+    # :param amount: Decimal
+    # :param description: str
+    #
+    # Returns: str (32 hex characters)
+    key = f'{int(account_id)}|{Decimal(amount):.2f}|{normalize(description)}'
+    return md5(key.encode(), usedforsecurity=False).hexdigest()
@@ -0,0 +1,111 @@
+__all__ = ['TransactCache']
+
+from threading import Lock
+
+import numpy as np
+
+from utils.db import db_fetchcolumns, db_fetchone
+from utils.statements import statement
+
+class TransactCache:
+    # Columnar copy of the transaction table kept in this process
+    #
+    # Each column is a NumPy array ordered by transaction ID. Dates are
+    # day ordinals (`date.toordinal()`) and amounts are integer cents.
+    # After the first load, `refresh()` only re-reads the rows that
+    # `change_log` lists as added, edited, deleted or archived since the
+    # last refresh. Versions follow commit order (see `utils.db`), so a
+    # row that commits late is still picked up.
+    __columns = """
+            SELECT transactionid, accountid, categoryid,
+                TO_DAYS(transactiondate) - 365 as day,
+                CAST(amount * 100 AS SIGNED) as cents
+            FROM transact
+        """
+    __changed = """
+            SELECT row_id
+            FROM change_log
+            WHERE table_name = 'transact'
+                AND version > %s AND version <= %s
+        """
+    __get_version = statement(
+        'transact.cache_get_version',
+        """
+            SELECT COALESCE(MAX(version), 0) as version
+            FROM change_log
+            WHERE table_name = 'transact'
+        """
+    )
+    __get_all = statement('transact.cache_get_all', __columns,
+                          'ORDER BY transactionid')
+    __get_changed_ids = statement('transact.cache_get_changed_ids',
+                                  __changed)
+    __get_changed = statement('transact.cache_get_changed', __columns,
+                              'WHERE transactionid IN (', __changed, ')')
+
+    _dtypes = {'transactionid': np.int64, 'accountid': np.int64,
+               'categoryid': np.int64, 'day': np.int64, 'cents': np.int64}
+    _lock = Lock()
+    _data = None # Columns, once loaded
+    _version = 0 # Last change_log version applied
+
+    @classmethod
+    def _arrays(cls, columns):
+        return {name: np.asarray(columns[name], dtype)
+                for name, dtype in cls._dtypes.items()}
+
+    @classmethod
+    def refresh(cls):
+        # Bring the cache up to date with the database
+        #
+        # Returns: dict of columns (NumPy arrays, safe to keep using
+        #     after later refreshes)
+        #
+        # O(k log n) (where k = transactions changed since the last
+        #     refresh, and n = transactions)
+        with cls._lock:
+            # The version is read first, so a change that commits during
+            # the load is read again by the next refresh
+            version = db_fetchone(cls.__get_version)['version']
+            if cls._data is None:
+                cls._data = cls._arrays(db_fetchcolumns(cls.__get_all))
+                cls._version = version
+                return cls._data
+            if version == cls._version:
+                return cls._data
+
+            args = (cls._version, version)
+            changed_ids = db_fetchcolumns(cls.__get_changed_ids,
+                                          args)['row_id']
+            changed = cls._arrays(db_fetchcolumns(cls.__get_changed, args))
+            # Drop every changed row, then add back the ones that still
+            # exist
+            data = cls._data
+            keep = ~np.isin(data['transactionid'],
+                            np.asarray(changed_ids, dtype=np.int64))
+            data = {name: np.concatenate((data[name][keep], changed[name]))
+                    for name in data}
+            order = np.argsort(data['transactionid'], kind='stable')
+            cls._data = {name: column[order] for name, column in data.items()}
+            cls._version = version
+            return cls._data
+
+    @classmethod
+    def sum_by_category(cls, category_ids):
+        # Total of all transactions in any of `category_ids`, in cents
+        # O(n) (where n = transactions)
+        data = cls.refresh()
+        mask = np.isin(data['categoryid'],
+                       np.asarray(category_ids, dtype=np.int64))
+        return int(data['cents'][mask].sum())
+
+    @classmethod
+    def balances(cls):
+        # Balance of every account with transactions, in cents
+        # Returns: dict of accountid: int
+        # O(n) (where n = transactions)
+        data = cls.refresh()
+        ids, index = np.unique(data['accountid'], return_inverse=True)
+        totals = np.zeros(ids.size, dtype=np.int64)
+        np.add.at(totals, index, data['cents'])
+        return dict(zip(ids.tolist(), totals.tolist()))
@@ -1,10 +1,17 @@
 __all__ = ['TransactController']
 
+from csv import DictReader
 from decimal import Decimal
 from datetime import datetime
+from functools import partial
 
 # AcctController imported in dashboard()
+from app import app
 from category import CatController
+from utils.db import db_gather, db_transaction
+from .categorizer import Categorizer
+from .fingerprint import fingerprint
+from .transact_cache import TransactCache
 from .transact_model import TransactModel
 
 class TransactController:
@@ -18,6 +25,12 @@ class TransactController:
     def filter_category(categories):
         return TransactModel.filter_category(categories)
 
+    @staticmethod
+    def iter_filter_category(categories):
+        # Like `filter_category()`, but rows are read as they're used
+        # Raises AssertionError when too many categories are picked
+        return TransactModel.iter_filter_category(categories)
+
     @classmethod
     def get_transfers(cls):
         transfer_cat = CatController.get_category_by_name('Account Transfer')
@@ -33,39 +46,305 @@ class TransactController:
         return TransactModel.get_transaction(transaction_id)
 
     @staticmethod
-    def __check_date(transaction_date):
+    def __check_date(transaction_date, archived_through=None):
         # Ensures that `transaction_date` is not in the future
         # :param transaction_date: date
+        # :param archived_through: date | None (see
+        #     `TransactModel.get_archived_through()`)
         # Raises: AssertionError when `transaction_date` is in
-        #     the future.
-        dateObj = datetime.strptime(transaction_date, '%Y-%m-%d').date()
+        #     the future or in an archived year.
+        dateObj = datetime.strptime(str(transaction_date), '%Y-%m-%d').date()
         currentDate = datetime.today().date()
         assert dateObj <= currentDate, 'Date must not be in the future'
+        assert archived_through is None or dateObj > archived_through, \
+            f'{dateObj.year} is archived and can no longer be changed'
+
+    @staticmethod
+    def find_duplicates(transactions):
+        # Transactions that each transaction would duplicate
+        #
+        # A duplicate has the same account, amount and description (see
+        # `fingerprint()`) and a date within `DUPLICATE_WINDOW_DAYS`.
+        # Existing transactions, archived ones included, are looked up
+        # with one query. A transaction can also duplicate an earlier
+        # one of `transactions` that isn't a duplicate itself.
+        #
+        # :param transactions: list of dict (accountid, amount, 
+        #     transactiondate, dscr)
+        #
+        # Returns: list of dict or None (the closest existing 
+        #     transaction, or the earlier one of `transactions`, in the
+        #     same order as `transactions`)
+        #
+        # O(k log n) (where k = len(transactions), n = transactions 
+        #     already added)
+        window = app.config['DUPLICATE_WINDOW_DAYS']
+        keys = [(fingerprint(i['accountid'], i['amount'], i['dscr']), 
+                 datetime.strptime(str(i['transactiondate']), 
+                                   '%Y-%m-%d').date())
+                for i in transactions]
+        if not keys:
+            return []
+        matches = {}
+        for i in TransactModel.find_duplicates(sorted(set(keys)), window):
+            matches.setdefault(i['fingerprint'], []).append(i)
+
+        duplicates = []
+        for transaction, (key, date_) in zip(transactions, keys):
+            near = [i for i in matches.get(key, []) 
+                    if abs((i['transactiondate'] - date_).days) <= window]
+            duplicate = min(near, key=lambda i: abs(
+                (i['transactiondate'] - date_).days)) if near else None
+            if duplicate is None: # Later ones are checked against it
+                matches.setdefault(key, []).append(
+                    {**transaction, 'transactiondate': date_})
+            duplicates.append(duplicate)
+        return duplicates
+
+    @staticmethod
+    def __duplicate_message(duplicate):
+        if 'transactionid' not in duplicate: # Both are being added
+            return (f'Possible duplicate of another new transaction '
+                    f'({duplicate["transactiondate"]}, {duplicate["dscr"]})')
+        return (f'Possible duplicate of transaction '
+                f'{duplicate["transactionid"]} '
+                f'({duplicate["transactiondate"]}, {duplicate["dscr"]})')
 
     @classmethod
     def add_transaction(cls, account_id, category_id, amount, transaction_date,
-                        description):
+                        description, allow_duplicate=False):
         # Controller for adding a transaction to the database
         # :param account_id: int
         # :param category_id: int
         # :param amount: Decimal
         # :param transaction_date: date
         # :param description: str
+        # :param allow_duplicate: bool (add it even if it looks like a 
+        #     duplicate)
+        # A transaction without a category gets the one a rule gives it.
         # Raises AssertionError if:
+        #     no category is picked and no rule matches
         #     amount == 0
-        #     transaction date is in the future
-        cls.__check_date(transaction_date)
+        #     transaction date is in the future or an archived year
+        #     it duplicates a transaction (see `find_duplicates()`)
+        cls.__check_date(transaction_date,
+                         TransactModel.get_archived_through())
+        amount = Decimal(amount)
         assert amount != 0, 'amount must be nonzero'
-        return TransactModel.add_transaction(account_id, category_id, 
-                                             Decimal(amount),
-                                             transaction_date, description)
+        if not category_id:
+            from rule import RuleController
+            category_id = RuleController.match(account_id, amount, 
+                                               description)
+            assert category_id, 'Select a category (no rule matches)'
+        if not allow_duplicate:
+            duplicate = cls.find_duplicates([{
+                'accountid': account_id, 'amount': amount, 
+                'transactiondate': transaction_date, 'dscr': description
+            }])[0]
+            assert duplicate is None, cls.__duplicate_message(duplicate)
+        new_id = TransactModel.add_transaction(account_id, category_id, 
+                                               amount, transaction_date, 
+                                               description, 
+                                               fingerprint(account_id, amount,
+                                                           description))
+        return new_id
         
+    @classmethod
+    def add_transactions(cls, transactions, allow_duplicates=False):
+        # Controller for adding several transactions at once
+        # :param transactions: list of dict (accountid, categoryid, 
+        #     amount, transactiondate, dscr)
+        # :param allow_duplicates: bool
+        # Returns: list of int (the new IDs, in order)
+        # Raises AssertionError if, for any transaction:
+        #     amount == 0
+        #     transaction date is in the future or an archived year
+        #     it duplicates a transaction (see `find_duplicates()`)
+        archived_through = TransactModel.get_archived_through()
+        rows = []
+        for i in transactions:
+            cls.__check_date(i['transactiondate'], archived_through)
+            amount = Decimal(i['amount'])
+            assert amount != 0, 'amount must be nonzero'
+            rows.append((i['accountid'], i['categoryid'], amount, 
+                         i['transactiondate'], i['dscr'], 
+                         fingerprint(i['accountid'], amount, i['dscr'])))
+        if not allow_duplicates:
+            for duplicate in cls.find_duplicates(transactions):
+                assert duplicate is None, cls.__duplicate_message(duplicate)
+        return TransactModel.add_transactions(rows)
+
+    @staticmethod
+    def suggest_category(description, account_id=None, amount=None, 
+                         rules=None, refresh=True):
+        # Category to suggest for a new transaction
+        #
+        # A matching rule wins (confidence 1), then past transactions
+        # (see `Categorizer`).
+        #
+        # :param account_id: int (optional, rules are skipped without it)
+        # :param amount: Decimal (optional, rules are skipped without it)
+        # :param rules: RuleMatcher (default `RuleController.matcher()`,
+        #     pass one in when suggesting for many transactions)
+        # :param refresh: bool (False when suggesting for many 
+        #     transactions, after one `Categorizer.refresh()`)
+        #
+        # Returns: dict (categoryid, confidence, ruleid) or None
+        # O(w) (where w = words in the description)
+        if account_id and amount not in (None, ''):
+            from rule import RuleController
+            rules = rules or RuleController.matcher()
+            rule = rules.match(account_id, Decimal(amount), description)
+            if rule is not None:
+                return {'categoryid': rule['categoryid'], 'confidence': 1.0,
+                        'ruleid': rule['ruleid']}
+
+        suggestion = Categorizer.suggest(description, refresh)
+        if suggestion is None:
+            return None
+        category_id, confidence = suggestion
+        return {'categoryid': category_id, 'confidence': confidence, 
+                'ruleid': None}
+
+    @staticmethod
+    def get_descriptions(): return TransactModel.get_descriptions()
+
+    @staticmethod
+    def set_categories(categories): TransactModel.set_categories(categories)
+
+    @staticmethod
+    def read_statement(file):
+        # Read a bank statement CSV one line at a time
+        #
+        # The file needs `date`, `amount` and `description` columns (any
+        # case). Dates can be YYYY-MM-DD or MM/DD/YYYY, and amounts can
+        # have $ and thousands separators.
+        #
+        # :param file: text file object
+        #
+        # Yields: dict (transactiondate: date, amount: Decimal, dscr: str)
+        #
+        # Raises AssertionError when a column is missing or a date or
+        #     amount can't be read
+        reader = DictReader(file)
+        columns = {(name or '').strip().lower(): name 
+                   for name in reader.fieldnames or []}
+        for name in ('date', 'amount', 'description'):
+            assert name in columns, f'CSV needs a {name} column'
+
+        for line, row in enumerate(reader, start=2):
+            text = row[columns['date']].strip()
+            for format_ in ('%Y-%m-%d', '%m/%d/%Y'):
+                try:
+                    date_ = datetime.strptime(text, format_).date()
+                    break
+                except ValueError:
+                    date_ = None
+            assert date_ is not None, f'Line {line}: date {text} is not valid'
+            try:
+                amount = Decimal(row[columns['amount']].replace(',', '')
+                                 .replace('$', '').strip())
+            except ArithmeticError:
+                raise AssertionError(f'Line {line}: amount is not a number')
+            yield {'transactiondate': date_, 'amount': amount, 
+                   'dscr': row[columns['description']].strip()[:50]}
+
+    @classmethod
+    def import_csv(cls, account_id, category_id, file, 
+                   allow_duplicates=False, auto_categorize=False, 
+                   chunk_size=1000):
+        # Import a bank statement into one account
+        #
+        # The file is read by `read_statement()`. Rows that duplicate a
+        # transaction are skipped unless `allow_duplicates`.
+        # Rows are checked and added `chunk_size` at a time, all in one
+        # database transaction.
+        #
+        # :param account_id: int
+        # :param category_id: int (used for every row, or for rows
+        #     without a confident suggestion when `auto_categorize`)
+        # :param file: text file object
+        # :param allow_duplicates: bool
+        # :param auto_categorize: bool (use `suggest_category()`, with
+        #     rules, when its confidence is at least
+        #     `AUTO_CATEGORY_CONFIDENCE`)
+        # :param chunk_size: int
+        #
+        # Returns: added, skipped (list of dict)
+        #
+        # Raises AssertionError if:
+        #     the file can't be read (see `read_statement()`)
+        #     any row fails `add_transactions()`
+        if auto_categorize:
+            from rule import RuleController
+            rules = RuleController.matcher()
+            Categorizer.refresh()
+        transactions = []
+        for line in cls.read_statement(file):
+            row_category = category_id
+            if auto_categorize:
+                suggestion = cls.suggest_category(line['dscr'], account_id,
+                                                  line['amount'], rules,
+                                                  refresh=False)
+                if suggestion and (suggestion['confidence'] 
+                        >= app.config['AUTO_CATEGORY_CONFIDENCE']):
+                    row_category = suggestion['categoryid']
+            transactions.append({
+                'accountid': account_id, 'categoryid': row_category, 
+                'amount': line['amount'], 
+                'transactiondate': line['transactiondate'].isoformat(), 
+                'dscr': line['dscr']
+            })
+
+        added = []
+        skipped = []
+        with db_transaction():
+            for start in range(0, len(transactions), chunk_size):
+                chunk = transactions[start:start + chunk_size]
+                if not allow_duplicates:
+                    duplicates = cls.find_duplicates(chunk)
+                    skipped.extend([i for i, duplicate 
+                                    in zip(chunk, duplicates) if duplicate])
+                    chunk = [i for i, duplicate in zip(chunk, duplicates) 
+                             if duplicate is None]
+                if chunk:
+                    cls.add_transactions(chunk, allow_duplicates=True)
+                    added.extend(chunk)
+        return added, skipped
+
+    @classmethod
+    def backfill_fingerprints(cls, progress=lambda *args: None, 
+                              batch_size=1000):
+        # Fingerprint transactions added before fingerprints existed
+        # Runs as the 'transact.backfill_fingerprints' job
+        # Returns: int (number of transactions fingerprinted)
+        total = TransactModel.count_unfingerprinted()
+        done = 0
+        while True:
+            rows = TransactModel.get_unfingerprinted(batch_size)
+            if not rows:
+                return done
+            TransactModel.set_fingerprints([
+                (fingerprint(i['accountid'], i['amount'], i['dscr']), 
+                 i['transactionid']) for i in rows
+            ])
+            done += len(rows)
+            progress(min(done * 100 // max(total, 1), 99), 
+                     f'{done} of {total}')
+
     @classmethod
     def edit_transaction(cls, account_id, category_id, amount, 
                          transaction_date, description, transaction_id):
-        cls.__check_date(transaction_date)
-        return TransactModel.edit_transaction(account_id, category_id, amount, 
-                                              transaction_date, description, 
+        cls.__check_date(transaction_date,
+                         TransactModel.get_archived_through())
+        old = cls.get_transaction(transaction_id)
+        # Archived transactions aren't in `transact`
+        assert old is not None, 'Transaction not found or archived'
+        return TransactModel.edit_transaction(account_id, category_id, 
+                                              Decimal(amount), 
+                                              transaction_date, description,
+                                              fingerprint(account_id, amount,
+                                                          description),
                                               transaction_id)
         
     @staticmethod
@@ -82,10 +361,39 @@ class TransactController:
         )
         return accounts, recent_transactions
     
+    @classmethod
+    async def dashboard_async(cls, limit):
+        # `dashboard()` with its independent queries run at the same time
+        from account import AcctController
+        # The balances are one grouped query (see `get_account_balances()`)
+        return tuple(await db_gather(
+            AcctController.accounts,
+            partial(TransactModel.get_transactions, limit, 
+                    return_total=False)
+        ))
+
     @staticmethod
     def get_account_balance(account_id):
         return TransactModel.get_account_balance(account_id)
+
+    @classmethod
+    def get_account_balances(cls, account_ids):
+        # Balances for several accounts
+        # :param account_ids: list of int
+        # Returns: dict of accountid: Decimal
+        # O(n) (where n = transactions), one query either way
+        if app.config['TRANSACT_CACHE']:
+            # The cache only has the open years
+            cents = TransactCache.balances()
+            opening = TransactModel.get_opening_balances()
+            return {i: Decimal(cents.get(i, 0)).scaleb(-2) + opening.get(i, 0)
+                    for i in account_ids}
+        return TransactModel.get_account_balances(account_ids)
     
+    @staticmethod
+    def get_ledger(account_id, per_page, offset):
+        return TransactModel.get_ledger(account_id, per_page, offset)
+
     @classmethod
     def delete(cls, id):
         try:
@@ -97,6 +405,10 @@ class TransactController:
     @classmethod
     def sum_transacts_from_cat(cls, category_name):
         category = CatController.get_category_by_name(category_name)['categoryid']
+        if app.config['TRANSACT_CACHE']:
+            return (Decimal(TransactCache.sum_by_category([category]))
+                    .scaleb(-2)
+                    + TransactModel.get_archived_category_total([category]))
         transactions = cls.filter_category((category,))
         total = sum([i['amount'] for i in transactions])
         return total
\ No newline at end of file
@@ -1,115 +1,615 @@
-from utils.db import db_fetchone, db_fetchall, db_commit, join
+from json import dumps
+
+from utils.db import (db_fetchone, db_fetchall, db_commit, db_commit_many, 
+                      db_fetchcolumns, db_fetchiter, db_transaction, join)
+from utils.statements import statement
 
 class TransactModel:
     __base = """
-            SELECT t.*, a.accountname, c.categoryname 
+            SELECT t.*, a.accountname, c.categoryname
             FROM transact t
             JOIN acct a ON t.accountid = a.accountid
             JOIN category c ON t.Categoryid = c.Categoryid
         """
     __order = 'ORDER BY t.transactiondate DESC, t.transactionid DESC'
     __where_id = 'WHERE transactionid = %s'
-    
+    __search = 'WHERE t.dscr like %s'
+    __limit = 'LIMIT %s OFFSET %s'
+    __total = 'SELECT COUNT(*) as total FROM transact t'
+    __update = 'UPDATE transact'
+    # Closed years are moved to `transact_archive` (see `ArchiveController`)
+    # and are all older than the transactions left in `transact`
+    __archive_base = __base.replace('FROM transact t',
+                                    'FROM transact_archive t')
+
+    __get_page_search = statement('transact.get_transactions_page_search',
+                                  __base, __search, __order, __limit)
+    __get_page = statement('transact.get_transactions_page',
+                           __base, __order, __limit)
+    __get_search = statement('transact.get_transactions_search',
+                             __base, __search, __order)
+    __get_all = statement('transact.get_transactions', __base, __order)
+    __get_archive_page = statement('transact.get_archive_page',
+                                   __archive_base, __order, __limit)
+    __union_search = join('SELECT * FROM (', __base, __search, 'UNION ALL',
+                          __archive_base, __search, ') t')
+    __get_union_page_search = statement(
+        'transact.get_union_page_search', __union_search, __order, __limit
+    )
+    __get_union_search = statement('transact.get_union_search',
+                                   __union_search, __order)
+    __get_union = statement(
+        'transact.get_union',
+        'SELECT * FROM (', __base, 'UNION ALL', __archive_base, ') t',
+        __order
+    )
+    __get_union_total_search = statement(
+        'transact.get_union_total_search',
+        'SELECT (', __total, __search, ') + (',
+        'SELECT COUNT(*) FROM transact_archive t', __search, ') as total'
+    )
+    __get_archived = statement(
+        'transact.get_archived',
+        """
+            SELECT COALESCE(SUM(transactions), 0) as transactions
+            FROM opening_balance
+        """
+    )
+    __get_archived_through = statement(
+        'transact.get_archived_through',
+        'SELECT MAX(through_date) as through_date FROM archive'
+    )
+    __get_opening_balance = statement(
+        'transact.get_opening_balance',
+        'SELECT * FROM opening_balance WHERE accountid = %s'
+    )
+    __get_opening_balances = statement('transact.get_opening_balances',
+                                       'SELECT * FROM opening_balance')
+    __get_total = statement('transact.get_total', __total)
+    __get_total_search = statement('transact.get_total_search',
+                                   __total, __search)
+    # Categories are passed as one JSON array so the statement doesn't
+    # change with the number of categories. Joining them keeps the
+    # categoryid index in use.
+    __categories_in = """
+            JSON_TABLE(%s, '$[*]' COLUMNS (categoryid INT PATH '$')) k
+        """
+    __in_categories = join('JOIN', __categories_in,
+                           'ON k.categoryid = t.categoryid')
+    __filter_category = statement('transact.filter_category',
+                                  'SELECT * FROM (',
+                                  __base, __in_categories, 'UNION ALL',
+                                  __archive_base, __in_categories, ') t',
+                                  __order)
+    __get_archived_category_total = statement(
+        'transact.get_archived_category_total',
+        'SELECT COALESCE(SUM(t.amount), 0) as total FROM', __categories_in,
+        'JOIN transact_archive t ON t.categoryid = k.categoryid'
+    )
+    __get_transaction = statement('transact.get_transaction',
+                                  'SELECT * FROM transact', __where_id)
+    __add_transaction = statement(
+        'transact.add_transaction',
+        """
+            INSERT INTO transact (accountid, categoryid, amount,
+                transactiondate, dscr, fingerprint)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """
+    )
+    __set_account = statement('transact.set_accountid',
+                              __update, 'SET accountid = %s', __where_id)
+    __set_category = statement('transact.set_categoryid',
+                               __update, 'SET categoryid = %s', __where_id)
+    __set_dscr = statement('transact.set_dscr',
+                           __update, 'SET dscr = %s', __where_id)
+    __set_date = statement('transact.set_transactiondate',
+                           __update, 'SET transactiondate = %s', __where_id)
+    __set_amount = statement('transact.set_amount',
+                             __update, 'SET amount = %s', __where_id)
+    __set_fingerprint = statement('transact.set_fingerprint',
+                                  __update, 'SET fingerprint = %s', __where_id)
+    # Transactions with any of the fingerprints within `window` days of
+    # its date, archived ones included. Keys are one JSON array of
+    # [fingerprint, date] pairs so a whole import is checked with one
+    # indexed lookup per key in each table.
+    __duplicates_in = """
+            SELECT t.transactionid, t.accountid, t.categoryid, t.amount,
+                t.transactiondate, t.dscr, t.fingerprint
+            FROM JSON_TABLE(%s, '$[*]' COLUMNS (
+                fingerprint CHAR(32) PATH '$[0]',
+                day DATE PATH '$[1]'
+            )) k
+            JOIN {} t ON t.fingerprint = k.fingerprint
+                AND t.transactiondate BETWEEN k.day - INTERVAL %s DAY
+                    AND k.day + INTERVAL %s DAY
+        """
+    __find_duplicates = statement(
+        'transact.find_duplicates',
+        __duplicates_in.format('transact'), 'UNION',
+        __duplicates_in.format('transact_archive'),
+        'ORDER BY transactiondate, transactionid'
+    )
+    __get_unfingerprinted = statement(
+        'transact.get_unfingerprinted',
+        """
+            SELECT transactionid, accountid, amount, dscr
+            FROM transact
+            WHERE fingerprint IS NULL
+            LIMIT %s
+        """
+    )
+    __count_unfingerprinted = statement(
+        'transact.count_unfingerprinted',
+        __total, 'WHERE t.fingerprint IS NULL'
+    )
+    __get_balance = statement(
+        'transact.get_account_balance',
+        """
+            SELECT COALESCE(SUM(amount), 0) + COALESCE((
+                SELECT balance FROM opening_balance WHERE accountid = %s
+            ), 0) as balance
+            FROM transact
+            WHERE accountid = %s
+        """
+    )
+    # Every account in one pass, grouped by the accountid index
+    __get_balances = statement(
+        'transact.get_account_balances',
+        """
+            SELECT k.accountid,
+                COALESCE(t.total, 0) + COALESCE(o.balance, 0) as balance
+            FROM JSON_TABLE(%s, '$[*]' COLUMNS (accountid INT PATH '$')) k
+            LEFT JOIN (
+                SELECT accountid, SUM(amount) as total
+                FROM transact
+                GROUP BY accountid
+            ) t ON t.accountid = k.accountid
+            LEFT JOIN opening_balance o ON o.accountid = k.accountid
+        """
+    )
+    # The running balance is computed by the window before the page is
+    # cut, so any page is one pass over the account's rows. It starts
+    # from the account's opening balance, or from zero when the archived
+    # transactions are read too.
+    __running_balance = """
+            SELECT t.*, %s + SUM(t.amount) OVER (
+                ORDER BY t.transactiondate, t.transactionid
+            ) as running_balance
+            FROM (
+        """
+    __where_account = 'WHERE t.accountid = %s'
+    __get_ledger = statement(
+        'transact.get_ledger',
+        __running_balance, __base, __where_account, ') t', __order, __limit
+    )
+    __get_union_ledger = statement(
+        'transact.get_union_ledger',
+        __running_balance, __base, __where_account, 'UNION ALL',
+        __archive_base, __where_account, ') t', __order, __limit
+    )
+    __get_ledger_total = statement('transact.get_ledger_total',
+                                   __total, 'WHERE t.accountid = %s')
+    # `acct_balance` holds each account's closing balance on every day
+    # it has transactions. A write adds its amount to the closing
+    # balances from its date onward, so reads only need the latest row.
+    __add_balance_day = statement(
+        'transact.add_balance_day',
+        """
+            INSERT INTO acct_balance (accountid, balance_date, balance)
+            SELECT %s, %s, COALESCE((
+                SELECT b.balance
+                FROM acct_balance b
+                WHERE b.accountid = %s AND b.balance_date < %s
+                ORDER BY b.balance_date DESC
+                LIMIT 1
+            ), 0)
+            ON DUPLICATE KEY UPDATE balance = acct_balance.balance
+        """
+    )
+    __shift_balance = statement(
+        'transact.shift_balance',
+        """
+            UPDATE acct_balance
+            SET balance = balance + %s
+            WHERE accountid = %s AND balance_date >= %s
+        """
+    )
+    __unshift_balance = statement(
+        'transact.unshift_balance',
+        """
+            UPDATE acct_balance b
+            JOIN transact t ON b.accountid = t.accountid
+                AND b.balance_date >= t.transactiondate
+            SET b.balance = b.balance - t.amount
+            WHERE t.transactionid = %s
+        """
+    )
+    # Batched inserts keep the balance index up to date with two
+    # set-based statements over the new IDs, passed as one JSON array
+    #
+    # A multi-row INSERT only gets consecutive IDs when
+    # innodb_autoinc_lock_mode is 0 or 1. With 2 (MySQL 8's default),
+    # other inserts can take IDs in between, so rows are inserted one at
+    # a time instead (see `add_transactions()`).
+    __get_autoinc_lock_mode = statement(
+        'transact.get_autoinc_lock_mode',
+        'SELECT @@innodb_autoinc_lock_mode as lock_mode'
+    )
+    _consecutive_ids = None # Lock mode is 0 or 1 (read on first use)
+    __new_ids = """
+            JSON_TABLE(%s, '$[*]' COLUMNS (transactionid INT PATH '$')) n
+            JOIN transact t ON t.transactionid = n.transactionid
+        """
+    __add_transactions = statement(
+        'transact.add_transactions',
+        """
+            INSERT INTO transact (accountid, categoryid, amount,
+                transactiondate, dscr, fingerprint)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """,
+        prepared=False
+    )
+    __add_balance_days_ids = statement(
+        'transact.add_balance_days_ids',
+        """
+            INSERT INTO acct_balance (accountid, balance_date, balance)
+            SELECT t.accountid, t.transactiondate, COALESCE((
+                SELECT b.balance
+                FROM acct_balance b
+                WHERE b.accountid = t.accountid
+                    AND b.balance_date < t.transactiondate
+                ORDER BY b.balance_date DESC
+                LIMIT 1
+            ), 0)
+            FROM
+        """,
+        __new_ids,
+        """
+            GROUP BY t.accountid, t.transactiondate
+            ON DUPLICATE KEY UPDATE balance = acct_balance.balance
+        """
+    )
+    __shift_balance_ids = statement(
+        'transact.shift_balance_ids',
+        """
+            UPDATE acct_balance b
+            SET b.balance = b.balance + COALESCE((
+                SELECT SUM(t.amount)
+                FROM
+        """,
+        __new_ids,
+        """
+                WHERE t.accountid = b.accountid
+                    AND t.transactiondate <= b.balance_date
+            ), 0)
+            WHERE b.accountid IN (SELECT t.accountid FROM
+        """,
+        __new_ids,
+        ')'
+    )
+    __log_change = statement(
+        'transact.log_change',
+        """
+            INSERT INTO change_log (table_name, row_id, op)
+            VALUES ('transact', %s, %s)
+        """
+    )
+    __log_changes = statement(
+        'transact.log_changes',
+        """
+            INSERT INTO change_log (table_name, row_id, op)
+            VALUES ('transact', %s, %s)
+        """,
+        prepared=False
+    )
+    __log_ids = statement(
+        'transact.log_ids',
+        """
+            INSERT INTO change_log (table_name, row_id, op)
+            SELECT 'transact', t.transactionid, 'add' FROM
+        """,
+        __new_ids
+    )
+    __get_descriptions = statement(
+        'transact.get_descriptions',
+        """
+            SELECT transactionid, accountid, categoryid, amount, dscr
+            FROM transact
+            ORDER BY transactionid
+        """
+    )
+    # New categories are one JSON array of [transactionid, categoryid]
+    # pairs, so any number of rows is one statement
+    __categories = """
+            JSON_TABLE(%s, '$[*]' COLUMNS (
+                transactionid INT PATH '$[0]',
+                categoryid INT PATH '$[1]'
+            )) j
+        """
+    __set_categories = statement(
+        'transact.set_categories',
+        'UPDATE transact t JOIN', __categories,
+        """
+            ON t.transactionid = j.transactionid
+            SET t.categoryid = j.categoryid
+        """
+    )
+    __log_categories = statement(
+        'transact.log_categories',
+        """
+            INSERT INTO change_log (table_name, row_id, op)
+            SELECT 'transact', j.transactionid, 'edit' FROM
+        """,
+        __categories
+    )
+    __delete = statement('transact.delete',
+                         'DELETE FROM transact', __where_id)
+
     @classmethod
-    def get_transactions(cls, per_page=None, offset=0, 
+    def get_transactions(cls, per_page=None, offset=0,
                          search_query=None, return_total=True):
-        # order = 'ORDER BY t.transactiondate DESC, t.transactionid DESC'
-        search = 'WHERE t.dscr like %s'
-        limit = 'LIMIT %s OFFSET %s'
-        if all([per_page is not None, 
-                offset is not None, 
+        # Archived transactions come after every other one, so a page
+        # only reads `transact_archive` once it goes past the open years.
+        # Searches read both tables.
+        archived = cls.get_archived_count()
+        search = None if search_query is None else f'%{search_query}%'
+        count = None # Transactions in the open years, once counted
+        if all([per_page is not None,
+                offset is not None,
                 search_query is not None
                 ]):
-            transactions = db_fetchall(join(
-                cls.__base, 
-                search, 
-                cls.__order, 
-                limit
-            ), (f'%{search_query}%', per_page, offset))
+            if archived:
+                transactions = db_fetchall(cls.__get_union_page_search,
+                                           (search, search, per_page, offset))
+            else:
+                transactions = db_fetchall(cls.__get_page_search,
+                                           (search, per_page, offset))
         elif per_page is not None and offset is not None:
-            transactions = db_fetchall(join(cls.__base, 
-                                            cls.__order, 
-                                            limit
-                                            ), (per_page, offset))
+            transactions = db_fetchall(cls.__get_page, (per_page, offset))
+            if archived and len(transactions) < per_page:
+                # Continue into the archive where the open years end
+                if transactions:
+                    archive_offset = 0
+                else:
+                    count = cls.__count()
+                    archive_offset = offset - count
+                transactions += db_fetchall(
+                    cls.__get_archive_page,
+                    (per_page - len(transactions), max(archive_offset, 0))
+                )
         elif search_query is not None:
-            transactions = db_fetchall(join(cls.__base, 
-                                            search, 
-                                            cls.__order
-                                            ), (f'%{search_query}%',))
+            if archived:
+                transactions = db_fetchall(cls.__get_union_search,
+                                           (search, search))
+            else:
+                transactions = db_fetchall(cls.__get_search, (search,))
         else:
-            transactions = db_fetchall(join(cls.__base, cls.__order))
+            transactions = db_fetchall(cls.__get_union if archived
+                                       else cls.__get_all)
 
         if return_total is True: # Get total count for pagination
-            total_query = 'SELECT COUNT(*) as total FROM transact t'
             if search_query is None:
-                total = db_fetchone(total_query)['total']
+                total = (cls.__count() if count is None else count) + archived
+            elif archived:
+                total = db_fetchone(cls.__get_union_total_search,
+                                    (search, search))['total']
             else:
-                total = db_fetchone(join(total_query, search), 
-                                    (search_query,))['total']
+                total = db_fetchone(cls.__get_total_search,
+                                    (search,))['total']
             return transactions, total
         else:
             return transactions
-        
+
+    @classmethod
+    def __count(cls): return db_fetchone(cls.__get_total)['total']
+
+    @classmethod
+    def get_archived_count(cls):
+        # Number of archived transactions
+        # O(a) (where a = accounts)
+        return int(db_fetchone(cls.__get_archived)['transactions'])
+
+    @classmethod
+    def get_archived_through(cls):
+        # Returns: date or None (the last archived day)
+        return db_fetchone(cls.__get_archived_through)['through_date']
+
+    @classmethod
+    def get_opening_balances(cls):
+        # Returns: dict of accountid: Decimal (total of archived
+        #     transactions)
+        return {i['accountid']: i['balance']
+                for i in db_fetchall(cls.__get_opening_balances)}
+
+    @classmethod
+    def get_archived_category_total(cls, categories):
+        # Total of archived transactions in any of `categories`
+        return db_fetchone(cls.__get_archived_category_total,
+                           (cls.__category_list(categories),))['total']
+
     @classmethod
     def filter_category(cls, categories):
+        return db_fetchall(cls.__filter_category,
+                           cls.__category_args(categories))
+
+    @classmethod
+    def iter_filter_category(cls, categories):
+        # `filter_category()` read from the database as it's looped over
+        # Yields: dict
+        return db_fetchiter(cls.__filter_category,
+                            cls.__category_args(categories))
+
+    @classmethod
+    def __category_args(cls, categories):
         len_ = len(categories)
         assert len_ < 50, "Too many categories selected"
-        placeholders = ','.join(['%s'] * len_)
-        query = join(
-            cls.__base, 
-            f'WHERE c.categoryid IN ({placeholders})', 
-            cls.__order
-        )
-        return db_fetchall(query, categories)
+        categories = cls.__category_list(categories)
+        return categories, categories
+
+    @staticmethod
+    def __category_list(categories):
+        # Returns: str (JSON array of the distinct IDs)
+        return dumps(sorted({int(i) for i in categories}))
 
     @classmethod
     def get_transaction(cls, transaction_id):
-        return db_fetchone(join(
-            'SELECT * FROM transact', cls.__where_id
-        ), [transaction_id])
+        return db_fetchone(cls.__get_transaction, [transaction_id])
 
-    @staticmethod
-    def add_transaction(account_id, category_id, amount, date_, 
-                        description):
-        return db_commit(
-            """
-                INSERT INTO transact (accountid, categoryid, amount, 
-                    transactiondate, dscr) 
-                VALUES (%s, %s, %s, %s, %s)
-            """, 
-            (account_id, category_id, amount, date_, description)
+    @classmethod
+    def _add_to_balance(cls, account_id, amount, date_):
+        # Queries and arguments for `db_commit()` that add `amount` to
+        # the balance index from `date_` onward
+        return (
+            cls.__add_balance_day, (account_id, date_, account_id, date_),
+            cls.__shift_balance, (amount, account_id, date_)
         )
 
+    @classmethod
+    def add_transaction(cls, account_id, category_id, amount, date_,
+                        description, fingerprint):
+        # The insert goes last so `db_commit()` returns its id
+        with db_transaction():
+            transaction_id = db_commit(
+                *cls._add_to_balance(account_id, amount, date_),
+                cls.__add_transaction,
+                (account_id, category_id, amount, date_, description, 
+                 fingerprint)
+            )
+            db_commit(cls.__log_change, (transaction_id, 'add'),
+                      return_id=False)
+        return transaction_id
+
+    @classmethod
+    def add_transactions(cls, transactions):
+        # Add several transactions in one transaction
+        # :param transactions: list of tuple (account_id, category_id,
+        #     amount, date_, description, fingerprint)
+        # Returns: list of int (the new IDs, in order)
+        with db_transaction():
+            if cls._consecutive_ids is None:
+                cls._consecutive_ids = db_fetchone(
+                    cls.__get_autoinc_lock_mode)['lock_mode'] in (0, 1)
+            if cls._consecutive_ids:
+                first_id = db_commit_many(cls.__add_transactions,
+                                          transactions)
+                ids = list(range(first_id, first_id + len(transactions)))
+            else:
+                ids = [db_commit(cls.__add_transaction, i)
+                       for i in transactions]
+            new_ids = dumps(ids)
+            db_commit(
+                cls.__add_balance_days_ids, (new_ids,),
+                cls.__shift_balance_ids, (new_ids, new_ids),
+                cls.__log_ids, (new_ids,),
+                return_id=False
+            )
+        return ids
+
     @classmethod
     def edit_transaction(cls, account_id, category_id, amount, date_,
-                         dscr, id):
-        update = 'UPDATE transact'
+                         dscr, fingerprint, id):
         return db_commit(
-            join(update, 'SET accountid = %s', cls.__where_id), 
-            (account_id, id),
-            join(update, 'SET categoryid = %s', cls.__where_id), 
-            (category_id, id),
-            join(update, 'SET dscr = %s', cls.__where_id), 
-            (dscr, id),
-            join(update, 'SET transactiondate = %s', cls.__where_id), 
-            (date_, id),
-            join(update, 'SET amount = %s', cls.__where_id), 
-            (amount, id)
+            cls.__unshift_balance, (id,),
+            cls.__set_account, (account_id, id),
+            cls.__set_category, (category_id, id),
+            cls.__set_dscr, (dscr, id),
+            cls.__set_date, (date_, id),
+            cls.__set_amount, (amount, id),
+            cls.__set_fingerprint, (fingerprint, id),
+            *cls._add_to_balance(account_id, amount, date_),
+            cls.__log_change, (id, 'edit')
         )
-    
-    @staticmethod
-    def get_account_balance(account_id):
+
+    @classmethod
+    def find_duplicates(cls, keys, window):
+        # Transactions matching any key within `window` days, archived
+        #     ones included
+        # :param keys: list of tuple (fingerprint, date)
+        # :param window: int (days)
+        # Returns: list of dict (transactions, ordered by date)
+        # O(k log n) (where k = len(keys), n = transactions)
+        keys = dumps([[fingerprint, str(date_)] for fingerprint, date_ in keys])
+        return db_fetchall(cls.__find_duplicates,
+                           (keys, window, window) * 2)
+
+    @classmethod
+    def get_unfingerprinted(cls, limit):
+        # Transactions added before fingerprints, `limit` at a time
+        return db_fetchall(cls.__get_unfingerprinted, (limit,))
+
+    @classmethod
+    def count_unfingerprinted(cls):
+        return db_fetchone(cls.__count_unfingerprinted)['total']
+
+    @classmethod
+    def set_fingerprints(cls, fingerprints):
+        # :param fingerprints: list of tuple (fingerprint, transactionid)
+        with db_transaction():
+            db_commit_many(cls.__set_fingerprint, fingerprints)
+            db_commit_many(cls.__log_changes,
+                           [(id, 'edit') for _, id in fingerprints])
+
+    @classmethod
+    def get_descriptions(cls):
+        # Every transaction's account, category, amount and description
+        # Only transactions that aren't archived, since rules can't
+        #     change archived ones (`Categorizer` reads both tables)
+        # Returns: dict of columns
+        return db_fetchcolumns(cls.__get_descriptions)
+
+    @classmethod
+    def set_categories(cls, categories):
+        # Change the category of many transactions at once
+        # :param categories: list of tuple (transactionid, categoryid)
+        categories = dumps([[int(i), int(c)] for i, c in categories])
+        db_commit(cls.__set_categories, (categories,),
+                  cls.__log_categories, (categories,), return_id=False)
+
+    @classmethod
+    def get_account_balance(cls, account_id):
         # Calculate account balance using transaction table
-        result = db_fetchone("""
-                             SELECT COALESCE(SUM(amount), 0) as balance
-                             FROM transact
-                             WHERE accountid = %s
-                             """, (account_id,))['balance'] 
+        result = db_fetchone(cls.__get_balance,
+                             (account_id, account_id))['balance']
         # db_fetchone() returns dict with only key 'balance'
 
         return result
-    
+
+    @classmethod
+    def get_account_balances(cls, account_ids):
+        # Returns: dict of accountid: Decimal
+        if not account_ids:
+            return {}
+        account_ids = dumps(sorted({int(i) for i in account_ids}))
+        return {i['accountid']: i['balance']
+                for i in db_fetchall(cls.__get_balances, (account_ids,))}
+
+    @classmethod
+    def get_ledger(cls, account_id, per_page, offset):
+        # Transactions for one account with a running balance
+        # Ordered like `get_transactions()` (newest first)
+        # Pages within the open years start from the opening balance
+        # instead of reading the account's archived transactions.
+        # Returns: transactions, total
+        total = db_fetchone(cls.__get_ledger_total, (account_id,))['total']
+        opening = db_fetchone(cls.__get_opening_balance, (account_id,))
+        if opening is None:
+            transactions = db_fetchall(cls.__get_ledger,
+                                       (0, account_id, per_page, offset))
+        elif offset + per_page <= total:
+            transactions = db_fetchall(cls.__get_ledger,
+                                       (opening['balance'], account_id,
+                                        per_page, offset))
+        else:
+            transactions = db_fetchall(cls.__get_union_ledger,
+                                       (0, account_id, account_id, per_page,
+                                        offset))
+        if opening is not None:
+            total += opening['transactions']
+        return transactions, total
+
     @classmethod
     def delete(cls, id):
-        return db_commit(join('DELETE FROM transact', cls.__where_id), (id,), 
-                         return_was_affected=True, return_id=False)
\ No newline at end of file
+        return db_commit(cls.__unshift_balance, (id,),
+                         cls.__log_change, (id, 'delete'),
+                         cls.__delete, (id,),
+                         return_was_affected=True, return_id=False)
@@ -1,10 +1,12 @@
 from datetime import datetime
+from io import TextIOWrapper
 
-from flask import Blueprint, render_template, request
+from flask import Blueprint, flash, jsonify, render_template, request
 
 from account import AcctController
 from category import CatController
 from utils.message import log_error, log_success, header_action, Model, Action
+from utils.streaming import peek, stream_page
 from .transact_controller import TransactController
 
 transact_bp = Blueprint('transact', __name__)
@@ -12,15 +14,17 @@ transact_bp = Blueprint('transact', __name__)
 @transact_bp.route('/')
 @log_error(pg_template='dashboard.html', accounts=[], recent_transactions=[],
            action=Action.read)
-def dashboard():
+async def dashboard():
     """
     Load the main dashboard showing accounts and recent transactions.
     
     This function takes no arguments and returns the rendered template 
     showing a simplified view of all accounts and recent transactions.
+    The accounts and transactions are loaded at the same time.
     """
     limit = 10 # limit the recent transactions
-    accounts, recent_transactions = TransactController.dashboard(limit)
+    accounts, recent_transactions = await TransactController.dashboard_async(
+        limit)
     return render_template('dashboard.html', accounts=accounts, 
                            recent_transactions=recent_transactions)
 
@@ -72,6 +76,8 @@ def add_transaction():
     amount: Decimal
     transactiondate: date
     dscr: str
+    allow_duplicate: 'on' (optional, add it even if it looks like a 
+        duplicate)
 
     Returns:
     Error: str (HTML)
@@ -85,6 +91,8 @@ def add_transaction():
             (see `TransactController.check_date()`)
         AssertionError when amount == 0
             (see `TransactController.add_transaction()`)
+        AssertionError when it duplicates a transaction
+            (see `TransactController.find_duplicates()`)
     """
     if request.method == 'POST':
         account_id = request.form['accountid']
@@ -92,8 +100,10 @@ def add_transaction():
         amount = request.form['amount']
         transaction_date = request.form['transactiondate']
         dscr = request.form['dscr']
+        allow_duplicate = request.form.get('allow_duplicate') == 'on'
         TransactController.add_transaction(account_id, category_id, amount, 
-                                            transaction_date, dscr)
+                                            transaction_date, dscr, 
+                                            allow_duplicate)
         return log_success(Model.transact, Action.add)
     else:
         accounts = AcctController.accounts(balance=False)
@@ -102,6 +112,72 @@ def add_transaction():
                                 accounts=accounts, categories=categories, 
                                 datetime=datetime, mode=header_action(Action.add))
     
+@transact_bp.route('/transactions/suggest')
+def suggest_category():
+    """
+    Suggest a category for a description as JSON.
+
+    GET request parameters:
+    dscr: str
+    accountid: int (optional, needed for rules)
+    amount: Decimal (optional, needed for rules)
+
+    Returns: {categoryid, confidence, ruleid} or {} when nothing matches
+    """
+    try:
+        dscr = request.args.get('dscr', '', type=str)
+        suggestion = TransactController.suggest_category(
+            dscr, request.args.get('accountid', None, type=int), 
+            request.args.get('amount', None, type=str)
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify(suggestion or {})
+
+@transact_bp.route('/transactions/import', methods=['GET', 'POST'])
+@log_error(model=Model.transact, action=Action.add, 
+           pg_template='import_transactions.html', accounts=[], 
+           categories=[])
+def import_transactions():
+    """
+    Import a bank statement CSV into one account.
+
+    Rows that duplicate a transaction are skipped and listed, unless
+    duplicates are allowed.
+
+    POST request parameters:
+    accountid: int
+    categoryid: int
+    file: CSV file (date, amount, description columns)
+    allow_duplicates: 'on' (optional)
+    auto_categorize: 'on' (optional, use suggested categories when 
+        confident, `categoryid` otherwise)
+
+    Raises:
+    POST request:
+    AssertionError when the file can't be read or a row is not valid 
+        (see `TransactController.import_csv()`)
+    """
+    if request.method == 'POST':
+        file = request.files['file']
+        allow_duplicates = request.form.get('allow_duplicates') == 'on'
+        auto_categorize = request.form.get('auto_categorize') == 'on'
+        added, skipped = TransactController.import_csv(
+            request.form['accountid'], request.form['categoryid'], 
+            TextIOWrapper(file.stream, encoding='utf-8-sig'), 
+            allow_duplicates, auto_categorize
+        )
+        flash(f'{len(added)} transactions imported, {len(skipped)} '
+              'duplicates skipped', 'success')
+        return render_template('import_transactions.html', 
+                               accounts=AcctController.accounts(balance=False), 
+                               categories=CatController.categories(), 
+                               skipped=skipped)
+    else:
+        return render_template('import_transactions.html', 
+                               accounts=AcctController.accounts(balance=False), 
+                               categories=CatController.categories())
+
 @transact_bp.route('/transactions/edit', methods=['GET', 'POST'])
 @log_error(model=Model.transact, action=Action.edit, pg_template='add_edit_transaction.html', 
            transaction=None, datetime=datetime, accounts=[], categories=[])
@@ -166,9 +242,9 @@ def edit_transaction():
 def filter():
     categories = request.args['categories']
     catSplit = categories.split(',')
-    transactions = TransactController.filter_category(catSplit)
-    return render_template('transactions.html', transactions=transactions,
-                           p=1, has_next=False, has_prev=False, s='')
+    transactions = peek(TransactController.iter_filter_category(catSplit))
+    return stream_page('transactions.html', transactions=transactions,
+                       p=1, has_next=False, has_prev=False, s='')
 
 @transact_bp.route('/transactions/delete', methods=['POST'])
 @log_error(model=Model.transact, action=Action.delete, transaction=[])
@@ -0,0 +1,58 @@
+__all__ = ['Automaton']
+
+from collections import deque
+
+class Automaton:
+    # Aho-Corasick automaton matching many patterns in one pass
+    #
+    # Built once from all patterns, then `find()` walks a text one
+    # character at a time and reports every pattern ending at each
+    # position, however many patterns there are.
+    #
+    # Example:
+    # automaton = Automaton({'he': 1, 'she': 2, 'hers': 3})
+    # list(automaton.find('ushers')) -> [(1, 2), (2, 1), (2, 3)]
+    def __init__(self, patterns):
+        # :param patterns: dict of str: any (pattern: value reported)
+        # O(m) (where m = total length of the patterns)
+        self._goto = [{}] # state: dict of character: state
+        self._fail = [0] # state: longest proper suffix's state
+        self._out = [[]] # state: list of (length, value) ending here
+        for pattern, value in patterns.items():
+            if not pattern:
+                raise ValueError("Patterns can't be empty")
+            state = 0
+            for char in pattern:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._out[state].append((len(pattern), value))
+
+        # Breadth first, so every suffix's state is done before it's used
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_ in self._goto[state].items():
+                queue.append(next_)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_] = self._goto[fail].get(char, 0)
+                self._out[next_] = (self._out[next_]
+                                    + self._out[self._fail[next_]])
+
+    def find(self, text):
+        # Every pattern in `text`
+        # Yields: (start index, value)
+        # O(n + k) (where n = len(text), k = matches)
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, value in out[state]:
+                yield i - length + 1, value
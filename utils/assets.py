@@ -0,0 +1,150 @@
+__all__ = ['assets_bp', 'asset_url', 'build']
+
+from datetime import timedelta
+from gzip import compress
+from hashlib import sha256
+from json import dump, load
+from mimetypes import guess_type
+from pathlib import Path, PurePosixPath
+from posixpath import dirname, join, normpath
+from re import compile
+
+from flask import Blueprint, abort, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError: # Optional: only gzip variants are built without it
+    brotli = None
+
+STATIC_DIR = Path(__file__).resolve().parent.parent / 'static'
+DIST_DIR = STATIC_DIR / 'dist' # Build output (not committed)
+
+_max_age = timedelta(days=365)
+# Types worth compressing (fonts and images are compressed already)
+_compressible = {'.css', '.js', '.json', '.map', '.svg', '.txt'}
+_css_url = compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+_manifest = {} # Static file name: built file name (see `build()`)
+# Names from `_hashed_name()`, not their .gz and .br variants
+_built_name = compile(r'\.[0-9a-f]{12}(\.[^./]+)?$')
+
+assets_bp = Blueprint('assets', __name__)
+
+def _hashed_name(name, data):
+    # 'css/all.min.css' -> 'css/all.min.1a2b3c4d5e6f.css'
+    path = PurePosixPath(name)
+    digest = sha256(data).hexdigest()[:12]
+    return str(path.with_name(f'{path.stem}.{digest}{path.suffix}'))
+
+def _rewrite_css(name, text, manifest):
+    # Point the url()s of a stylesheet at the built files
+    #
+    # The build keeps the folder layout, so a relative URL only needs
+    # its file name changed. Data URIs, absolute URLs and files that
+    # weren't built are left alone.
+    def rewrite(match):
+        quote, url = match.groups()
+        if ':' in url or url.startswith('/'):
+            return match.group(0)
+        path = url.split('?')[0].split('#')[0]
+        target = normpath(join(dirname(name), path))
+        if target not in manifest:
+            return match.group(0)
+        built = PurePosixPath(manifest[target]).name
+        url = str(PurePosixPath(path).with_name(built)) + url[len(path):]
+        return f'url({quote}{url}{quote})'
+
+    return _css_url.sub(rewrite, text)
+
+def _write(path, data):
+    # Built names change with their content, so an existing file is done
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+def build(static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+    # Copy every static file into `dist_dir` with a hash of its content
+    # in its name, plus .gz (and .br with `brotli` installed) variants
+    #
+    # Stylesheets are built last with their url()s pointing at the
+    # built fonts and images. Files from earlier builds are kept so
+    # pages cached before a deploy can still load them.
+    #
+    # :param static_dir: Path
+    # :param dist_dir: Path (inside `static_dir` or not)
+    #
+    # Returns: dict of static file name: built file name, also saved as
+    #     manifest.json in `dist_dir`
+    files = [i.relative_to(static_dir).as_posix()
+             for i in static_dir.rglob('*')
+             if i.is_file() and dist_dir not in i.parents]
+    manifest = {}
+    for name in sorted(files, key=lambda i: (i.endswith('.css'), i)):
+        data = (static_dir / name).read_bytes()
+        if name.endswith('.css'):
+            data = _rewrite_css(name, data.decode(), manifest).encode()
+        built = _hashed_name(name, data)
+        manifest[name] = built
+        _write(dist_dir / built, data)
+
+        if PurePosixPath(name).suffix not in _compressible:
+            continue
+        _write(dist_dir / f'{built}.gz', compress(data, 9, mtime=0))
+        if brotli is not None:
+            _write(dist_dir / f'{built}.br', 
+                   brotli.compress(data, quality=11))
+
+    with open(dist_dir / 'manifest.json', 'w') as file:
+        dump(manifest, file, indent=2, sort_keys=True)
+    return manifest
+
+@assets_bp.record_once
+def _load_manifest(state):
+    # Use the built files when `python -m utils.assets` has been run
+    try:
+        with open(DIST_DIR / 'manifest.json') as file:
+            _manifest.update(load(file))
+    except FileNotFoundError:
+        return
+
+@assets_bp.app_template_global()
+def asset_url(filename):
+    # URL of a static file, built or not (use instead of
+    # url_for('static', ...) in templates)
+    built = _manifest.get(filename)
+    if built is None:
+        return url_for('static', filename=filename)
+    return url_for('assets.asset', filename=built)
+
+@assets_bp.route('/assets/<path:filename>')
+def asset(filename):
+    """
+    Send a built static file, precompressed when the browser accepts it.
+
+    Built file names change with their content, so browsers can keep
+    them for a year without checking for a new version. Files of
+    earlier builds are sent too, so pages cached before a deploy can
+    still load them.
+    """
+    if not _built_name.search(filename):
+        abort(404)
+
+    kwargs = {'mimetype': guess_type(filename)[0], 
+              'max_age': int(_max_age.total_seconds())}
+    encodings = request.accept_encodings
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if (encoding in encodings
+                and (DIST_DIR / f'{filename}{suffix}').exists()):
+            response = send_from_directory(DIST_DIR, filename + suffix,
+                                           **kwargs)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(DIST_DIR, filename, **kwargs)
+
+    response.vary.add('Accept-Encoding')
+    response.cache_control.immutable = True
+    return response
+
+if __name__ == '__main__':
+    manifest = build()
+    print(f'Built {len(manifest)} assets in {DIST_DIR}')
@@ -0,0 +1,361 @@
+__all__ = ['backup', 'restore']
+
+# Backups of the whole database as compressed columns
+#
+#     python -m utils.backup save budget.backup
+#     python -m utils.backup restore budget.backup [--workers 4]
+#
+# A backup is a zip file. `manifest.json` lists each table's columns and
+# chunks, and each column of every chunk of `_chunk_rows` rows is one
+# NumPy array (`<table>/<chunk>/<column>.<part>.npy`), so similar values
+# sit together and compress well.
+
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO
+from json import dumps, loads
+from os import remove, replace
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import numpy as np
+
+from utils.db import (db_commit, db_commit_many, db_fetchiter, db_fetchone,
+                      db_snapshot, db_transaction)
+from utils.statements import statement
+
+_format = 1 # Changes when old backups can no longer be restored
+_chunk_rows = 10000
+_epoch = datetime(1970, 1, 1)
+
+# Tables in the order they are restored, with the kind of each column:
+#     id: integer key, saved as the difference from the row before
+#     int
+#     cents: DECIMAL(x, 2) as integer cents
+#     date, datetime
+#     str
+# acct_balance is rebuilt from the transactions instead of saved, and
+# job only matters to the processes that were running. change_log is
+# saved so API clients and caches can keep syncing from the versions
+# they have (see `ApiController.changes()`).
+_transact = [('transactionid', 'id'), ('accountid', 'int'),
+             ('categoryid', 'int'), ('amount', 'cents'),
+             ('transactiondate', 'date'), ('dscr', 'str'),
+             ('fingerprint', 'str')]
+_cashflow = [('expense', 'id'), ('income', 'int'), ('type_', 'str')]
+_tables = {
+    'acct': [('accountid', 'id'), ('accountname', 'str'),
+             ('accounttype', 'str'), ('date_created', 'datetime')],
+    'category': [('categoryid', 'id'), ('categoryname', 'str'),
+                 ('type_', 'str')],
+    'transact': _transact,
+    'budget': [('budgetid', 'id'), ('categoryid', 'int'),
+               ('budget_year', 'int'), ('budget_month', 'int'),
+               ('budget_amount', 'cents')],
+    'cashflow': _cashflow,
+    'rule': [('ruleid', 'id'), ('pattern', 'str'), ('match_type', 'str'),
+             ('accountid', 'int'), ('amount_sign', 'str'),
+             ('categoryid', 'int'), ('priority', 'int')],
+    'archive': [('through_date', 'date'), ('archived_at', 'datetime')],
+    'transact_archive': _transact,
+    'cashflow_archive': _cashflow,
+    'opening_balance': [('accountid', 'id'), ('balance', 'cents'),
+                        ('transactions', 'int')],
+    'change_log': [('changeid', 'id'), ('version', 'int'),
+                   ('table_name', 'str'), ('row_id', 'int'),
+                   ('row_id2', 'int'), ('op', 'str'),
+                   ('changed_at', 'datetime')]
+}
+# Columns that refer to another table's key: table, column, tables the
+# row can be in
+_references = [
+    ('transact', 'accountid', ('acct',)),
+    ('transact', 'categoryid', ('category',)),
+    ('budget', 'categoryid', ('category',)),
+    ('cashflow', 'expense', ('transact',)),
+    ('cashflow', 'income', ('transact',)),
+    ('rule', 'accountid', ('acct',)),
+    ('rule', 'categoryid', ('category',)),
+    ('transact_archive', 'accountid', ('acct',)),
+    ('transact_archive', 'categoryid', ('category',)),
+    ('cashflow_archive', 'expense', ('transact', 'transact_archive')),
+    ('cashflow_archive', 'income', ('transact', 'transact_archive')),
+    ('opening_balance', 'accountid', ('acct',))
+]
+
+_read = {}
+_write = {}
+_count = {}
+for _table, _columns in _tables.items():
+    _names = ', '.join([i for i, _ in _columns])
+    _read[_table] = statement(f'backup.read_{_table}',
+                              f'SELECT {_names} FROM {_table}')
+    _write[_table] = statement(
+        f'backup.write_{_table}',
+        f'INSERT INTO {_table} ({_names})',
+        f'VALUES ({", ".join(["%s"] * len(_columns))})',
+        prepared=False
+    )
+    _count[_table] = statement(f'backup.count_{_table}',
+                               f'SELECT COUNT(*) as total FROM {_table}')
+
+_orphans = []
+for _table, _column, _parents in _references:
+    _missing = ' AND '.join([
+        f'NOT EXISTS (SELECT 1 FROM {i} p '
+        f'WHERE p.{_tables[i][0][0]} = t.{_column})'
+        for i in _parents
+    ])
+    _orphans.append((f'{_table}.{_column}', statement(
+        f'backup.orphans_{_table}_{_column}',
+        f'SELECT COUNT(*) as total FROM {_table} t',
+        f'WHERE t.{_column} IS NOT NULL AND', _missing
+    )))
+
+# Rows are loaded in any order, so references are checked once at the
+# end instead (see `_check()`)
+_set_foreign_key_checks = statement('backup.set_foreign_key_checks',
+                                    'SET foreign_key_checks = %s')
+# The next change after a restore gets a version past every saved one
+_set_change_version = statement(
+    'backup.set_change_version',
+    """
+        UPDATE change_version
+        SET version = (SELECT COALESCE(MAX(version), 0) FROM change_log)
+    """
+)
+
+def _smallest(numbers):
+    # The integers as the smallest type that holds them all
+    for dtype in (np.int8, np.int16, np.int32):
+        limits = np.iinfo(dtype)
+        if numbers.min() >= limits.min and numbers.max() <= limits.max:
+            return numbers.astype(dtype)
+    return numbers
+
+def _encode(kind, values):
+    # One column of a chunk as arrays
+    # :param values: list (not empty)
+    # Returns: dict of part: array
+    #     values: the values, or the UTF-8 bytes of every string
+    #     offsets: where each string ends (str only)
+    #     nulls: which rows are NULL as bits (only with NULLs)
+    arrays = {}
+    nulls = np.array([i is None for i in values], dtype=bool)
+    if nulls.any():
+        arrays['nulls'] = np.packbits(nulls)
+
+    if kind == 'str':
+        data = [(i or '').encode() for i in values]
+        arrays['values'] = np.frombuffer(b''.join(data), dtype=np.uint8)
+        arrays['offsets'] = _smallest(np.cumsum([len(i) for i in data]))
+        return arrays
+
+    if kind == 'cents':
+        numbers = [0 if i is None else int(i.scaleb(2)) for i in values]
+    elif kind == 'date':
+        numbers = [0 if i is None else i.toordinal() for i in values]
+    elif kind == 'datetime':
+        numbers = [0 if i is None else int((i - _epoch).total_seconds())
+                   for i in values]
+    else:
+        numbers = [0 if i is None else int(i) for i in values]
+    numbers = np.array(numbers, dtype=np.int64)
+    if kind == 'id':
+        numbers = np.diff(numbers, prepend=0)
+    arrays['values'] = _smallest(numbers)
+    return arrays
+
+def _decode(kind, arrays):
+    # Reverse of `_encode()`
+    # Returns: list
+    values = arrays['values']
+    if kind == 'str':
+        blob = values.tobytes()
+        ends = arrays['offsets'].astype(np.int64).tolist()
+        column = [blob[i:j] for i, j in zip([0] + ends[:-1], ends)]
+        convert = bytes.decode
+    else:
+        numbers = values.astype(np.int64)
+        if kind == 'id':
+            numbers = np.cumsum(numbers)
+        column = numbers.tolist()
+        convert = {
+            'cents': lambda i: Decimal(i).scaleb(-2),
+            'date': date.fromordinal,
+            'datetime': lambda i: _epoch + timedelta(seconds=i)
+        }.get(kind, int)
+
+    if 'nulls' not in arrays:
+        return [convert(i) for i in column]
+    nulls = np.unpackbits(arrays['nulls'], count=len(column)).tolist()
+    return [None if null else convert(value)
+            for value, null in zip(column, nulls)]
+
+def _chunks(rows, size):
+    # Lists of `size` rows
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def backup(path, progress=lambda *args: None):
+    # Save every table to `path`
+    #
+    # Every table is read from one consistent snapshot, so the backup
+    # matches a single moment even while the app keeps writing. Rows
+    # are streamed and written `_chunk_rows` at a time, so memory
+    # doesn't grow with the tables. The file only replaces `path` once
+    # it is complete.
+    #
+    # :param path: str
+    # :param progress: function (message)
+    #
+    # Returns: dict of table: rows saved
+    manifest = {'format': _format,
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'tables': {}}
+    partial = f'{path}.partial'
+    try:
+        _save(partial, manifest, progress)
+    except BaseException:
+        remove(partial)
+        raise
+    replace(partial, path)
+    return {i: j['rows'] for i, j in manifest['tables'].items()}
+
+def _save(path, manifest, progress):
+    # Write every table and then the manifest to `path`
+    with ZipFile(path, 'w', ZIP_DEFLATED, compresslevel=6) as file, \
+            db_snapshot():
+        for table, columns in _tables.items():
+            chunks = 0
+            rows = 0
+            for chunk in _chunks(db_fetchiter(_read[table], size=_chunk_rows),
+                                 _chunk_rows):
+                for name, kind in columns:
+                    arrays = _encode(kind, [i[name] for i in chunk])
+                    for part, array in arrays.items():
+                        entry = f'{table}/{chunks:06d}/{name}.{part}.npy'
+                        with file.open(entry, 'w') as out:
+                            np.save(out, array, allow_pickle=False)
+                chunks += 1
+                rows += len(chunk)
+            manifest['tables'][table] = {'columns': columns,
+                                         'chunks': chunks, 'rows': rows}
+            progress(f'{table}: {rows} rows')
+        file.writestr('manifest.json', dumps(manifest, indent=1))
+
+def _load(file, entries, table, columns, chunk):
+    # Insert one chunk of a table, in its own database transaction
+    # Returns: int (rows inserted)
+    prefix = f'{table}/{chunk:06d}/'
+    values = []
+    for name, kind in columns:
+        arrays = {}
+        for part in ('values', 'offsets', 'nulls'):
+            entry = f'{prefix}{name}.{part}.npy'
+            if entry in entries:
+                arrays[part] = np.load(BytesIO(file.read(entry)),
+                                       allow_pickle=False)
+        values.append(_decode(kind, arrays))
+    rows = list(zip(*values))
+
+    # A connection that fails is closed, never pooled with checks off
+    with db_transaction():
+        db_commit(_set_foreign_key_checks, (0,), return_id=False)
+        db_commit_many(_write[table], rows)
+        db_commit(_set_foreign_key_checks, (1,), return_id=False)
+    return len(rows)
+
+def _check(manifest):
+    # Raises AssertionError when rows are missing or any reference
+    #     points to a row that doesn't exist
+    problems = []
+    for table, saved in manifest['tables'].items():
+        total = db_fetchone(_count[table])['total']
+        if total != saved['rows']:
+            problems.append(f'{table} has {total} rows instead of '
+                            f'{saved["rows"]}')
+    for name, stmt in _orphans:
+        total = db_fetchone(stmt)['total']
+        if total:
+            problems.append(f'{total} rows have a {name} that does not exist')
+    assert not problems, '; '.join(problems)
+
+def restore(path, workers=4, progress=lambda *args: None):
+    # Load a backup made by `backup()` into empty tables
+    #
+    # Chunks are decompressed and inserted by `workers` threads at once,
+    # each on its own connection, with foreign key checks off. Every
+    # reference is checked once everything is loaded, then the balance
+    # index is rebuilt and new changes continue from the saved versions.
+    # Restart the app afterwards so its caches reload.
+    #
+    # :param path: str
+    # :param workers: int
+    # :param progress: function (message)
+    #
+    # Returns: dict of table: rows restored
+    #
+    # Raises AssertionError when:
+    #     the file isn't a backup this version can read
+    #     any table to restore isn't empty
+    #     rows are missing or references are broken after loading (see
+    #         `_check()`)
+    with ZipFile(path) as file:
+        manifest = loads(file.read('manifest.json'))
+        assert manifest.get('format') == _format, \
+            'This backup was made by a different version'
+        for table, saved in manifest['tables'].items():
+            assert table in _tables, f'Unknown table {table}'
+            assert saved['columns'] == [list(i) for i in _tables[table]], \
+                f'The columns of {table} have changed since the backup'
+            assert db_fetchone(_count[table])['total'] == 0, \
+                f'{table} is not empty'
+
+        entries = set(file.namelist())
+        jobs = [(table, chunk)
+                for table, saved in manifest['tables'].items()
+                for chunk in range(saved['chunks'])]
+        total = sum([i['rows'] for i in manifest['tables'].values()])
+        done = 0
+        with ThreadPoolExecutor(max_workers=workers,
+                                thread_name_prefix='restore') as executor:
+            for rows in executor.map(
+                    lambda job: _load(file, entries, job[0],
+                                      _tables[job[0]], job[1]), jobs):
+                done += rows
+                progress(f'{done} of {total} rows')
+
+    _check(manifest)
+    db_commit(_set_change_version, None, return_id=False)
+    from account import AcctController
+    AcctController.rebuild_balance_index()
+    return {i: j['rows'] for i, j in manifest['tables'].items()}
+
+if __name__ == '__main__':
+    parser = ArgumentParser(prog='python -m utils.backup',
+                            description='Back up or restore the database')
+    commands = parser.add_subparsers(dest='command', required=True)
+    save = commands.add_parser('save', help='back up every table')
+    save.add_argument('file')
+    load = commands.add_parser('restore', help='restore into empty tables')
+    load.add_argument('file')
+    load.add_argument('--workers', type=int, default=4,
+                      help='chunks loaded at once (default 4)')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'save':
+            rows = backup(args.file, print)
+        else:
+            rows = restore(args.file, args.workers, print)
+    except AssertionError as e:
+        parser.exit(1, f'{e}\n')
+    print(f'{sum(rows.values())} rows in {len(rows)} tables')
@@ -18,6 +18,30 @@ class _Config: # Default app configuration
         'password': environ.get('DB_PASSWORD'),
         'port': int(environ.get('DB_PORT', 3306)) # The database's port
     }
+    # Idle connections kept open (with their prepared statements)
+    DB_POOL_SIZE = int(environ.get('DB_POOL_SIZE', 5))
+    # Keep a columnar copy of the transaction table in each process
+    TRANSACT_CACHE = environ.get('TRANSACT_CACHE', 'false').lower() == 'true'
+    # Background job threads, and seconds before a job's result is stale
+    JOB_WORKERS = int(environ.get('JOB_WORKERS', 2))
+    JOB_MAX_AGE = int(environ.get('JOB_MAX_AGE', 300))
+    # Days apart two matching transactions can be and still be duplicates
+    DUPLICATE_WINDOW_DAYS = int(environ.get('DUPLICATE_WINDOW_DAYS', 3))
+    # Share of past transactions a suggested category needs to be
+    # assigned on import without asking
+    AUTO_CATEGORY_CONFIDENCE = float(environ.get('AUTO_CATEGORY_CONFIDENCE',
+                                                 0.6))
+    # Compiled templates shared between workers (Jinja's temp folder
+    # when empty)
+    TEMPLATE_CACHE_DIR = environ.get('TEMPLATE_CACHE_DIR', '')
+    # Share of requests (0-1) whose stacks are sampled, 0 turns it off
+    PROFILE_RATE = float(environ.get('PROFILE_RATE', 0))
+    # Endpoints or blueprints to sample (all when empty)
+    PROFILE_ENDPOINTS = [i for i in environ.get('PROFILE_ENDPOINTS', '')
+                         .split(',') if i]
+    # Seconds between samples, and where the collapsed stacks are written
+    PROFILE_INTERVAL = float(environ.get('PROFILE_INTERVAL', 0.005))
+    PROFILE_DIR = environ.get('PROFILE_DIR', 'profiles')
 
 class _ProductionConfig(_Config): # Production app configuration
     DEBUG = False
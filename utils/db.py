@@ -1,32 +1,198 @@
-__all__ = ['get_db_connection', 'db_fetchall', 'db_fetchone', 'db_commit']
+__all__ = ['get_db_connection', 'db_fetchall', 'db_fetchone', 'db_commit',
+           'db_fetchcolumns', 'db_fetchiter', 'db_commit_many',
+           'db_transaction', 'db_snapshot', 'db_async', 'db_gather']
 
+from asyncio import gather, to_thread
 from contextlib import contextmanager
+from functools import partial
+from queue import Empty, Full, LifoQueue
+from threading import local
+from time import perf_counter
 from mysql.connector import Error, connect
 
-from app import DB_CONFIG
+from app import app, DB_CONFIG
+from utils.metrics import (count_cache, count_connection, observe_query,
+                           set_idle_connections)
+from utils.profiler import sampled
+from utils.statements import Statement, statement
+
+# Idle connections and the prepared statements cached on each of them
+_idle = LifoQueue(maxsize=app.config['DB_POOL_SIZE'])
+# The connection of the thread's open `db_transaction()`, if any, and
+# whether it wrote to `change_log`
+_local = local()
+
+# `change_log` versions are given out when a write commits instead of
+# when it starts. The counter's row stays locked until the commit, so
+# versions follow commit order and a reader that saw version v has seen
+# every change up to v.
+_next_version = statement(
+    'change_log.next_version',
+    'UPDATE change_version SET version = LAST_INSERT_ID(version + 1)'
+)
+_set_version = statement(
+    'change_log.set_version',
+    """
+        UPDATE change_log
+        SET version = LAST_INSERT_ID()
+        WHERE connection_id = CONNECTION_ID() AND version IS NULL
+    """
+)
+
+def _checkout():
+    # Reuse an idle connection when one is still alive
+    # Returns: (connection, dict of prepared cursors by statement)
+    while True:
+        try:
+            connection, cursors = _idle.get_nowait()
+        except Empty:
+            count_connection()
+            return connect(**DB_CONFIG), {}
+        finally:
+            set_idle_connections(_idle.qsize())
+
+        if connection.is_connected():
+            return connection, cursors
+        # The server dropped the connection with its prepared statements
+
+def _checkin(connection, cursors):
+    # Return a connection to the idle pool, or close it when full
+    if connection.in_transaction:
+        connection.rollback() # Don't keep a stale snapshot open
+    try:
+        _idle.put_nowait((connection, cursors))
+    except Full:
+        connection.close()
+    set_idle_connections(_idle.qsize())
 
 @contextmanager
-def get_db_connection():
-    # Context manager for database connections
+def _pooled_connection():
+    # Context manager for pooled database connections
+    # Yields: (connection, dict of prepared cursors by statement)
     connection = None
+    cursors = None
     try:
-        connection = connect(**DB_CONFIG)
-        yield connection
+        connection, cursors = _checkout()
+        yield connection, cursors
     except Error as e:
         if connection:
             connection.rollback()
         raise Exception(e)
+    else:
+        _checkin(connection, cursors)
+        connection = None
     finally:
+        # Only reached with a connection when something went wrong,
+        # so closing it discards any uncommitted work
         if connection and connection.is_connected():
             connection.close()
 
+@contextmanager
+def _connection():
+    # The open transaction's connection, or a pooled connection
+    # Yields: (connection, dict of prepared cursors by statement)
+    if _in_transaction():
+        yield _local.transaction
+    else:
+        with _pooled_connection() as pair:
+            yield pair
+
+def _in_transaction(): return getattr(_local, 'transaction', None) is not None
+
+def _commit(conn, cursors, logs_changes):
+    # Commit, first giving the changes logged by the transaction the next
+    # `change_log` version
+    if logs_changes:
+        _execute(conn, cursors, _next_version)
+        _execute(conn, cursors, _set_version)
+    conn.commit()
+
+@contextmanager
+def db_transaction():
+    # Context manager that runs every query in the block in one
+    # transaction on one connection
+    #
+    # `db_commit()` and `db_commit_many()` don't commit inside the
+    # block. Everything is committed when the block ends, or rolled back
+    # when it raises. Nested blocks join the outer transaction.
+    if _in_transaction():
+        yield
+        return
+
+    with _pooled_connection() as (conn, cursors):
+        _local.transaction = (conn, cursors)
+        _local.logs_changes = False
+        try:
+            yield
+            _commit(conn, cursors, _local.logs_changes)
+        finally:
+            _local.transaction = None
+
+@contextmanager
+def db_snapshot():
+    # Context manager that runs every query in the block on one
+    # consistent, read-only snapshot of the database
+    #
+    # The block sees every table as it was when the block started, while
+    # other connections keep writing (ex. for backups).
+    #
+    # Raises:
+    # RuntimeError when called inside `db_transaction()`
+    if _in_transaction():
+        raise RuntimeError("Can't take a snapshot inside a transaction")
+
+    with _pooled_connection() as (conn, cursors):
+        conn.start_transaction(consistent_snapshot=True,
+                               isolation_level='REPEATABLE READ',
+                               readonly=True)
+        _local.transaction = (conn, cursors)
+        _local.logs_changes = False
+        try:
+            yield
+            conn.commit()
+        finally:
+            _local.transaction = None
+
+@contextmanager
+def get_db_connection():
+    # Context manager for database connections
+    with _pooled_connection() as (connection, _):
+        yield connection
+
+def _execute(connection, cursors, stmt, dbArgs=None, dictionary=False):
+    # Execute a registered statement
+    #
+    # Prepared statements keep one cursor per statement on each
+    # connection, so the server only parses them the first time.
+    #
+    # Raises:
+    # TypeError when `stmt` is not a registered `Statement`
+    if not isinstance(stmt, Statement):
+        raise TypeError("Queries must be declared with utils.statements")
+
+    if stmt.prepared:
+        key = (stmt.name, dictionary)
+        cursor = cursors.get(key)
+        count_cache('statement', cursor is not None)
+        if cursor is None:
+            cursor = connection.cursor(prepared=True, dictionary=dictionary)
+            cursors[key] = cursor
+    else:
+        cursor = connection.cursor(dictionary=dictionary)
+
+    stmt.count()
+    start = perf_counter()
+    cursor.execute(stmt.sql, dbArgs)
+    observe_query(stmt.name, perf_counter() - start)
+    return cursor
+
 def _db_fetch(*args, all=True):
     # Fetch queries from the database
     #
     # Fetch one row or all rows from the database connected to the server.
-    # 
+    #
     # :param all: bool (True: returns all rows | False: returns one)
-    # :param args: str[, tuple] (The first argument is the query,
+    # :param args: Statement[, tuple] (The first argument is the query,
     #     and the second argument is the arguments for that query)
     #
     # Returns:
@@ -38,25 +204,69 @@ def _db_fetch(*args, all=True):
     lenArgs = len(args)
     if lenArgs > 2:
         raise ValueError("Can't accept multiple queries")
-    
-    with get_db_connection() as conn:
-        cursor = conn.cursor(dictionary=True)
+
+    with _connection() as (conn, cursors):
         query = args[0]
-        if lenArgs == 1:
-            cursor.execute(query)
-        else:
-            dbArgs = args[1]
-            cursor.execute(query, dbArgs)
+        dbArgs = args[1] if lenArgs == 2 else None
+        cursor = _execute(conn, cursors, query, dbArgs, dictionary=True)
+        rows = cursor.fetchall() # Leave no unread result on the connection
 
         if all:
-            return cursor.fetchall()
+            return rows
         else:
-            return cursor.fetchone()
+            return rows[0] if rows else None
 
 def db_fetchall(*args): return _db_fetch(*args, all=True)
-    
+
 def db_fetchone(*args): return _db_fetch(*args, all=False)
-    
+
+def db_fetchcolumns(*args):
+    # Fetch all rows from the database as columns
+    #
+    # Skips building a dict for every row, for queries whose results
+    # are processed column by column (ex. with NumPy).
+    #
+    # :param args: Statement[, tuple] (see `_db_fetch()`)
+    #
+    # Returns:
+    # dict of column name: tuple (every column is empty without rows)
+    lenArgs = len(args)
+    if lenArgs > 2:
+        raise ValueError("Can't accept multiple queries")
+
+    with _connection() as (conn, cursors):
+        dbArgs = args[1] if lenArgs == 2 else None
+        cursor = _execute(conn, cursors, args[0], dbArgs)
+        rows = cursor.fetchall()
+        names = cursor.column_names
+        columns = list(zip(*rows)) if rows else [()] * len(names)
+        return dict(zip(names, columns))
+
+def db_fetchiter(*args, size=1000):
+    # Fetch rows from the database a few at a time
+    #
+    # Rows are streamed from the server `size` at a time, so a large
+    # result never has to fit in memory. The connection stays checked
+    # out until the loop over the rows ends.
+    #
+    # :param args: Statement[, tuple] (see `_db_fetch()`)
+    # :param size: int (rows per round trip)
+    #
+    # Yields: dict (one row)
+    lenArgs = len(args)
+    if lenArgs > 2:
+        raise ValueError("Can't accept multiple queries")
+
+    with _connection() as (conn, cursors):
+        dbArgs = args[1] if lenArgs == 2 else None
+        cursor = _execute(conn, cursors, args[0], dbArgs, dictionary=True)
+        try:
+            while rows := cursor.fetchmany(size):
+                yield from rows
+        finally:
+            if conn.unread_result:
+                cursor.fetchall() # Leave no unread result on the connection
+
 def db_commit(*args, return_id=True, return_was_affected=False):
     # Update data in the database
     #
@@ -71,23 +281,27 @@ def db_commit(*args, return_id=True, return_was_affected=False):
         raise ValueError("Expected at least 2 arguments")
     elif lenArgs % 2 != 0:
         raise ValueError("Expected an even number of arguments")
-    
+
     new_id = None
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
+    logs_changes = False
+    with _connection() as (conn, cursors):
         lenArgs = len(args)
         for i in range(0, lenArgs, 2):
             query = args[i]
             dbArgs = args[i + 1]
-            cursor.execute(query, dbArgs)
+            cursor = _execute(conn, cursors, query, dbArgs)
+            logs_changes = logs_changes or query.logs_changes
 
         if return_id:
             new_id = cursor.lastrowid
 
         if return_was_affected:
             was_affected = cursor.rowcount > 0
-        
-        conn.commit()
+
+        if _in_transaction():
+            _local.logs_changes = _local.logs_changes or logs_changes
+        else:
+            _commit(conn, cursors, logs_changes)
 
     if return_was_affected and return_id:
         return new_id, was_affected
@@ -95,5 +309,68 @@ def db_commit(*args, return_id=True, return_was_affected=False):
         return new_id
     elif return_was_affected:
         return was_affected
-    
-def join(*args): return ' '.join(args)
\ No newline at end of file
+
+def db_commit_many(stmt, seq_args):
+    # Run one statement for every set of arguments in one commit
+    #
+    # Declare inserts with `prepared=False` so `executemany()` sends
+    # every row in one multi-row INSERT.
+    #
+    # :param stmt: Statement
+    # :param seq_args: list of tuple
+    #
+    # Returns:
+    # The first new ID (the IDs of a multi-row insert are only
+    # consecutive when innodb_autoinc_lock_mode is 0 or 1)
+    #
+    # Raises:
+    # ValueError when `seq_args` is empty
+    if len(seq_args) == 0:
+        raise ValueError("Expected at least 1 set of arguments")
+    if not isinstance(stmt, Statement):
+        raise TypeError("Queries must be declared with utils.statements")
+
+    with _connection() as (conn, cursors):
+        if stmt.prepared:
+            cursor = conn.cursor(prepared=True)
+        else:
+            cursor = conn.cursor()
+        stmt.count()
+        start = perf_counter()
+        cursor.executemany(stmt.sql, seq_args)
+        observe_query(stmt.name, perf_counter() - start)
+        new_id = cursor.lastrowid
+
+        if _in_transaction():
+            _local.logs_changes = _local.logs_changes or stmt.logs_changes
+        else:
+            _commit(conn, cursors, stmt.logs_changes)
+
+    return new_id
+
+async def db_async(func, *args, **kwargs):
+    # Run a blocking call that queries the database (a model or
+    # controller method) in a worker thread, on its own pooled connection
+    #
+    # Not for use inside `db_transaction()`: the transaction's connection
+    # belongs to the thread that opened it.
+    #
+    # Returns: the call's return value
+    if _in_transaction():
+        raise RuntimeError("Can't run queries of a transaction in a thread")
+    return await to_thread(sampled(func), *args, **kwargs)
+
+async def db_gather(*calls):
+    # Run independent blocking calls at the same time
+    #
+    # Each call gets its own pooled connection, so the total time is
+    # about that of the slowest call instead of the sum.
+    #
+    # :param calls: callable (with its arguments bound, ex. `partial()`)
+    #     or tuple (callable, *args)
+    #
+    # Returns: list of the return values, in the same order as `calls`
+    calls = [partial(*i) if isinstance(i, tuple) else i for i in calls]
+    return await gather(*[db_async(i) for i in calls])
+
+def join(*args): return ' '.join(args)
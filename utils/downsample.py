@@ -0,0 +1,47 @@
+__all__ = ['lttb']
+
+def lttb(points, threshold):
+    # Downsample a series with largest-triangle-three-buckets
+    #
+    # Keeps the first and last points, and from each bucket in between
+    # keeps the point forming the largest triangle with the previously
+    # kept point and the average of the next bucket. This preserves the
+    # peaks and troughs a chart needs with far fewer points.
+    #
+    # :param points: list of (x, y) (sorted by x, numbers)
+    # :param threshold: int (number of points to keep)
+    #
+    # Returns:
+    # list of (x, y) (the original list when it is already small enough)
+    #
+    # O(n) (where n = len(points))
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    every = (n - 2) / (threshold - 2) # Bucket size, without the ends
+    a = 0 # Index of the previously kept point
+    for i in range(threshold - 2):
+        # Average of the next bucket
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        next_len = next_end - next_start
+        avg_x = sum([p[0] for p in points[next_start:next_end]]) / next_len
+        avg_y = sum([p[1] for p in points[next_start:next_end]]) / next_len
+
+        # Point in this bucket with the largest triangle
+        ax, ay = points[a]
+        max_area = -1
+        for j in range(int(i * every) + 1, next_start):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                kept = j
+
+        sampled.append(points[kept])
+        a = kept
+
+    sampled.append(points[-1])
+    return sampled
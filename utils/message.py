@@ -1,5 +1,6 @@
 __all__ = ['Model', 'Action', 'log_success', 'log_error']
 
+from inspect import iscoroutinefunction
 from traceback import print_exc
 from functools import wraps
 from enum import Enum, auto
@@ -7,12 +8,17 @@ from logging import error, ERROR, critical, CRITICAL, info
 
 from flask import flash, redirect, render_template, url_for
 
+from utils.metrics import count_error
+
 class Model(Enum):
     # Use attributes to indicate which model
     acct = auto()
     budget = auto()
     cashflow = auto()
     category = auto()
+    job = auto()
+    report = auto()
+    rule = auto()
     transact = auto()
 
 class Action(Enum):
@@ -49,6 +55,18 @@ def _match_model(model, plural=False):
             msg_singular = 'category'
             msg_plural = 'categories'
             rte = 'category.categories'
+        case Model.job:
+            msg_singular = 'job'
+            msg_plural = 'jobs'
+            rte = 'job.jobs'
+        case Model.report:
+            msg_singular = 'report'
+            msg_plural = 'reports'
+            rte = 'report.reports'
+        case Model.rule:
+            msg_singular = 'rule'
+            msg_plural = 'rules'
+            rte = 'rule.rules'
         case Model.transact:
             msg_singular = 'transaction'
             msg_plural = 'transactions'
@@ -154,36 +172,48 @@ def log_error(
     :param pg_template: The page that will be loaded
     :param pg_kwargs: The kwargs for the template
     """
+    def error_page(e):
+        if isinstance(e, AssertionError):
+            error_message = e
+        elif isinstance(action, Action):
+            # What should normally happen
+
+            # Make the model plural when the action is reading
+            plural = action == Action.read
+            model_msg, _ = _match_model(model, plural=plural)
+
+            action_msg = _match_action(action) # returns participle
+            error_message = f'Error {action_msg} {model_msg}'
+        else:
+            error_message = 'An unexpected error occurred'
+
+        flash(error_message, 'error')
+        count_error(model, action)
+        if log_level == CRITICAL:
+            critical(error_message, exc_info=True)
+        else:
+            error(error_message, exc_info=True)
+
+        if pg_kwargs.get('mode') is None:
+            mode = header_action(action)
+
+        return render_template(pg_template, mode=mode, **pg_kwargs)
+
     def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            try:
-                return func(*args, **kwargs)
-            except Exception as e:
-                if isinstance(e, AssertionError):
-                    error_message = e
-                elif isinstance(action, Action):
-                    # What should normally happen
-
-                    # Make the model plural when the action is reading
-                    plural = action == Action.read
-                    model_msg, _ = _match_model(model, plural=plural)
-
-                    action_msg = _match_action(action) # returns participle
-                    error_message = f'Error {action_msg} {model_msg}'
-                else:
-                    error_message = 'An unexpected error occurred'
-
-                flash(error_message, 'error')
-                if log_level == CRITICAL:
-                    critical(error_message, exc_info=True)
-                else:
-                    error(error_message, exc_info=True)
-
-                if pg_kwargs.get('mode') is None:
-                    mode = header_action(action)
-
-                return render_template(pg_template, mode=mode, **pg_kwargs)
+        if iscoroutinefunction(func): # Async views
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as e:
+                    return error_page(e)
+        else:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    return error_page(e)
         
         return wrapper
     return decorator
\ No newline at end of file
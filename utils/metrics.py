@@ -0,0 +1,78 @@
+__all__ = ['metrics_bp', 'count_error', 'count_cache', 'count_connection',
+           'observe_query', 'set_idle_connections']
+
+from os import environ
+from time import perf_counter
+
+from flask import Blueprint, Response, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest)
+from prometheus_client.multiprocess import MultiProcessCollector
+
+# With several worker processes, set PROMETHEUS_MULTIPROC_DIR to an
+# empty folder before starting them. Each worker then writes its values
+# there and /metrics sums them. `gunicorn.conf.py` empties the folder on
+# start and marks workers that stop as dead.
+_requests = Counter('budget_requests_total', 'Requests handled',
+                    ['endpoint', 'method', 'status'])
+_request_seconds = Histogram('budget_request_seconds',
+                             'Time until the response starts', ['endpoint'])
+_errors = Counter('budget_errors_total', 'Errors shown to users',
+                  ['model', 'action'])
+_queries = Histogram('budget_db_query_seconds', 'Statement execution time',
+                     ['statement'])
+_connections = Counter('budget_db_connections_opened_total',
+                       'Database connections opened')
+_idle_connections = Gauge('budget_db_pool_idle_connections',
+                          'Idle connections in the pool',
+                          multiprocess_mode='livesum')
+_cache = Counter('budget_cache_requests_total', 'Cache lookups',
+                 ['cache', 'result'])
+
+metrics_bp = Blueprint('metrics', __name__)
+
+def count_error(model, action):
+    # :param model: Model | None
+    # :param action: Action | None
+    _errors.labels(getattr(model, 'name', 'none'),
+                   getattr(action, 'name', 'none')).inc()
+
+def count_cache(cache, hit):
+    # :param cache: str (ex. 'statement', 'job')
+    # :param hit: bool
+    _cache.labels(cache, 'hit' if hit else 'miss').inc()
+
+def count_connection(): _connections.inc()
+
+def observe_query(name, seconds): _queries.labels(name).observe(seconds)
+
+def set_idle_connections(count): _idle_connections.set(count)
+
+@metrics_bp.before_app_request
+def start_timer():
+    g.metrics_start = perf_counter()
+
+@metrics_bp.after_app_request
+def observe_request(response):
+    # Streamed pages are timed until they start sending
+    endpoint = request.endpoint or 'none'
+    _requests.labels(endpoint, request.method, response.status_code).inc()
+    if 'metrics_start' in g:
+        _request_seconds.labels(endpoint).observe(
+            perf_counter() - g.metrics_start)
+    return response
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """
+    Metrics in Prometheus' text format.
+
+    Totals are for every worker when PROMETHEUS_MULTIPROC_DIR is set.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' in environ:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
@@ -0,0 +1,158 @@
+__all__ = ['init_profiler', 'sampled']
+
+from atexit import register
+from collections import Counter
+from contextvars import ContextVar
+from functools import wraps
+from os import getpid, makedirs, path
+from random import random
+from sys import _current_frames
+from threading import Event, Lock, Thread, get_ident
+from time import monotonic, sleep
+
+from flask import g, request
+
+_dump_seconds = 60 # How often the stacks are written while sampling
+_active = {} # Thread ID: endpoint of each sampled request in progress
+_stacks = {} # Endpoint: Counter of collapsed stack: samples
+_lock = Lock()
+_wake = Event() # Set while any sampled request is in progress
+# Endpoint of the sampled request being handled, if any. Worker threads
+# started with `asyncio.to_thread()` get a copy, so their calls can be
+# sampled with the request (see `sampled()`).
+_endpoint = ContextVar('profiled_endpoint', default=None)
+
+def _frame_name(frame):
+    # 'module:function', or 'template:name.html:block' for Jinja's
+    # compiled template code
+    code = frame.f_code
+    if code.co_filename.endswith('.html'):
+        return f'template:{path.basename(code.co_filename)}:{code.co_name}'
+    return f'{frame.f_globals.get("__name__", "?")}:{code.co_name}'
+
+def _collapse(frame):
+    # One stack as flamegraph.pl's collapsed format, root first
+    #
+    # Frames inside the MySQL driver are folded into one `sql` frame, so
+    # time spent on queries shows up under the model that ran them.
+    names = []
+    while frame is not None:
+        name = _frame_name(frame)
+        if name.startswith('mysql.'):
+            names.clear()
+            names.append('sql')
+        else:
+            names.append(name)
+        frame = frame.f_back
+    names.reverse()
+    return ';'.join(names)
+
+def _dump(folder):
+    # Write each endpoint's stacks to `<endpoint>.<pid>.folded`
+    # The files of several workers can be concatenated for one graph
+    with _lock:
+        stacks = {i: Counter(j) for i, j in _stacks.items()}
+    makedirs(folder, exist_ok=True)
+    for endpoint, counts in stacks.items():
+        name = path.join(folder, f'{endpoint}.{getpid()}.folded')
+        with open(name, 'w') as file:
+            file.writelines(f'{i} {j}\n' for i, j in counts.most_common())
+
+def _start(thread_id, endpoint):
+    with _lock:
+        _active[thread_id] = endpoint
+    _wake.set()
+
+def _stop(thread_id):
+    with _lock:
+        _active.pop(thread_id, None)
+
+def sampled(func):
+    # Sample `func` with the request that runs it in a worker thread
+    #
+    # Async views run their queries in worker threads (see
+    # `utils.db.db_async()`), which the request's own thread ID doesn't
+    # cover. The thread is sampled only while `func` runs, since pooled
+    # threads go on to run calls of other requests.
+    #
+    # Returns: `func` as is when the request isn't sampled
+    endpoint = _endpoint.get()
+    if endpoint is None:
+        return func
+
+    @wraps(func)
+    def run(*args, **kwargs):
+        thread_id = get_ident()
+        _start(thread_id, endpoint)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _stop(thread_id)
+    return run
+
+def _sample(interval, folder):
+    # Record the stack of every sampled request every `interval` seconds
+    next_dump = monotonic() + _dump_seconds
+    while True:
+        _wake.wait()
+        sleep(interval)
+        frames = _current_frames()
+        with _lock:
+            for thread_id, endpoint in _active.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    counts = _stacks.setdefault(endpoint, Counter())
+                    counts[_collapse(frame)] += 1
+            if not _active:
+                _wake.clear()
+        if monotonic() >= next_dump:
+            _dump(folder)
+            next_dump = monotonic() + _dump_seconds
+
+def init_profiler(app):
+    # Sample the stacks of a share of requests (PROFILE_RATE) and write
+    # them as collapsed stacks for flamegraphs, one file per endpoint
+    #
+    # Nothing is registered when PROFILE_RATE is 0, so requests don't
+    # pay for it when it's off. PROFILE_ENDPOINTS limits sampling to
+    # some endpoints ('transact.filter') or blueprints ('transact').
+    #
+    # Render a graph with flamegraph.pl, speedscope, or similar:
+    #     cat profiles/transact.filter.*.folded | flamegraph.pl > out.svg
+    rate = app.config['PROFILE_RATE']
+    if rate <= 0:
+        return
+    endpoints = set(app.config['PROFILE_ENDPOINTS'])
+    folder = app.config['PROFILE_DIR']
+
+    @app.before_request
+    def start_sampling():
+        # Server threads handle many requests, so the endpoint of the
+        # last one is cleared first
+        _endpoint.set(None)
+        endpoint = request.endpoint
+        if endpoint is None or random() >= rate:
+            return
+        if endpoints and not {endpoint, endpoint.split('.')[0]} & endpoints:
+            return
+        _endpoint.set(endpoint)
+        _start(get_ident(), endpoint)
+
+    @app.after_request
+    def sample_until_sent(response):
+        # Streamed pages render after the request ends, so sampling
+        # stops once the response is sent
+        thread_id = get_ident()
+        if thread_id in _active:
+            g.profiled_until_sent = True
+            response.call_on_close(lambda: _stop(thread_id))
+        return response
+
+    @app.teardown_request
+    def stop_sampling(exception):
+        if not g.get('profiled_until_sent'):
+            _stop(get_ident())
+
+    Thread(target=_sample, args=(app.config['PROFILE_INTERVAL'], folder),
+           name='profiler', daemon=True).start()
+    register(_dump, folder)
@@ -0,0 +1,59 @@
+__all__ = ['Statement', 'statement', 'statements', 'execution_counts']
+
+from threading import Lock
+
+class Statement:
+    # A SQL statement declared once in the registry
+    #
+    # Statements are executed by `utils.db` as server-side prepared
+    # statements that are cached per connection. Use `prepared=False`
+    # for statements that are sent as text, such as multi-row inserts
+    # that `executemany()` batches into one round trip.
+    #
+    # Statements that write to `change_log` are found by their SQL, so
+    # `utils.db` can version their changes when they commit.
+    def __init__(self, name, sql, prepared=True):
+        self.name = name
+        self.sql = sql
+        self.prepared = prepared
+        self.logs_changes = 'INTO change_log' in sql
+        self.executions = 0
+        self._lock = Lock()
+
+    def count(self):
+        # Increment the execution counter (called by `utils.db`)
+        with self._lock:
+            self.executions += 1
+
+    def __repr__(self): return f'<Statement {self.name}>'
+
+_registry = {}
+_registry_lock = Lock()
+
+def statement(name, *sql, prepared=True):
+    # Declare a statement in the registry
+    #
+    # :param name: str (unique, prefixed with the table, ex. 'acct.get')
+    # :param sql: str (joined with spaces, like `utils.db.join()`)
+    # :param prepared: bool | True
+    #
+    # Returns:
+    # Statement
+    #
+    # Raises:
+    # ValueError when `name` has already been declared
+    with _registry_lock:
+        if name in _registry:
+            raise ValueError(f"Statement '{name}' is already declared")
+        stmt = Statement(name, ' '.join(sql), prepared=prepared)
+        _registry[name] = stmt
+    return stmt
+
+def statements():
+    # All declared statements, sorted by name
+    # O(n log n) (where n = len(statements))
+    return [_registry[name] for name in sorted(_registry)]
+
+def execution_counts():
+    # Execution counter for each declared statement
+    return {i.name: i.executions for i in statements()}
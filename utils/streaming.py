@@ -0,0 +1,77 @@
+__all__ = ['peek', 'stream_page']
+
+from itertools import chain
+from zlib import DEFLATED, Z_SYNC_FLUSH, compressobj
+
+from flask import Response, get_flashed_messages, request, stream_template
+
+_buffer_size = 16 * 1024 # Characters rendered before each chunk is sent
+_gzip = 16 + 15 # zlib window bits for a gzip header and trailer
+
+def _buffered(chunks):
+    # Join Jinja's many small pieces into chunks of about `_buffer_size`
+    buffer = []
+    size = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= _buffer_size:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+def _gzipped(chunks):
+    # Compress each chunk as it is rendered
+    #
+    # A sync flush after each chunk lets the browser decompress and show
+    # the page so far without waiting for the end.
+    compressor = compressobj(6, DEFLATED, _gzip)
+    for chunk in chunks:
+        yield (compressor.compress(chunk.encode())
+               + compressor.flush(Z_SYNC_FLUSH))
+    yield compressor.flush()
+
+def peek(rows):
+    # Read the first of `rows` now, before the response starts
+    #
+    # The query runs here, so a failing one still gets `log_error()`'s
+    # error page, and templates can test the result for rows.
+    #
+    # :param rows: iterator (ex. from `db_fetchiter()`)
+    #
+    # Returns: iterator of every row, or an empty list when there are none
+    rows = iter(rows)
+    for first in rows:
+        return chain([first], rows)
+    return []
+
+def stream_page(template_name, **context):
+    # Use instead of `render_template()` for pages that can get large
+    #
+    # The page is sent while it renders (gzipped when the browser
+    # accepts it). Pass long lists of rows as iterators from
+    # `db_fetchiter()` through `peek()`, so rows are read from the
+    # database as they're rendered and neither memory nor the time to
+    # the first byte grows with them. Anything else the page needs must
+    # be loaded before calling this: `log_error()` can't show an error
+    # page once the response has started.
+    #
+    # :param template_name: str
+    # :param context: the template's variables
+    #
+    # Returns: Response
+    #
+    # Read the flashed messages now, while the session cookie can still
+    # be updated (the template gets the same messages)
+    get_flashed_messages()
+
+    chunks = _buffered(stream_template(template_name, **context))
+    if 'gzip' not in request.accept_encodings:
+        return Response(chunks, mimetype='text/html')
+
+    response = Response(_gzipped(chunks), mimetype='text/html')
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response